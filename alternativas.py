@@ -0,0 +1,203 @@
+import heapq
+import math
+
+import numpy as np
+
+from motor_csr import _anotar, haversine
+
+# Rutas alternativas por mesetas ("choice routing"), con dos árboles de
+# caminos mínimos: uno desde el origen y otro desde el destino. Una meseta es
+# una cadena de aristas que está en los dos árboles. El camino que pasa por
+# ella (origen -> meseta por el primer árbol, meseta -> destino por el
+# segundo) es óptimo a lo largo de toda la meseta, así que no da rodeos
+# locales; cuanto más larga la meseta, mejor la alternativa. Una candidata se
+# acepta si:
+#   - su costo no pasa de (1 + ESTIRAMIENTO) veces el óptimo,
+#   - su meseta mide al menos MESETA_MIN del costo óptimo,
+#   - comparte con cada ruta ya elegida a lo sumo COMPARTIDO_MAX del óptimo.
+# Solo interesan los nodos con costo origen + destino <= (1 + ESTIRAMIENTO)
+# veces el óptimo: el primer árbol se poda con la heurística de A* y el
+# segundo solo entra en nodos del primero. Además cada árbol asienta a lo
+# sumo PRESUPUESTO veces los nodos de la búsqueda simple (el primer árbol la
+# incluye), así que una consulta con alternativas cuesta a lo sumo unas
+# 2 · PRESUPUESTO búsquedas simples.
+
+ESTIRAMIENTO = 0.25
+MESETA_MIN = 0.1
+COMPARTIDO_MAX = 0.7
+PRESUPUESTO = 4
+MAX_ALTERNATIVAS = 5
+
+
+def _arbol_origen(grafo, origen, destino, peso, estiramiento):
+    # A* desde el origen que no para en el destino: sigue mientras la clave
+    # (costo + cota al destino) no pase del límite. Con una heurística
+    # consistente, los costos de los nodos asentados son exactos
+    factor = grafo.factor_heuristica(peso)
+    indptr, indices, w = grafo.adyacencia(peso)
+    lat, lon = grafo.coordenadas_listas()
+    lat_d, lon_d = lat[destino], lon[destino]
+
+    def h(nodo):
+        return factor * haversine(lat[nodo], lon[nodo], lat_d, lon_d)
+
+    dist = {origen: 0.0}
+    pred = {}
+    asentados = []
+    visitados = set()
+    heap = [(h(origen), 0.0, origen)]
+    inserciones = 1
+    limite = math.inf
+    presupuesto = math.inf
+    while heap:
+        clave, d, nodo = heapq.heappop(heap)
+        if nodo in visitados:
+            continue
+        if clave > limite or len(asentados) >= presupuesto:
+            break
+        if nodo == destino:
+            limite = d * (1 + estiramiento)
+            presupuesto = PRESUPUESTO * (len(asentados) + 1)
+        visitados.add(nodo)
+        asentados.append(nodo)
+        for k in range(indptr[nodo], indptr[nodo + 1]):
+            vecino = indices[k]
+            if vecino in visitados:
+                continue
+            nd = d + w[k]
+            if nd < dist.get(vecino, math.inf):
+                dist[vecino] = nd
+                pred[vecino] = (nodo, k)
+                heapq.heappush(heap, (nd + h(vecino), nd, vecino))
+                inserciones += 1
+    return asentados, dist, pred, limite, presupuesto, inserciones
+
+
+def _arbol_destino(grafo, destino, peso, dist_origen, limite, presupuesto):
+    # Dijkstra desde el destino, solo por nodos asentados del primer árbol
+    # cuyo costo total todavía puede quedar dentro del límite
+    indptr, indices, w = grafo.adyacencia(peso)
+    dist = {destino: 0.0}
+    pred = {}
+    asentados = []
+    visitados = set()
+    heap = [(0.0, destino)]
+    inserciones = 1
+    while heap and len(asentados) < presupuesto:
+        d, nodo = heapq.heappop(heap)
+        if nodo in visitados:
+            continue
+        if d > limite:
+            break
+        visitados.add(nodo)
+        asentados.append(nodo)
+        for k in range(indptr[nodo], indptr[nodo + 1]):
+            vecino = indices[k]
+            previo = dist_origen.get(vecino)
+            if previo is None or vecino in visitados:
+                continue
+            nd = d + w[k]
+            if nd + previo <= limite and nd < dist.get(vecino, math.inf):
+                dist[vecino] = nd
+                pred[vecino] = (nodo, k)
+                heapq.heappush(heap, (nd, vecino))
+                inserciones += 1
+    return asentados, dist, pred, inserciones
+
+
+def _camino(pred, nodo, raiz):
+    # Nodos y entradas CSR desde `nodo` hasta la raíz del árbol
+    camino = [nodo]
+    entradas = []
+    while nodo != raiz:
+        nodo, k = pred[nodo]
+        camino.append(nodo)
+        entradas.append(k)
+    return camino, entradas
+
+
+def compartido(grafo, entradas, otras, peso):
+    # Costo de las aristas de `entradas` que también están en `otras`
+    entradas = np.asarray(entradas, dtype=np.int64)
+    comunes = np.isin(grafo.aristas[entradas], grafo.aristas[np.asarray(otras, dtype=np.int64)])
+    _, _, w = grafo.adyacencia(peso)
+    return float(np.asarray(w)[entradas[comunes]].sum())
+
+
+def rutas_alternativas(grafo, origen, destino, peso, cantidad, estadisticas=None, estiramiento=ESTIRAMIENTO,
+                       meseta_min=MESETA_MIN, compartido_max=COMPARTIDO_MAX):
+    # Devuelve [(costo, camino, entradas)]: la ruta óptima y después hasta
+    # `cantidad` alternativas, de mejor a peor meseta. Lista vacía si el
+    # destino no se alcanza
+    asentados_o, dist_o, pred_o, limite, presupuesto, inserciones_o = _arbol_origen(grafo, origen, destino, peso,
+                                                                                     estiramiento)
+    if destino not in pred_o and origen != destino:
+        _anotar(estadisticas, len(asentados_o), inserciones_o)
+        return []
+    camino, entradas = _camino(pred_o, destino, origen)
+    optima = (dist_o[destino], camino[::-1], entradas[::-1])
+    if cantidad <= 0 or origen == destino:
+        _anotar(estadisticas, len(asentados_o), inserciones_o)
+        return [optima]
+
+    asentados_d, dist_d, pred_d, inserciones_d = _arbol_destino(grafo, destino, peso,
+                                                                {n: dist_o[n] for n in asentados_o},
+                                                                limite, presupuesto)
+    _anotar(estadisticas, len(asentados_o) + len(asentados_d), inserciones_o + inserciones_d)
+
+    # Arista por la que se llega a cada nodo en cada árbol (-1: ninguna)
+    n = grafo.num_nodos
+    llegada_o = np.full(n, -1, dtype=np.int64)
+    llegada_d = np.full(n, -1, dtype=np.int64)
+    padre_o = np.full(n, -1, dtype=np.int64)
+    hijos = [nodo for nodo in asentados_o if nodo != origen]
+    if hijos:
+        padres, ks = zip(*(pred_o[nodo] for nodo in hijos))
+        llegada_o[hijos] = grafo.aristas[list(ks)]
+        padre_o[hijos] = padres
+    hijos_d = [nodo for nodo in asentados_d if nodo != destino]
+    if hijos_d:
+        llegada_d[hijos_d] = grafo.aristas[[pred_d[nodo][1] for nodo in hijos_d]]
+
+    # La arista padre -> nodo del primer árbol es de meseta si el segundo
+    # árbol llega al padre por la misma arista
+    orden = np.array(asentados_o, dtype=np.int64)
+    en_meseta = np.zeros(n, dtype=bool)
+    con_padre = orden[padre_o[orden] >= 0]
+    en_meseta[con_padre] = llegada_d[padre_o[con_padre]] == llegada_o[con_padre]
+    # Largo (en costo) de la meseta que termina en cada nodo; los padres se
+    # asientan antes que sus hijos
+    largo = np.zeros(n)
+    for nodo in orden[en_meseta[orden]].tolist():
+        padre = int(padre_o[nodo])
+        largo[nodo] = largo[padre] + (dist_o[nodo] - dist_o[padre])
+    sigue = np.zeros(n, dtype=bool)
+    sigue[padre_o[orden[en_meseta[orden]]]] = True
+    finales = orden[en_meseta[orden] & ~sigue[orden]]
+
+    costo_optimo = optima[0]
+    costos = np.array([dist_o[f] + dist_d.get(f, math.inf) for f in finales.tolist()])
+    candidatas = finales[(costos <= limite) & (largo[finales] >= meseta_min * costo_optimo)]
+    candidatas = candidatas[np.argsort(-largo[candidatas], kind="stable")]
+
+    elegidas = [optima]
+    # El segundo árbol recorrió las entradas al revés (nodo->vecino); el
+    # camino usa la gemela en el sentido de avance
+    gemelas = grafo.entradas_de_aristas()
+    for final in candidatas.tolist():
+        if len(elegidas) > cantidad:
+            break
+        ida, entradas_ida = _camino(pred_o, final, origen)
+        vuelta, entradas_vuelta = _camino(pred_d, final, destino)
+        # Sin ciclos: los dos tramos solo se tocan en la meseta
+        if len(set(ida).intersection(vuelta)) > 1:
+            continue
+        if entradas_vuelta:
+            vuelta_k = np.asarray(entradas_vuelta, dtype=np.int64)
+            pares = gemelas[grafo.aristas[vuelta_k]]
+            entradas_vuelta = np.where(pares[:, 0] == vuelta_k, pares[:, 1], pares[:, 0]).tolist()
+        entradas = entradas_ida[::-1] + entradas_vuelta
+        if any(compartido(grafo, entradas, otra[2], peso) > compartido_max * costo_optimo for otra in elegidas):
+            continue
+        elegidas.append((dist_o[final] + dist_d[final], ida[::-1] + vuelta[1:], entradas))
+    return elegidas
@@ -1,29 +1,100 @@
+import contextlib
 import pickle
 import os
-import osmnx as ox
-import folium
+import sys
 import math
-import random
-from collections import deque
-from shapely.geometry import Point, Polygon
-import networkx as nx
-from flask import Flask, jsonify, request
+import threading
+import time
+import tracemalloc
+from motor_csr import ALGORITMOS, compilar_grafo, desde_aristas
+from construccion import construir_red
+from contraccion import construir_ch
+from trafico import aplicar_congestion, aplicar_lotes, leer_lotes_ndjson
+from simulacion import HORA_PICO, PASO_MINUTOS, SimuladorTrafico
+from indice_espacial import IndiceEspacial, cargar_indice
+from snapshot import cargar_snapshot, generacion_snapshot, guardar_snapshot
+from cache_rutas import CacheRutas
+from formatos import FORMATOS, codificar_polyline, empaquetar_binario, simplificar
+from matriz import matriz_costos
+from alternativas import MAX_ALTERNATIVAS, compartido, rutas_alternativas
+from isocronas import arbol_acotado, isocrona_geojson
+from paradas import costo_orden, optimizar_orden
+from teselas import CacheTeselas, codificacion_aceptada
+from tiempo_dependiente import SEGUNDOS_DIA, construir_perfiles, dijkstra_dependiente
+from metricas import CUBETAS_NODOS, cronometrar, perfilador, registro
+from trabajadores import (Despachador, ServicioSaturado, TiempoAgotado, aplicar_pesos, datos_trabajador,
+                          en_trabajador, memoria_proceso, memoria_trabajadores, obtener_pool, pids_trabajadores,
+                          publicar_pesos)
+from lotes import TAM_BLOQUE, evaluar_archivo
+import click
+from flask import Blueprint, Flask, Response, g, jsonify, render_template, request
 from datetime import datetime
 import json
+import hashlib
+import logging
+import numpy as np
 
-app = Flask(__name__)
+# networkx, shapely y scipy solo se importan al construir el grafo: son
+# lentos de importar y no se necesitan para servir rutas
+
+bp = Blueprint("rutas", __name__)
+log = logging.getLogger("rutas")
+
+# Métricas expuestas en /metrics. En el modo de producción las búsquedas corren
+# en procesos de trabajo: cada proceso devuelve lo que anotó junto con la ruta
+PEDIDOS = registro.contador("rutas_pedidos_total", "Pedidos HTTP por ruta y código", ("ruta", "codigo"))
+DURACION_PEDIDOS = registro.histograma("rutas_pedido_segundos", "Duración de los pedidos HTTP", etiquetas=("ruta",))
+FASES = registro.histograma("rutas_fase_segundos",
+                            "Duración de cada fase: ajuste al grafo, búsqueda, reconstrucción y serialización",
+                            etiquetas=("fase",))
+ASENTADOS = registro.histograma("rutas_nodos_asentados", "Nodos asentados por búsqueda", CUBETAS_NODOS,
+                                ("algoritmo",))
+INSERCIONES = registro.histograma("rutas_inserciones_heap", "Inserciones en el heap por búsqueda", CUBETAS_NODOS,
+                                  ("algoritmo",))
+CONSULTAS_CACHE = registro.contador("rutas_cache_total", "Consultas a la caché de respuestas", ("resultado",))
+CONSULTAS_TABLA = registro.contador("rutas_tabla_total", "Consultas entre POIs a la tabla precalculada",
+                                    ("resultado",))
+DEGRADACIONES = registro.contador("rutas_degradaciones_total",
+                                  "Búsquedas que cayeron a una alternativa (p. ej. obstáculo -> ruta normal)",
+                                  ("motivo",))
+ERRORES = registro.contador("rutas_errores_total", "Excepciones capturadas en el cálculo de rutas", ("funcion",))
 
 GRAFO_FILE = "grafo_guardado_v3.pkl"
+TABLA_FILE = "tabla_rutas_v3.pkl"
+INDICE_FILE = "indice_espacial_v3.npz"
+SNAPSHOT_DIR = "grafo_v3.snap"
+# Respuestas de Overpass y teselas procesadas
+CACHE_OSM = "cache"
 
-def obtener_modo_trafico_actual():
-    hora_actual = datetime.now().hour
-    if 6 <= hora_actual < 9 or 17 <= hora_actual < 20:
+MODOS_TRAFICO = ("peso_horapico", "peso_normal", "peso_libre")
+VELOCIDADES_MODO = {"peso_horapico": 7, "peso_normal": 20, "peso_libre": 50}
+# Máximo de orígenes y de destinos por matriz
+MAX_MATRIZ = 1000
+TIPOS_RUTA = ("normal", "con_parada", "con_obstaculo", "multiparada")
+# Tiempo límite (s) de una búsqueda en el modo de producción
+TIMEOUT_RUTA = 10.0
+# Máximo de paradas en una ruta multiparada
+MAX_PARADAS = 100
+# Presupuestos por pedido de isocrona
+MAX_PRESUPUESTOS = 10
+# Un día simulado por pedido, en pasos de al menos 6 segundos: a lo sumo
+# 14400 pasos mientras se tiene el lock de la simulación
+MAX_MINUTOS_SIMULACION = 1440
+MIN_PASO_SIMULACION = 0.1
+# Intervalos del día en los perfiles de velocidad (24 = uno por hora)
+INTERVALOS_PERFIL = 24
+
+def modo_trafico_para_hora(hora):
+    if 6 <= hora < 9 or 17 <= hora < 20:
         return "peso_horapico", "Hora Pico"
-    elif 9 <= hora_actual < 17:
+    elif 9 <= hora < 17:
         return "peso_normal", "Tráfico Normal"
     else:
         return "peso_libre", "Hora Libre"
 
+def obtener_modo_trafico_actual():
+    return modo_trafico_para_hora(datetime.now().hour)
+
 def cargar_grafo():
     if os.path.exists(GRAFO_FILE):
         print("Cargando grafo desde archivo...")
@@ -36,38 +107,44 @@ def guardar_grafo(data):
     with open(GRAFO_FILE, 'wb') as f:
         pickle.dump(data, f)
 
-def distancia_geodesica(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    a = math.sin(delta_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(delta_lambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
-def crear_grafo():
-    coor_latlon = [
-        (14.595992916589651, -90.45998036866868),
-        (14.595125835501939, -90.4612230889126),
-        (14.596128175354478, -90.46895110645838),
-        (14.594658980099597, -90.47868828889479),
-        (14.595038649909512, -90.48309807332323),
-        (14.60135625944328, -90.49847739249991),
-        (14.60425684591137, -90.48940590688885),
-        (14.608938645353811, -90.4916152886364),
-        (14.613813239360029, -90.49218024329048),
-        (14.610335736317806, -90.49927356176848),
-        (14.607070781643843, -90.49988559587275),
-        (14.607192269188966, -90.50537820975624),
-        (14.620813635477512, -90.49349847057412),
-        (14.62025716603483, -90.47364421713812),
-        (14.617402360485203, -90.47436610351755),
-        (14.611636886631626, -90.475081016863),
-        (14.60604519507612, -90.46863390250498),
-        (14.599059515184518, -90.46270187944435)
-    ]
-
-    coor = [(lon, lat) for lat, lon in coor_latlon]
-    pts = [Point(lon, lat) for (lon, lat) in coor]
+ZONA_LATLON = [
+    (14.595992916589651, -90.45998036866868),
+    (14.595125835501939, -90.4612230889126),
+    (14.596128175354478, -90.46895110645838),
+    (14.594658980099597, -90.47868828889479),
+    (14.595038649909512, -90.48309807332323),
+    (14.60135625944328, -90.49847739249991),
+    (14.60425684591137, -90.48940590688885),
+    (14.608938645353811, -90.4916152886364),
+    (14.613813239360029, -90.49218024329048),
+    (14.610335736317806, -90.49927356176848),
+    (14.607070781643843, -90.49988559587275),
+    (14.607192269188966, -90.50537820975624),
+    (14.620813635477512, -90.49349847057412),
+    (14.62025716603483, -90.47364421713812),
+    (14.617402360485203, -90.47436610351755),
+    (14.611636886631626, -90.475081016863),
+    (14.60604519507612, -90.46863390250498),
+    (14.599059515184518, -90.46270187944435)
+]
+
+POIS_USUARIO = [
+    (14.61119100485585, -90.48580778897217),
+    (14.618944838124076, -90.48081377973796),
+    (14.618582412910866, -90.48420743608744),
+    (14.612142341881135, -90.49900242733989),
+    (14.614371861881606, -90.49132981324811),
+    (14.600884567886517, -90.47892424008336),
+    (14.596326378463905, -90.48123964433496),
+    (14.597073268975551, -90.48314644782701),
+    (14.60100190653431, -90.48819584711718),
+    (14.608097113251654, -90.4832018378643)
+]
+
+def poligono_zona():
+    from shapely.geometry import Point, Polygon
+
+    pts = [Point(lon, lat) for lat, lon in ZONA_LATLON]
     cx = sum(p.x for p in pts) / len(pts)
     cy = sum(p.y for p in pts) / len(pts)
 
@@ -75,58 +152,41 @@ def crear_grafo():
         return math.atan2(p.y - cy, p.x - cx)
 
     pts_sorted = sorted(pts, key=angle)
-    poly = Polygon([(p.x, p.y) for p in pts_sorted]).buffer(0.002)
-
-    print("Descargando grafo desde OSM...")
-    G = ox.graph_from_polygon(poly, network_type="drive")
-    G = nx.Graph(G)
-    print(f"Grafo descargado: {len(G.nodes)} nodos, {len(G.edges)} aristas")
+    return Polygon([(p.x, p.y) for p in pts_sorted]).buffer(0.002)
 
-    # Datos de aristas para el frontend
-    edges_data = []
+def crear_red(procesos=None, sin_red=False, extracto=None, semilla=None):
+    # Red vial por teselas (ver construccion.py) con los pesos por modo,
+    # calculados sobre los arreglos de aristas
+    red, resumen = construir_red(poligono_zona(), CACHE_OSM, procesos, sin_red, extracto)
+    print(f"Teselas: {resumen['teselas']} ({resumen['reprocesadas']} reprocesadas, "
+          f"{resumen['reutilizadas']} reutilizadas)")
+    print(f"Grafo: {resumen['nodos']} nodos, {resumen['aristas']} aristas")
 
-    for u, v, data in G.edges(data=True):
-        if "length" not in data or data["length"] == 0:
-            lat1, lon1 = G.nodes[u]["y"], G.nodes[u]["x"]
-            lat2, lon2 = G.nodes[v]["y"], G.nodes[v]["x"]
-            data["length"] = distancia_geodesica(lat1, lon1, lat2, lon2)
-        
-        d = data["length"]
-        data["peso_normal"] = d
-        congestion = random.uniform(14.5, 15.9)
-        data["peso_horapico"] = d * congestion
-        data["peso_libre"] = d * 0.9
-        data["congestion"] = congestion
-        
-        # Guardar para frontend
-        lat1, lon1 = G.nodes[u]["y"], G.nodes[u]["x"]
-        lat2, lon2 = G.nodes[v]["y"], G.nodes[v]["x"]
-        edges_data.append({
-            "coords": [[lat1, lon1], [lat2, lon2]],
-            "congestion": congestion
-        })
-
-    POIS_USUARIO = [
-        (14.61119100485585, -90.48580778897217),
-        (14.618944838124076, -90.48081377973796),
-        (14.618582412910866, -90.48420743608744),
-        (14.612142341881135, -90.49900242733989),
-        (14.614371861881606, -90.49132981324811),
-        (14.600884567886517, -90.47892424008336),
-        (14.596326378463905, -90.48123964433496),
-        (14.597073268975551, -90.48314644782701),
-        (14.60100190653431, -90.48819584711718),
-        (14.608097113251654, -90.4832018378643)
-    ]
-
-    poi_mapping = {}
-    for i, (lat, lon) in enumerate(POIS_USUARIO, start=1):
-        nombre = f"POI_{i}"
-        nearest = ox.distance.nearest_nodes(G, X=lon, Y=lat)
-        poi_mapping[nombre] = nearest
+    d = red["longitud"]
+    # Congestión de hora pico de la simulación (simulacion.py): la misma
+    # semilla da el mismo grafo
+    congestion = SimuladorTrafico(red["u"], red["v"], len(red["nodos"]), semilla, HORA_PICO).congestion()
+    red["pesos"] = {"length": d, "peso_normal": d.copy(), "peso_horapico": d * congestion, "peso_libre": d * 0.9}
+    red["congestion"] = congestion
 
+    espacial = IndiceEspacial(red["lat"], red["lon"])
+    cercanos, _ = espacial.mas_cercanos([lat for lat, lon in POIS_USUARIO], [lon for lat, lon in POIS_USUARIO])
+    poi_mapping = {f"POI_{i}": int(red["nodos"][nearest]) for i, nearest in enumerate(cercanos.tolist(), start=1)}
     print(f"POIs mapeados: {len(poi_mapping)}")
-    return G, poi_mapping, edges_data
+    return red, poi_mapping
+
+def grafo_networkx(red):
+    # Solo para el pickle de respaldo; el servidor usa la instantánea
+    import networkx as nx
+    G = nx.Graph()
+    ids = red["nodos"].tolist()
+    G.add_nodes_from((n, {"y": y, "x": x}) for n, y, x in zip(ids, red["lat"].tolist(), red["lon"].tolist()))
+    atributos = [dict(zip(red["pesos"], valores)) for valores in zip(*(p.tolist() for p in red["pesos"].values()))]
+    for atributo, c in zip(atributos, red["congestion"].tolist()):
+        atributo["congestion"] = c
+    G.add_edges_from((ids[a], ids[b], atributo)
+                     for a, b, atributo in zip(red["u"].tolist(), red["v"].tolist(), atributos))
+    return G
 
 def formato_tiempo(minutos):
     if minutos < 1:
@@ -138,53 +198,218 @@ def formato_tiempo(minutos):
     else:
         return f"{int(minutos // 60)} h {int(minutos % 60)} min"
 
-def calcular_ruta(G, poi_mapping, origen, destino, modo_trafico="peso_horapico"):
+def huella_grafo(grafo, poi_mapping):
+    # Identifica el grafo y sus pesos; si cambia, la tabla de rutas se invalida
+    h = hashlib.sha1(grafo.huella().encode())
+    h.update(repr(sorted(poi_mapping.items())).encode())
+    return h.hexdigest()
+
+def precalcular_tabla_rutas(grafo, poi_mapping):
+    # Todas las rutas POI x POI x modo, resueltas una sola vez. `detalles`
+    # guarda costo, extremos y aristas de cada ruta para poder invalidarla
+    # cuando cambia el tráfico
+    rutas, detalles = {}, {}
+    for modo in MODOS_TRAFICO:
+        for origen in poi_mapping:
+            for destino in poi_mapping:
+                if origen == destino:
+                    continue
+                detalle = {}
+                resultado = buscar_ruta(grafo, poi_mapping, origen, destino, modo, detalle=detalle)
+                if resultado is not None:
+                    rutas[(origen, destino, modo)] = resultado
+                    detalles[(origen, destino, modo)] = detalle
+    return rutas, detalles
+
+def cargar_tabla_guardada(grafo, poi_mapping):
+    # Solo la tabla del archivo, si corresponde a este grafo y sus pesos
+    if not os.path.exists(TABLA_FILE):
+        return None
+    with open(TABLA_FILE, 'rb') as f:
+        tabla = pickle.load(f)
+    if tabla.get("huella") != huella_grafo(grafo, poi_mapping) or "detalles" not in tabla:
+        return None
+    grafo.tabla_rutas = tabla["rutas"]
+    grafo.tabla_detalle = tabla["detalles"]
+    return tabla["rutas"]
+
+def cargar_tabla_rutas(grafo, poi_mapping):
+    rutas = cargar_tabla_guardada(grafo, poi_mapping)
+    if rutas is not None:
+        print("Tabla de rutas cargada desde archivo")
+        return rutas
+
+    huella = huella_grafo(grafo, poi_mapping)
+    print("Precalculando tabla de rutas entre POIs...")
+    rutas, detalles = precalcular_tabla_rutas(grafo, poi_mapping)
+    with open(TABLA_FILE, 'wb') as f:
+        pickle.dump({"huella": huella, "rutas": rutas, "detalles": detalles}, f)
+    print(f"Tabla de rutas: {len(rutas)} rutas")
+    grafo.tabla_rutas = rutas
+    grafo.tabla_detalle = detalles
+    return rutas
+
+def cargar_indice_espacial(grafo):
+    huella = grafo.huella_coordenadas()
+    espacial = cargar_indice(INDICE_FILE, huella)
+    if espacial is None:
+        print("Construyendo índice espacial...")
+        espacial = IndiceEspacial(grafo.lat, grafo.lon)
+        espacial.guardar(INDICE_FILE, huella)
+    grafo.espacial = espacial
+    return espacial
+
+def resolver_punto(grafo, poi_mapping, punto):
+    # Acepta un nombre de POI o un par "lat,lon" que se ajusta al nodo más cercano
+    if punto is None:
+        return None
+    if punto in poi_mapping:
+        return grafo.indice_nodo(poi_mapping[punto])
     try:
-        nodo_origen = poi_mapping.get(origen)
-        nodo_destino = poi_mapping.get(destino)
+        lat, lon = (float(valor) for valor in punto.split(","))
+    except ValueError:
+        return None
+    # float() acepta "nan" e "inf"
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    with cronometrar(FASES, fase="ajuste"):
+        nodo, _ = grafo.espacial.mas_cercano(lat, lon)
+    return nodo if nodo >= 0 else None
+
+def anotar_busqueda(algoritmo, estadisticas):
+    ASENTADOS.observar(estadisticas.get("asentados", 0), algoritmo=algoritmo)
+    INSERCIONES.observar(estadisticas.get("inserciones", 0), algoritmo=algoritmo)
+    if "degradacion" in estadisticas:
+        DEGRADACIONES.inc(motivo=estadisticas["degradacion"])
+
+def resumen_ruta(coords_ruta, distancia_total, tiempo_minutos):
+    return {
+        "coordenadas": coords_ruta,
+        "distancia_metros": distancia_total,
+        "distancia_km": distancia_total / 1000,
+        "tiempo_minutos": tiempo_minutos,
+        "tiempo_formato": formato_tiempo(tiempo_minutos)
+    }
+
+def calcular_ruta(grafo, poi_mapping, origen, destino, modo_trafico="peso_horapico", algoritmo="dijkstra",
+                  detalle=None):
+    # Las rutas entre POIs ya están resueltas; el algoritmo solo cambia cómo se
+    # busca el resto, no el resultado. Si se pasa `detalle`, se completa con
+    # el de la ruta (origen, destino, costo y aristas)
+    clave = (origen, destino, modo_trafico)
+    precalculada = grafo.tabla_rutas.get(clave)
+    if origen in poi_mapping and destino in poi_mapping:
+        CONSULTAS_TABLA.inc(resultado="fallo" if precalculada is None else "acierto")
+    if precalculada is not None:
+        if detalle is not None:
+            detalle.update(grafo.tabla_detalle.get(clave, {}))
+        return dict(precalculada)
+
+    if detalle is None:
+        detalle = {}
+    resultado = buscar_ruta(grafo, poi_mapping, origen, destino, modo_trafico, algoritmo, detalle=detalle)
+    # Una ruta entre POIs invalidada por el tráfico vuelve a la tabla, salvo
+    # que los pesos hayan cambiado otra vez durante la búsqueda. Comparar e
+    # insertar van bajo el lock con que se publican los pesos: si no, un lote
+    # podría publicarse e invalidar la tabla entre ambos pasos y la ruta
+    # vieja quedaría guardada (la invalidación corre después de publicar)
+    if (resultado is not None and origen in poi_mapping and destino in poi_mapping
+            and modo_trafico in MODOS_TRAFICO):
+        with grafo._escritura:
+            if detalle["version"] == grafo.version_pesos:
+                grafo.tabla_detalle[clave] = detalle
+                grafo.tabla_rutas[clave] = resultado
+                return dict(resultado)
+    return resultado
+
+def buscar_ruta(grafo, poi_mapping, origen, destino, modo_trafico="peso_horapico", algoritmo="dijkstra",
+                detalle=None):
+    try:
+        nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+        nodo_destino = resolver_punto(grafo, poi_mapping, destino)
         
         if nodo_origen is None or nodo_destino is None:
             return None
         
-        ruta = nx.shortest_path(G, nodo_origen, nodo_destino, weight=modo_trafico)
-        
-        distancia_total = 0
-        coords_ruta = []
+        version = grafo.version_pesos
+        estadisticas = {}
+        with cronometrar(FASES, fase="busqueda"):
+            encontrada = grafo.buscar(nodo_origen, nodo_destino, modo_trafico, algoritmo, estadisticas=estadisticas)
+        anotar_busqueda(algoritmo, estadisticas)
+        if encontrada is None:
+            return None
+        costo, ruta, entradas = encontrada
         
-        for i, nodo in enumerate(ruta):
-            lat = G.nodes[nodo].get("y")
-            lon = G.nodes[nodo].get("x")
-            if lat is not None and lon is not None:
-                coords_ruta.append([float(lat), float(lon)])
-            
-            if i < len(ruta) - 1:
-                siguiente = ruta[i + 1]
-                if G.has_edge(nodo, siguiente):
-                    edge_data = G.get_edge_data(nodo, siguiente)
-                    if edge_data and "length" in edge_data:
-                        distancia_total += edge_data["length"]
+        with cronometrar(FASES, fase="reconstruccion"):
+            coords_ruta = grafo.coordenadas(ruta)
+            distancia_total = grafo.distancia(entradas)
 
         if len(coords_ruta) < 2:
             return None
 
-        velocidades = {"peso_horapico": 7, "peso_normal": 20, "peso_libre": 50}
-        velocidad = velocidades.get(modo_trafico, 30)
+        if detalle is not None:
+            detalle.update({
+                "costo": costo,
+                "origen": nodo_origen,
+                "destino": nodo_destino,
+                "aristas": np.unique(grafo.aristas[entradas]),
+                "version": version
+            })
+
+        velocidad = VELOCIDADES_MODO.get(modo_trafico, 30)
         tiempo_minutos = (distancia_total / 1000) / velocidad * 60
 
-        return {
-            "coordenadas": coords_ruta,
-            "distancia_metros": distancia_total,
-            "distancia_km": distancia_total / 1000,
-            "tiempo_minutos": tiempo_minutos,
-            "tiempo_formato": formato_tiempo(tiempo_minutos)
-        }
-    except:
+        return resumen_ruta(coords_ruta, distancia_total, tiempo_minutos)
+    except Exception:
+        log.exception("Error buscando la ruta de %s a %s", origen, destino)
+        ERRORES.inc(funcion="buscar_ruta")
+        return None
+
+def calcular_alternativas(grafo, poi_mapping, origen, destino, modo_trafico, cantidad):
+    # La ruta óptima y hasta `cantidad` alternativas distintas de una sola
+    # búsqueda (alternativas.py). Cada alternativa lleva su estiramiento (costo
+    # sobre el óptimo) y la fracción de su largo que comparte con la óptima
+    try:
+        nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+        nodo_destino = resolver_punto(grafo, poi_mapping, destino)
+        if nodo_origen is None or nodo_destino is None:
+            return None
+
+        estadisticas = {}
+        with cronometrar(FASES, fase="busqueda"):
+            rutas = rutas_alternativas(grafo, nodo_origen, nodo_destino, modo_trafico, cantidad, estadisticas)
+        anotar_busqueda("alternativas", estadisticas)
+        if not rutas:
+            return None
+
+        velocidad = VELOCIDADES_MODO.get(modo_trafico, 30)
+        resumenes = []
+        with cronometrar(FASES, fase="reconstruccion"):
+            costo_optimo, _, entradas_optima = rutas[0]
+            for costo, camino, entradas in rutas:
+                distancia_total = grafo.distancia(entradas)
+                resumen = resumen_ruta(grafo.coordenadas(camino), distancia_total,
+                                       (distancia_total / 1000) / velocidad * 60)
+                if resumenes:
+                    resumen["estiramiento"] = round(costo / costo_optimo, 3) if costo_optimo else 1.0
+                    comun = compartido(grafo, entradas, entradas_optima, "length")
+                    resumen["compartido"] = round(comun / distancia_total, 3) if distancia_total else 1.0
+                resumenes.append(resumen)
+
+        if len(resumenes[0]["coordenadas"]) < 2:
+            return None
+        resultado = resumenes[0]
+        resultado["alternativas"] = resumenes[1:]
+        return resultado
+    except Exception:
+        log.exception("Error buscando alternativas de %s a %s", origen, destino)
+        ERRORES.inc(funcion="calcular_alternativas")
         return None
 
-def calcular_ruta_con_parada(G, poi_mapping, origen, parada, destino, modo_trafico):
+def calcular_ruta_con_parada(grafo, poi_mapping, origen, parada, destino, modo_trafico, algoritmo="dijkstra"):
     try:
-        ruta1 = calcular_ruta(G, poi_mapping, origen, parada, modo_trafico)
-        ruta2 = calcular_ruta(G, poi_mapping, parada, destino, modo_trafico)
+        ruta1 = calcular_ruta(grafo, poi_mapping, origen, parada, modo_trafico, algoritmo)
+        ruta2 = calcular_ruta(grafo, poi_mapping, parada, destino, modo_trafico, algoritmo)
         
         if ruta1 is None or ruta2 is None:
             return None
@@ -193,427 +418,1000 @@ def calcular_ruta_con_parada(G, poi_mapping, origen, parada, destino, modo_trafi
         distancia_total = ruta1["distancia_metros"] + ruta2["distancia_metros"]
         tiempo_total = ruta1["tiempo_minutos"] + ruta2["tiempo_minutos"]
         
-        return {
-            "coordenadas": coords_combinadas,
-            "distancia_metros": distancia_total,
-            "distancia_km": distancia_total / 1000,
-            "tiempo_minutos": tiempo_total,
-            "tiempo_formato": formato_tiempo(tiempo_total)
-        }
-    except:
+        return resumen_ruta(coords_combinadas, distancia_total, tiempo_total)
+    except Exception:
+        log.exception("Error uniendo la ruta de %s a %s por %s", origen, destino, parada)
+        ERRORES.inc(funcion="calcular_ruta_con_parada")
+        return None
+
+def calcular_ruta_multiparada(grafo, poi_mapping, origen, paradas, destino, modo_trafico, algoritmo="dijkstra"):
+    # Visita todas las paradas en el orden de menor costo total. Los costos
+    # entre cada par de puntos salen de una sola matriz (un árbol de Dijkstra
+    # por punto); después solo se trazan los tramos del orden elegido
+    puntos = [origen, *paradas, destino]
+    nodos = [resolver_punto(grafo, poi_mapping, punto) for punto in puntos]
+    if any(nodo is None for nodo in nodos):
+        return None
+    costos, _ = matriz_costos(grafo, nodos, nodos, modo_trafico, despachador=despachador_matriz())
+    if not np.isfinite(costos).all():
+        return None
+    orden, metodo = optimizar_orden(costos)
+    secuencia = [0, *orden, len(puntos) - 1]
+
+    coords_combinadas, distancia_total, tiempo_total = [], 0.0, 0.0
+    for a, b in zip(secuencia, secuencia[1:]):
+        if nodos[a] == nodos[b]:
+            continue
+        tramo = calcular_ruta(grafo, poi_mapping, puntos[a], puntos[b], modo_trafico, algoritmo)
+        if tramo is None:
+            return None
+        coords_combinadas = coords_combinadas[:-1] + tramo["coordenadas"]
+        distancia_total += tramo["distancia_metros"]
+        tiempo_total += tramo["tiempo_minutos"]
+    if len(coords_combinadas) < 2:
         return None
 
-def calcular_ruta_con_obstaculo(G, poi_mapping, origen, destino, obstaculo, modo_trafico, radio_metros=200):
+    resultado = resumen_ruta(coords_combinadas, distancia_total, tiempo_total)
+    resultado["orden"] = [puntos[i] for i in secuencia]
+    resultado["costo"] = costo_orden(costos, secuencia)
+    resultado["metodo_orden"] = metodo
+    return resultado
+
+def calcular_ruta_con_obstaculo(grafo, poi_mapping, origen, destino, obstaculo, modo_trafico, radio_metros=200,
+                                algoritmo="dijkstra"):
     try:
-        import math
-        
-        nodo_origen = poi_mapping.get(origen)
-        nodo_destino = poi_mapping.get(destino)
-        nodo_obstaculo = poi_mapping.get(obstaculo)
+        nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+        nodo_destino = resolver_punto(grafo, poi_mapping, destino)
+        nodo_obstaculo = resolver_punto(grafo, poi_mapping, obstaculo)
         
         if nodo_origen is None or nodo_destino is None or nodo_obstaculo is None:
-            return calcular_ruta(G, poi_mapping, origen, destino, modo_trafico)
-        
-        lat_obs = G.nodes[nodo_obstaculo].get("y")
-        lon_obs = G.nodes[nodo_obstaculo].get("x")
-        
-        if lat_obs is None or lon_obs is None:
-            return calcular_ruta(G, poi_mapping, origen, destino, modo_trafico)
-        
-        G_temp = G.copy()
-        
-        nodos_a_evitar = []
-        for nodo in G_temp.nodes():
-            lat = G_temp.nodes[nodo].get("y")
-            lon = G_temp.nodes[nodo].get("x")
-            if lat is not None and lon is not None:
-                dist_lat = (lat - lat_obs) * 111000
-                dist_lon = (lon - lon_obs) * 111000 * math.cos(math.radians(lat_obs))
-                dist = math.sqrt(dist_lat**2 + dist_lon**2)
-                if dist < radio_metros and nodo != nodo_origen and nodo != nodo_destino:
-                    nodos_a_evitar.append(nodo)
+            DEGRADACIONES.inc(motivo="obstaculo_sin_punto")
+            return calcular_ruta(grafo, poi_mapping, origen, destino, modo_trafico, algoritmo)
         
-        for nodo in nodos_a_evitar:
-            vecinos = list(G_temp.neighbors(nodo))
-            for vecino in vecinos:
-                if G_temp.has_edge(nodo, vecino):
-                    G_temp.remove_edge(nodo, vecino)
-                if G_temp.has_edge(vecino, nodo):
-                    G_temp.remove_edge(vecino, nodo)
+        nodos_a_evitar = nodos_bloqueados(grafo, nodo_obstaculo, nodo_origen, nodo_destino, radio_metros)
         
-        ruta = nx.shortest_path(G_temp, nodo_origen, nodo_destino, weight=modo_trafico)
+        # Bloquear un nodo equivale a quitar todas sus aristas
+        estadisticas = {}
+        with cronometrar(FASES, fase="busqueda"):
+            encontrada = grafo.buscar(nodo_origen, nodo_destino, modo_trafico, algoritmo, bloqueados=nodos_a_evitar,
+                                      estadisticas=estadisticas)
+        anotar_busqueda(algoritmo, estadisticas)
+        if encontrada is None:
+            DEGRADACIONES.inc(motivo="obstaculo_sin_desvio")
+            return calcular_ruta(grafo, poi_mapping, origen, destino, modo_trafico, algoritmo)
+        _, ruta, entradas = encontrada
         
-        distancia_total = 0
-        coords_ruta = []
-        
-        for i, nodo in enumerate(ruta):
-            lat = G_temp.nodes[nodo].get("y")
-            lon = G_temp.nodes[nodo].get("x")
-            if lat is not None and lon is not None:
-                coords_ruta.append([float(lat), float(lon)])
-            
-            if i < len(ruta) - 1:
-                siguiente = ruta[i + 1]
-                if G_temp.has_edge(nodo, siguiente):
-                    edge_data = G_temp.get_edge_data(nodo, siguiente)
-                    if edge_data and "length" in edge_data:
-                        distancia_total += edge_data["length"]
+        with cronometrar(FASES, fase="reconstruccion"):
+            coords_ruta = grafo.coordenadas(ruta)
+            distancia_total = grafo.distancia(entradas)
         
         if len(coords_ruta) < 2:
-            return calcular_ruta(G, poi_mapping, origen, destino, modo_trafico)
+            DEGRADACIONES.inc(motivo="obstaculo_sin_desvio")
+            return calcular_ruta(grafo, poi_mapping, origen, destino, modo_trafico, algoritmo)
         
         velocidades = {"peso_horapico": 15, "peso_normal": 30, "peso_libre": 50}
         velocidad = velocidades.get(modo_trafico, 30)
         tiempo_minutos = (distancia_total / 1000) / velocidad * 60
         
-        return {
-            "coordenadas": coords_ruta,
-            "distancia_metros": distancia_total,
-            "distancia_km": distancia_total / 1000,
-            "tiempo_minutos": tiempo_minutos,
-            "tiempo_formato": formato_tiempo(tiempo_minutos)
-        }
-    except:
-        return calcular_ruta(G, poi_mapping, origen, destino, modo_trafico)
-
-
-# Inicializar
-print("Inicializando aplicación...")
-data = cargar_grafo()
-if data is None:
-    G, poi_mapping, edges_data = crear_grafo()
-    guardar_grafo((G, poi_mapping, edges_data))
-else:
-    G, poi_mapping, edges_data = data
+        return resumen_ruta(coords_ruta, distancia_total, tiempo_minutos)
+    except Exception:
+        log.exception("Error evitando %s en la ruta de %s a %s", obstaculo, origen, destino)
+        ERRORES.inc(funcion="calcular_ruta_con_obstaculo")
+        DEGRADACIONES.inc(motivo="obstaculo_error")
+        return calcular_ruta(grafo, poi_mapping, origen, destino, modo_trafico, algoritmo)
+
+def calcular_isocrona(grafo, poi_mapping, origen, modo_trafico, minutos=(), metros=()):
+    # Todo lo alcanzable desde `origen` dentro de cada presupuesto, en minutos
+    # (a la velocidad del modo, como calcular_ruta) o en metros. Una sola
+    # búsqueda para todos los presupuestos; el árbol queda en caché por
+    # origen y modo y sirve mientras no cambien los pesos ni haga falta un
+    # presupuesto mayor
+    nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+    if nodo_origen is None:
+        return None
+    velocidad = VELOCIDADES_MODO.get(modo_trafico, 30)
+    presupuestos = [({"minutos": m}, m / 60 * velocidad * 1000) for m in minutos]
+    presupuestos += [({"metros": m}, m) for m in metros]
+    necesarios = max(limite for _, limite in presupuestos)
+
+    clave = (nodo_origen, modo_trafico)
+    generacion = grafo.huella_pesos(modo_trafico)
+    arbol = arboles_isocrona.obtener(clave, generacion)
+    if arbol is None or arbol.metros_max < necesarios:
+        estadisticas = {}
+        with cronometrar(FASES, fase="busqueda"):
+            arbol = arbol_acotado(grafo, nodo_origen, modo_trafico, necesarios, estadisticas)
+        anotar_busqueda("isocrona", estadisticas)
+        arboles_isocrona.guardar(clave, generacion, arbol)
+
+    with cronometrar(FASES, fase="serializacion"):
+        resultado = isocrona_geojson(grafo, arbol, presupuestos)
+    resultado.update({"origen": origen, "nodo_origen": int(grafo.nodos[nodo_origen]), "modo": modo_trafico,
+                      "velocidad_kmh": velocidad})
+    return resultado
+
+def calcular_matriz(grafo, poi_mapping, origenes, destinos, modo_trafico="peso_horapico"):
+    # Matriz origen x destino de distancias y tiempos: un árbol de Dijkstra
+    # por origen, repartidos entre procesos. Filas por origen, aplanadas, con
+    # None donde no hay camino
+    nodos_origen = [resolver_punto(grafo, poi_mapping, punto) for punto in origenes]
+    nodos_destino = [resolver_punto(grafo, poi_mapping, punto) for punto in destinos]
+    faltantes = list(dict.fromkeys(punto for punto, nodo in zip(list(origenes) + list(destinos),
+                                                                 nodos_origen + nodos_destino) if nodo is None))
+    if faltantes:
+        raise ValueError(f"Puntos no encontrados: {', '.join(map(str, faltantes[:10]))}")
+
+    _, metros = matriz_costos(grafo, nodos_origen, nodos_destino, modo_trafico, despachador=despachador_matriz())
+    minutos = (metros / 1000) / VELOCIDADES_MODO.get(modo_trafico, 30) * 60
+
+    def plano(valores, decimales):
+        return [None if math.isinf(x) else x for x in np.round(valores, decimales).ravel().tolist()]
+
+    return {
+        "origenes": list(origenes),
+        "destinos": list(destinos),
+        "modo": modo_trafico,
+        "forma": [len(origenes), len(destinos)],
+        "distancia_metros": plano(metros, 1),
+        "tiempo_minutos": plano(minutos, 2)
+    }
+
+def resolver_ruta(grafo, poi_mapping, tipo_ruta, modo, origen, destino, punto_c=None, paradas=(), salida=None,
+                  algoritmo="dijkstra", alternativas=0, detalle=None):
+    # `detalle` solo se completa en las rutas normales: con él la caché de
+    # respuestas puede conservarlas tras un lote de tráfico que no las afecta
+    if salida is not None:
+        # Con hora de salida el tiempo de cada arista sale de su perfil
+        # horario; `modo` y `algoritmo` no se usan
+        if tipo_ruta == 'con_parada':
+            return buscar_ruta_dependiente_con_parada(grafo, poi_mapping, origen, punto_c, destino, salida)
+        obstaculo = punto_c if tipo_ruta == 'con_obstaculo' else None
+        return buscar_ruta_dependiente(grafo, poi_mapping, origen, destino, salida, obstaculo)
+    if tipo_ruta == 'multiparada':
+        return calcular_ruta_multiparada(grafo, poi_mapping, origen, paradas, destino, modo, algoritmo)
+    if tipo_ruta == 'con_parada':
+        return calcular_ruta_con_parada(grafo, poi_mapping, origen, punto_c, destino, modo, algoritmo)
+    if tipo_ruta == 'con_obstaculo':
+        return calcular_ruta_con_obstaculo(grafo, poi_mapping, origen, destino, punto_c, modo, algoritmo=algoritmo)
+    if alternativas:
+        return calcular_alternativas(grafo, poi_mapping, origen, destino, modo, alternativas)
+    return calcular_ruta(grafo, poi_mapping, origen, destino, modo, algoritmo, detalle)
+
+def _grafo_en_trabajador(pesos_publicados, generacion):
+    # Corre en un proceso de trabajo (trabajadores.py) con el grafo de la
+    # instantánea, en la generación del servidor. La tabla de rutas se carga
+    # antes de aplicar pesos nuevos, que descartan las rutas guardadas del
+    # modo que cambió
+    datos = datos_trabajador(generacion)
+    if "tabla" not in datos:
+        datos["tabla"] = cargar_tabla_guardada(datos["grafo"], datos["poi_mapping"]) is not None
+    return aplicar_pesos(pesos_publicados), datos["poi_mapping"]
+
+def _ruta_en_trabajador(parametros, pesos_publicados, generacion=None):
+    grafo, poi_mapping = _grafo_en_trabajador(pesos_publicados, generacion)
+    detalle = {}
+    resultado = resolver_ruta(grafo, poi_mapping, **parametros, detalle=detalle)
+    return resultado, detalle, registro.extraer()
+
+def validar_pedido(pedido):
+    # Pedido de una línea del NDJSON de route-batch, con los mismos nombres
+    # que los parámetros de /calcular_ruta. Devuelve los parámetros de
+    # resolver_ruta (sin el modo) o un texto de error
+    if pedido is None:
+        return "La línea no es un objeto JSON"
+    origen, destino = pedido.get("origen"), pedido.get("destino")
+    if not isinstance(origen, str) or not isinstance(destino, str) or not origen or not destino:
+        return "Faltan parámetros"
+    tipo_ruta = pedido.get("tipo", "normal")
+    if tipo_ruta not in TIPOS_RUTA:
+        return f"Tipo de ruta no válido: {tipo_ruta}"
+    algoritmo = pedido.get("algoritmo", "dijkstra")
+    if algoritmo not in ALGORITMOS:
+        return f"Algoritmo no válido: {algoritmo}"
+    salida = pedido.get("salida")
+    if salida is not None:
+        if not isinstance(salida, str) or parsear_hora(salida) is None:
+            return f"Hora de salida no válida (HH:MM): {salida}"
+        salida = parsear_hora(salida)
+    punto_c = pedido.get("punto_c")
+    if tipo_ruta in ('con_parada', 'con_obstaculo') and not isinstance(punto_c, str):
+        return "Falta el punto de parada" if tipo_ruta == 'con_parada' else "Falta el punto obstáculo"
+    paradas = pedido.get("paradas", [])
+    if isinstance(paradas, str):
+        paradas = [p for p in paradas.split(';') if p]
+    if not isinstance(paradas, list) or not all(isinstance(p, str) for p in paradas):
+        return "Las paradas deben ser una lista de puntos"
+    if tipo_ruta == 'multiparada':
+        if not paradas:
+            return "Faltan las paradas"
+        if len(paradas) > MAX_PARADAS:
+            return f"Máximo {MAX_PARADAS} paradas"
+        if salida is not None:
+            return "La ruta multiparada no admite hora de salida"
+    return {"tipo_ruta": tipo_ruta, "origen": origen, "destino": destino, "punto_c": punto_c,
+            "paradas": paradas, "salida": salida, "algoritmo": algoritmo}
+
+def evaluar_bloque(grafo, poi_mapping, bloque, modos=None, coordenadas=False):
+    # Un resultado por pedido del bloque y modo: el del pedido (o
+    # peso_horapico) o, si se indican `modos`, cada uno de ellos para
+    # comparar. Las coordenadas solo van si se piden, como polyline. Un
+    # pedido que falla queda como error en su fila y el lote sigue
+    resultados = []
+    for fila, pedido in bloque:
+        try:
+            parametros = validar_pedido(pedido)
+        except Exception as e:
+            parametros = error_de_fila(fila, e)
+        identificador = pedido.get("id") if pedido is not None else None
+        for modo in modos or (pedido.get("modo", "peso_horapico") if pedido is not None else None,):
+            resultado = {"fila": fila, "id": identificador, "modo": modo,
+                         "tipo": parametros["tipo_ruta"] if isinstance(parametros, dict) else None, "ok": False}
+            if not isinstance(parametros, dict):
+                resultado["error"] = parametros
+            elif modo not in MODOS_TRAFICO:
+                resultado["error"] = f"Modo no válido: {modo}"
+            else:
+                try:
+                    ruta = resolver_ruta(grafo, poi_mapping, modo=modo, **parametros)
+                    if ruta is None:
+                        resultado["error"] = "No se encontró ruta"
+                    else:
+                        # Todo se arma antes de actualizar: una falla a mitad
+                        # no deja una fila con ok=True
+                        datos = {"distancia_metros": round(ruta["distancia_metros"], 1),
+                                 "tiempo_minutos": round(ruta["tiempo_minutos"], 2),
+                                 "puntos": len(ruta["coordenadas"])}
+                        if coordenadas:
+                            datos["polyline"] = codificar_polyline(ruta["coordenadas"])
+                        resultado.update(ok=True, **datos)
+                except Exception as e:
+                    resultado["error"] = error_de_fila(fila, e)
+            resultados.append(resultado)
+    return resultados
+
+def error_de_fila(fila, e):
+    log.exception("Error en la fila %s del lote", fila)
+    ERRORES.inc(funcion="evaluar_bloque")
+    return f"Error interno: {type(e).__name__}: {e}"
+
+def _bloque_en_trabajador(bloque, modos, coordenadas, generacion):
+    grafo, poi_mapping = _grafo_en_trabajador(None, generacion)
+    return evaluar_bloque(grafo, poi_mapping, bloque, modos, coordenadas)
+
+def evaluar_lote(entrada, salida="-", procesos=None, tam_bloque=TAM_BLOQUE, modos=None, coordenadas=False):
+    # route-batch: los pedidos del NDJSON `entrada` en bloques de
+    # `tam_bloque`, en `procesos` procesos que comparten la instantánea
+    # (0 = en este proceso), con los resultados en el orden de entrada. Los
+    # avisos de carga van a stderr: stdout puede ser la salida
+    with contextlib.redirect_stdout(sys.stderr):
+        grafo, poi_mapping = obtener_grafo()
+    categorias = {"modo": MODOS_TRAFICO, "tipo": TIPOS_RUTA}
+    if procesos == 0:
+        return evaluar_archivo(entrada, salida, lambda bloque: evaluar_bloque(grafo, poi_mapping, bloque, modos,
+                                                                              coordenadas),
+                               tam_bloque=tam_bloque, categorias=categorias)
+    if not os.path.isdir(SNAPSHOT_DIR):
+        raise GrafoNoDisponible("La evaluación en paralelo necesita la instantánea del grafo")
+    pool, procesos = obtener_pool(SNAPSHOT_DIR, procesos)
+    resumen = evaluar_archivo(entrada, salida, _bloque_en_trabajador, pool, procesos, tam_bloque, categorias,
+                              (modos, coordenadas, grafo.generacion))
+    return {**resumen, "memoria_trabajadores": memoria_trabajadores(pids_trabajadores())}
+
+def responder_ruta(resultado, formato="json", zoom=None):
+    # Las coordenadas pueden ir simplificadas para el zoom y en un formato
+    # compacto: "polyline" (texto) o "binary" (int32 con deltas; el resto de
+    # los campos viaja como JSON en la cabecera X-Ruta)
+    with cronometrar(FASES, fase="serializacion"):
+        coordenadas = resultado["coordenadas"]
+        if zoom is not None:
+            coordenadas = simplificar(coordenadas, zoom)
+        campos = {clave: valor for clave, valor in resultado.items() if clave != "coordenadas"}
+        if "alternativas" in campos and (zoom is not None or formato == "polyline"):
+            campos["alternativas"] = [_alternativa(alternativa, formato, zoom) for alternativa in campos["alternativas"]]
+        if formato == "binary":
+            respuesta = Response(empaquetar_binario(coordenadas), mimetype="application/octet-stream")
+            respuesta.headers["X-Ruta"] = json.dumps(campos)
+            respuesta.headers["X-Puntos"] = str(len(coordenadas))
+            return respuesta
+        if formato == "polyline":
+            return jsonify({**campos, "polyline": codificar_polyline(coordenadas), "precision": 5})
+        if zoom is not None:
+            return jsonify({**campos, "coordenadas": coordenadas.tolist()})
+        return jsonify(resultado)
+
+def _alternativa(resultado, formato, zoom):
+    coordenadas = resultado["coordenadas"]
+    if zoom is not None:
+        coordenadas = simplificar(coordenadas, zoom)
+    campos = {clave: valor for clave, valor in resultado.items() if clave != "coordenadas"}
+    if formato == "polyline":
+        return {**campos, "polyline": codificar_polyline(coordenadas), "precision": 5}
+    return {**campos, "coordenadas": coordenadas.tolist() if zoom is not None else coordenadas}
+
+def clave_cache(grafo, poi_mapping, tipo_ruta, modo, origen, destino, punto_c, paradas, salida, alternativas=0):
+    # Pedidos equivalentes comparten entrada: los puntos se reducen al nodo
+    # al que se ajustan, se ignoran los parámetros que el tipo de ruta no usa
+    # y las paradas no dependen del orden (sí de su texto, que vuelve en
+    # `orden`). El algoritmo no cambia el resultado. Devuelve (clave,
+    # generación) o None si algún punto no se resuelve
+    nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+    nodo_destino = resolver_punto(grafo, poi_mapping, destino)
+    if nodo_origen is None or nodo_destino is None:
+        return None
+    if tipo_ruta not in TIPOS_RUTA:
+        tipo_ruta = "normal"
+    intermedio = None
+    if tipo_ruta in ("con_parada", "con_obstaculo"):
+        intermedio = resolver_punto(grafo, poi_mapping, punto_c)
+        if intermedio is None and tipo_ruta == "con_parada":
+            return None
+    elif tipo_ruta == "multiparada":
+        nodos = [resolver_punto(grafo, poi_mapping, parada) for parada in paradas]
+        if any(nodo is None for nodo in nodos):
+            return None
+        intermedio = tuple(sorted(zip(nodos, paradas)))
+    if salida is not None:
+        # Con hora de salida el resultado depende de los perfiles, no del modo
+        return (tipo_ruta, None, salida, nodo_origen, nodo_destino, intermedio), grafo.huella_pesos("perfiles")
+    clave = (tipo_ruta, modo, None, nodo_origen, nodo_destino, intermedio)
+    if alternativas:
+        clave += (alternativas,)
+    return clave, grafo.huella_pesos(modo)
+
+def snapshot_compartido():
+    # Instantánea que abren los procesos de trabajo; dentro de uno de ellos
+    # no se abre otro pool
+    if en_trabajador() or not os.path.isdir(SNAPSHOT_DIR):
+        return None
+    return SNAPSHOT_DIR
+
+def despachador_matriz():
+    # Las matrices usan los procesos de trabajo solo en el modo de producción
+    # y a través del despachador (cupos y tiempo límite); dentro de un
+    # proceso de trabajo, o sin él, se calculan en el proceso
+    if en_trabajador():
+        return None
+    return obtener_despachador()
+
+def nodos_bloqueados(grafo, nodo_obstaculo, nodo_origen, nodo_destino, radio_metros=200):
+    latitudes, longitudes = grafo.coordenadas_listas()
+    nodos = set(grafo.espacial.en_radio(latitudes[nodo_obstaculo], longitudes[nodo_obstaculo],
+                                        radio_metros).tolist())
+    nodos.discard(nodo_origen)
+    nodos.discard(nodo_destino)
+    return nodos
+
+def parsear_hora(texto):
+    # "HH:MM" -> segundos desde la medianoche, o None si no es válida
+    try:
+        horas, minutos = (int(parte) for parte in texto.split(":"))
+    except ValueError:
+        return None
+    if not (0 <= horas < 24 and 0 <= minutos < 60):
+        return None
+    return horas * 3600 + minutos * 60
+
+def formato_hora(segundos):
+    dias, resto = divmod(int(round(segundos)), SEGUNDOS_DIA)
+    hora = f"{resto // 3600:02d}:{resto % 3600 // 60:02d}"
+    return f"{hora} (+{dias} d)" if dias else hora
+
+def buscar_ruta_dependiente(grafo, poi_mapping, origen, destino, salida, obstaculo=None, radio_metros=200):
+    # Ruta de llegada más temprana saliendo a `salida` (segundos desde la
+    # medianoche): la velocidad de cada arista sale de su perfil horario
+    nodo_origen = resolver_punto(grafo, poi_mapping, origen)
+    nodo_destino = resolver_punto(grafo, poi_mapping, destino)
+    if nodo_origen is None or nodo_destino is None:
+        return None
+
+    encontrada = None
+    estadisticas = {}
+    nodo_obstaculo = resolver_punto(grafo, poi_mapping, obstaculo)
+    with cronometrar(FASES, fase="busqueda"):
+        if nodo_obstaculo is not None:
+            bloqueados = nodos_bloqueados(grafo, nodo_obstaculo, nodo_origen, nodo_destino, radio_metros)
+            encontrada = dijkstra_dependiente(grafo, nodo_origen, nodo_destino, salida, bloqueados, estadisticas)
+            if encontrada is None:
+                estadisticas["degradacion"] = "obstaculo_sin_desvio"
+        if encontrada is None:
+            encontrada = dijkstra_dependiente(grafo, nodo_origen, nodo_destino, salida, estadisticas=estadisticas)
+    anotar_busqueda("dependiente", estadisticas)
+    if encontrada is None:
+        return None
+    llegada, ruta, entradas = encontrada
+    if len(ruta) < 2:
+        return None
+
+    with cronometrar(FASES, fase="reconstruccion"):
+        coords_ruta = grafo.coordenadas(ruta)
+        distancia_total = grafo.distancia(entradas)
+    resultado = resumen_ruta(coords_ruta, distancia_total, (llegada - salida) / 60)
+    resultado["salida"] = formato_hora(salida)
+    resultado["llegada"] = formato_hora(llegada)
+    # Los perfiles son los de la instantánea: la congestión en vivo de
+    # /trafico y /simulacion solo cambia los pesos por modo
+    resultado["perfiles"] = "historicos"
+    return resultado
+
+def buscar_ruta_dependiente_con_parada(grafo, poi_mapping, origen, parada, destino, salida):
+    # El segundo tramo sale de la parada a la hora en que llega el primero
+    ruta1 = buscar_ruta_dependiente(grafo, poi_mapping, origen, parada, salida)
+    if ruta1 is None:
+        return None
+    ruta2 = buscar_ruta_dependiente(grafo, poi_mapping, parada, destino, salida + ruta1["tiempo_minutos"] * 60)
+    if ruta2 is None:
+        return None
+
+    resultado = resumen_ruta(ruta1["coordenadas"][:-1] + ruta2["coordenadas"],
+                             ruta1["distancia_metros"] + ruta2["distancia_metros"],
+                             ruta1["tiempo_minutos"] + ruta2["tiempo_minutos"])
+    resultado["salida"] = ruta1["salida"]
+    resultado["llegada"] = ruta2["llegada"]
+    resultado["perfiles"] = ruta1["perfiles"]
+    return resultado
+
+def perfiles_por_hora(grafo, intervalos=INTERVALOS_PERFIL):
+    # Perfil de velocidad de cada arista a partir del horario de modos: la
+    # velocidad del modo vigente en cada intervalo, y en hora pico escalada
+    # por la congestión relativa de la arista
+    modos = [modo_trafico_para_hora(int(i * 24 // intervalos))[0] for i in range(intervalos)]
+    velocidades = [VELOCIDADES_MODO[modo] for modo in modos]
+    sensibilidad = [1.0 if modo == "peso_horapico" else 0.0 for modo in modos]
+    return construir_perfiles(grafo, velocidades, sensibilidad)
+
+
+def compilar_y_guardar(G, poi_mapping):
+    return guardar_compilado(compilar_grafo(G), poi_mapping)
+
+def guardar_compilado(grafo, poi_mapping):
+    cargar_indice_espacial(grafo)
+    grafo.perfiles = perfiles_por_hora(grafo)
+    print("Guardando instantánea binaria del grafo...")
+    guardar_snapshot(SNAPSHOT_DIR, grafo, poi_mapping)
+    return grafo
+
+class GrafoNoDisponible(RuntimeError):
+    pass
+
+def preparar_grafo():
+    # Instantánea binaria primero; si falta o no es válida, el pickle. La
+    # descarga desde OSM solo ocurre con el comando build-graph. El servidor
+    # carga una sola vez: recalcula los sha1 aquí, y los trabajadores, que
+    # abren la misma generación ya comprobada, solo comparan tipo y forma
+    snapshot = cargar_snapshot(SNAPSHOT_DIR, verificar=True)
+    if snapshot is not None:
+        print("Grafo cargado desde instantánea binaria")
+        grafo, poi_mapping = snapshot
+        if grafo.perfiles is None:
+            # Instantánea anterior a los perfiles horarios
+            grafo.perfiles = perfiles_por_hora(grafo)
+            guardar_snapshot(SNAPSHOT_DIR, grafo, poi_mapping)
+        return snapshot
+
+    data = cargar_grafo()
+    if data is None:
+        raise GrafoNoDisponible("No hay grafo guardado; ejecute 'python app.py build-graph'")
     print("Grafo cargado desde archivo")
+    G, poi_mapping, _ = data
+    return compilar_y_guardar(G, poi_mapping), poi_mapping
 
-POIS_USUARIO = [
-    (14.61119100485585, -90.48580778897217),
-    (14.618944838124076, -90.48081377973796),
-    (14.618582412910866, -90.48420743608744),
-    (14.612142341881135, -90.49900242733989),
-    (14.614371861881606, -90.49132981324811),
-    (14.600884567886517, -90.47892424008336),
-    (14.596326378463905, -90.48123964433496),
-    (14.597073268975551, -90.48314644782701),
-    (14.60100190653431, -90.48819584711718),
-    (14.608097113251654, -90.4832018378643)
-]
+def construir_grafo(procesos=None, sin_red=False, extracto=None, semilla=None):
+    red, poi_mapping = crear_red(procesos, sin_red, extracto, semilla)
+    # El tercer elemento eran las aristas para el mapa, que ahora usa teselas
+    guardar_grafo((grafo_networkx(red), poi_mapping, None))
+    grafo = desde_aristas(red["nodos"], red["lat"], red["lon"], red["u"], red["v"], red["pesos"], red["congestion"])
+    grafo = guardar_compilado(grafo, poi_mapping)
+    cargar_tabla_rutas(grafo, poi_mapping)
+    return grafo, poi_mapping
+
+def construir_jerarquias(grafo, poi_mapping):
+    # Preproceso de Contraction Hierarchies para los tres modos; queda guardado
+    # en la instantánea y se usa con algoritmo=ch
+    estadisticas = {}
+    for modo in MODOS_TRAFICO:
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        jerarquia = construir_ch(grafo, modo)
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        grafo.jerarquias[modo] = jerarquia
+        estadisticas[modo] = {
+            "segundos": round(segundos, 3),
+            "memoria_pico_mb": round(pico / 2**20, 1),
+            "atajos": jerarquia.num_atajos,
+            "aristas_subida": len(jerarquia.indices),
+        }
+        print(f"CH {modo}: {estadisticas[modo]}")
+    guardar_snapshot(SNAPSHOT_DIR, grafo, poi_mapping)
+    return estadisticas
+
+# Estado compartido: el grafo se carga la primera vez que se necesita
+_estado = {}
+lock_simulacion = threading.Lock()
+_estado_lock = threading.Lock()
+cache_rutas = CacheRutas()
+# Árboles de isocrona por (nodo de origen, modo)
+arboles_isocrona = CacheRutas(capacidad=256)
+teselas_trafico = CacheTeselas()
+
+def obtener_despachador():
+    # Modo de producción (crear_app con trabajadores): las búsquedas van a un
+    # pool de procesos que comparten la instantánea
+    config = _estado.get("servicio")
+    if config is None:
+        return None
+    if "despachador" not in _estado:
+        obtener_grafo()
+        with _estado_lock:
+            if "despachador" not in _estado:
+                ruta_snapshot = snapshot_compartido()
+                if ruta_snapshot is None:
+                    raise GrafoNoDisponible("El modo de producción necesita la instantánea del grafo")
+                _estado["despachador"] = Despachador(ruta_snapshot, **config)
+    return _estado["despachador"]
+
+def obtener_grafo():
+    if "grafo" not in _estado or generacion_nueva(_estado["grafo"]):
+        with _estado_lock:
+            if "grafo" not in _estado or generacion_nueva(_estado["grafo"]):
+                grafo, poi_mapping = preparar_grafo()
+                cargar_tabla_rutas(grafo, poi_mapping)
+                if "grafo" in _estado:
+                    # Grafo reconstruido: lo que dependía del anterior se
+                    # descarta; las cachés de rutas e isocronas se validan
+                    # con la huella de los pesos y no sirven del grafo nuevo
+                    _estado.pop("simulador", None)
+                    teselas_trafico.vaciar()
+                    log.info("Grafo cambiado a la generación %s", grafo.generacion)
+                _estado["poi_mapping"], _estado["grafo"] = poi_mapping, grafo
+    return _estado["grafo"], _estado["poi_mapping"]
 
-@app.route('/')
+def generacion_nueva(grafo):
+    # build-graph o build-ch (en otro proceso) publicaron otra generación de
+    # la instantánea. Las búsquedas en curso terminan con el grafo anterior
+    generacion = generacion_snapshot(SNAPSHOT_DIR)
+    return generacion is not None and generacion != grafo.generacion
+
+def calentar():
+    # Deja grafo, tabla de rutas y vistas de búsqueda listas antes del primer pedido
+    _estado["calentando"] = True
+    try:
+        grafo, _ = obtener_grafo()
+        for modo in MODOS_TRAFICO:
+            grafo.adyacencia(modo)
+        grafo.coordenadas_listas()
+        despachador = obtener_despachador()
+        if despachador is not None:
+            despachador.calentar()
+        _estado["listo"] = True
+        print("Aplicación lista")
+    except GrafoNoDisponible as e:
+        _estado["error"] = str(e)
+        _estado["calentando"] = False
+        print(e)
+
+@bp.route('/')
 def index():
-    modo_actual, nombre_modo = obtener_modo_trafico_actual()
-    hora_actual = datetime.now().strftime("%H:%M")
-    
-    cx = sum(lon for lat, lon in POIS_USUARIO) / len(POIS_USUARIO)
-    cy = sum(lat for lat, lon in POIS_USUARIO) / len(POIS_USUARIO)
-    
-    # Convertir edges_data a JSON para JavaScript
-    edges_json = json.dumps(edges_data)
-    pois_json = json.dumps(POIS_USUARIO)
-    
-    html = f'''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Calculador de Rutas</title>
-    <meta charset="utf-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/>
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <style>
-        body {{ margin: 0; padding: 0; }}
-        #map {{ position: absolute; top: 0; bottom: 0; width: 100%; }}
-        #panel {{
-            position: absolute; top: 10px; left: 10px; z-index: 1000;
-            background: white; padding: 15px; border-radius: 8px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.3); font-family: Arial;
-            max-width: 260px;
-        }}
-        select, button {{ width: 100%; padding: 8px; margin: 4px 0; border-radius: 4px; }}
-        select {{ border: 1px solid #ccc; }}
-        button {{ background: #007bff; color: white; border: none; cursor: pointer; font-weight: bold; }}
-        button:hover {{ background: #0056b3; }}
-        #info {{ margin-top: 10px; padding: 10px; background: #f8f9fa; border-radius: 4px; display: none; }}
-        .legend {{
-            position: absolute; bottom: 20px; right: 10px; z-index: 1000;
-            background: white; padding: 10px; border-radius: 5px;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.3); font-family: Arial; font-size: 12px;
-        }}
-        .legend-item {{ display: flex; align-items: center; margin: 3px 0; }}
-        .legend-color {{ width: 20px; height: 10px; margin-right: 8px; border-radius: 2px; }}
-    </style>
-</head>
-<body>
-    <div id="map"></div>
-    
-    <div id="panel">
-        <h3 style="margin:0 0 5px;">Calculador de Rutas</h3>
-        <p style="font-size:11px;color:#666;margin:0 0 8px;">
-            Hora: <b>{hora_actual}</b> - <span id="modoActual" style="color:{"#cc0000" if "Pico" in nombre_modo else "#00aa00"}">{nombre_modo}</span>
-        </p>
-        <div style="background:#f5f5f5;padding:6px;border-radius:4px;margin-bottom:8px;font-size:10px;">
-            🔴 Pico: 6-9h, 17-20h | 🟡 Normal: 9-17h | 🟢 Libre: 20-6h
-        </div>
-        
-        <label style="font-size:12px;"><b>Origen:</b></label>
-        <select id="origen">
-            {"".join([f'<option value="POI_{i}">Punto {i}</option>' for i in range(1, 11)])}
-        </select>
-        
-        <label style="font-size:12px;"><b>Destino:</b></label>
-        <select id="destino">
-            {"".join([f'<option value="POI_{i}" {"selected" if i==6 else ""}>Punto {i}</option>' for i in range(1, 11)])}
-        </select>
-        
-        <label style="font-size:12px;"><b>Tipo de Ruta:</b></label>
-        <select id="tipo_ruta" onchange="actualizarTipoRuta()">
-            <option value="normal">Ruta Normal</option>
-            <option value="con_parada">Ruta con Parada</option>
-            <option value="con_obstaculo">Ruta con Obstáculo</option>
-        </select>
-        
-        <div id="punto_c_container" style="display:none;">
-            <label style="font-size:12px;"><b id="punto_c_label">Punto C:</b></label>
-            <select id="punto_c">
-                {"".join([f'<option value="POI_{i}">Punto {i}</option>' for i in range(1, 11)])}
-            </select>
-        </div>
-        
-        <label style="font-size:12px;"><b>Modo de Tráfico:</b></label>
-        <select id="modo" onchange="cambiarModoTrafico()">
-            <option value="peso_horapico" {"selected" if modo_actual=="peso_horapico" else ""}>🔴 Hora Pico</option>
-            <option value="peso_normal" {"selected" if modo_actual=="peso_normal" else ""}>🟡 Normal</option>
-            <option value="peso_libre" {"selected" if modo_actual=="peso_libre" else ""}>🟢 Libre</option>
-        </select>
-        
-        <button onclick="calcularRuta()">📍 Calcular Ruta</button>
-        <div id="info"></div>
-    </div>
-    
-    <div class="legend" id="legend">
-        <b>Nivel de Tráfico</b>
-        <div class="legend-item"><div class="legend-color" style="background:#b30000"></div> Muy pesado</div>
-        <div class="legend-item"><div class="legend-color" style="background:#ff6600"></div> Pesado</div>
-        <div class="legend-item"><div class="legend-color" style="background:#ffcc00"></div> Moderado</div>
-        <div class="legend-item"><div class="legend-color" style="background:#00cc00"></div> Libre</div>
-    </div>
-
-    <script>
-        var map = L.map('map').setView([{cy}, {cx}], 15);
-        
-        L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
-            attribution: '© OpenStreetMap'
-        }}).addTo(map);
-        
-        var edgesData = {edges_json};
-        var poisData = {pois_json};
-        var trafficLayer = L.layerGroup().addTo(map);
-        var rutaLayer = null;
-        var poisLayer = L.layerGroup().addTo(map);
-        
-        // Función para obtener color según modo y congestión
-        function getColor(congestion, modo) {{
-            if (modo === 'peso_libre') {{
-                return '#00cc00';  // Verde para todo
-            }} else if (modo === 'peso_normal') {{
-                if (congestion > 2.5) return '#ffcc00';
-                return '#0066ff';  // Azul
-            }} else {{  // hora pico
-                if (congestion > 2.8) return '#b30000';  // Rojo oscuro
-                if (congestion > 2.2) return '#ff6600';  // Naranja
-                return '#ffcc00';  // Amarillo
-            }}
-        }}
-        
-        // Dibujar tráfico según modo
-        function dibujarTrafico(modo) {{
-            trafficLayer.clearLayers();
-            
-            edgesData.forEach(function(edge) {{
-                var color = getColor(edge.congestion, modo);
-                L.polyline(edge.coords, {{
-                    color: color,
-                    weight: 4,
-                    opacity: 0.8
-                }}).addTo(trafficLayer);
-            }});
-            
-            // Actualizar leyenda
-            var legend = document.getElementById('legend');
-            if (modo === 'peso_libre') {{
-                legend.innerHTML = '<b>🟢 Hora Libre</b><div class="legend-item"><div class="legend-color" style="background:#00cc00"></div> Tráfico fluido</div>';
-            }} else if (modo === 'peso_normal') {{
-                legend.innerHTML = '<b>🟡 Tráfico Normal</b><div class="legend-item"><div class="legend-color" style="background:#0066ff"></div> Normal</div><div class="legend-item"><div class="legend-color" style="background:#ffcc00"></div> Algo lento</div>';
-            }} else {{
-                legend.innerHTML = '<b>🔴 Hora Pico</b><div class="legend-item"><div class="legend-color" style="background:#b30000"></div> Muy pesado</div><div class="legend-item"><div class="legend-color" style="background:#ff6600"></div> Pesado</div><div class="legend-item"><div class="legend-color" style="background:#ffcc00"></div> Moderado</div>';
-            }}
-            
-            // Actualizar texto del modo actual
-            var modoTexto = document.getElementById('modoActual');
-            if (modo === 'peso_horapico') {{
-                modoTexto.textContent = 'Hora Pico';
-                modoTexto.style.color = '#cc0000';
-            }} else if (modo === 'peso_normal') {{
-                modoTexto.textContent = 'Tráfico Normal';
-                modoTexto.style.color = '#cc9900';
-            }} else {{
-                modoTexto.textContent = 'Hora Libre';
-                modoTexto.style.color = '#00aa00';
-            }}
-        }}
-        
-        // Dibujar POIs
-        function dibujarPOIs() {{
-            poisData.forEach(function(poi, index) {{
-                var i = index + 1;
-                var icon = L.divIcon({{
-                    html: '<div style="background:#ff0000;width:28px;height:28px;border-radius:50%;border:2px solid white;box-shadow:0 2px 5px rgba(0,0,0,0.5);display:flex;align-items:center;justify-content:center;color:white;font-weight:bold;font-size:12px;">' + i + '</div>',
-                    iconSize: [28, 28],
-                    iconAnchor: [14, 14],
-                    className: ''
-                }});
-                L.marker([poi[0], poi[1]], {{icon: icon}})
-                    .bindPopup('Punto ' + i)
-                    .addTo(poisLayer);
-            }});
-        }}
-        
-        // Cambiar modo de tráfico
-        function cambiarModoTrafico() {{
-            var modo = document.getElementById('modo').value;
-            dibujarTrafico(modo);
-        }}
-        
-        // Actualizar tipo de ruta
-        function actualizarTipoRuta() {{
-            var tipo = document.getElementById('tipo_ruta').value;
-            var container = document.getElementById('punto_c_container');
-            var label = document.getElementById('punto_c_label');
-            
-            if (tipo === 'normal') {{
-                container.style.display = 'none';
-            }} else {{
-                container.style.display = 'block';
-                if (tipo === 'con_parada') {{
-                    label.textContent = 'Punto de Parada:';
-                }} else {{
-                    label.textContent = 'Punto Obstáculo:';
-                }}
-            }}
-        }}
-        
-        // Calcular ruta
-        function calcularRuta() {{
-            var origen = document.getElementById('origen').value;
-            var destino = document.getElementById('destino').value;
-            var modo = document.getElementById('modo').value;
-            var tipo = document.getElementById('tipo_ruta').value;
-            var punto_c = document.getElementById('punto_c').value;
-            var info = document.getElementById('info');
-            
-            info.style.display = 'block';
-            info.innerHTML = 'Calculando...';
-            
-            if (origen === destino) {{
-                info.innerHTML = '<span style="color:#cc0000"> Origen y destino deben ser diferentes</span>';
-                return;
-            }}
-            
-            if ((tipo === 'con_parada' || tipo === 'con_obstaculo') && punto_c === origen) {{
-                info.innerHTML = '<span style="color:#cc0000"> El punto C debe ser diferente al origen</span>';
-                return;
-            }}
-            
-            if ((tipo === 'con_parada' || tipo === 'con_obstaculo') && punto_c === destino) {{
-                info.innerHTML = '<span style="color:#cc0000"> El punto C debe ser diferente al destino</span>';
-                return;
-            }}
-            
-            var url = '/calcular_ruta?origen=' + origen + '&destino=' + destino + '&modo=' + modo + '&tipo=' + tipo;
-            if (tipo !== 'normal') {{
-                url += '&punto_c=' + punto_c;
-            }}
-            
-            fetch(url)
-                .then(function(r) {{ return r.json(); }})
-                .then(function(data) {{
-                    if (data.error) {{
-                        info.innerHTML = '<span style="color:#cc0000"> ' + data.error + '</span>';
-                        return;
-                    }}
-                    
-                    if (rutaLayer) {{
-                        map.removeLayer(rutaLayer);
-                    }}
-                    
-                    if (data.coordenadas && data.coordenadas.length > 1) {{
-                        rutaLayer = L.polyline(data.coordenadas, {{
-                            color: '#00ff00',
-                            weight: 7,
-                            opacity: 0.9
-                        }}).addTo(map);
-                        
-                        var bounds = rutaLayer.getBounds();
-                        if (bounds.isValid()) {{
-                            map.fitBounds(bounds, {{padding: [50, 50]}});
-                        }}
-                    }}
-                    
-                    info.innerHTML = 
-                        '<div style="border-left:3px solid #00cc00;padding-left:8px;">' +
-                        '<p style="margin:3px 0;"><b> Distancia:</b> ' + data.distancia_km.toFixed(2) + ' km</p>' +
-                        '<p style="margin:3px 0;"><b> Tiempo:</b> ' + data.tiempo_formato + '</p>' +
-                        '</div>';
-                }})
-                .catch(function(err) {{
-                    info.innerHTML = '<span style="color:#cc0000"> Error de conexión</span>';
-                }});
-        }}
-        
-        // Inicializar
-        dibujarTrafico('{modo_actual}');
-        dibujarPOIs();
-    </script>
-</body>
-</html>
-'''
-    return html
-
-@app.route('/calcular_ruta')
+    # La página no depende del grafo ni de la hora: se arma una vez y el
+    # navegador la revalida con el ETag. El tráfico llega por teselas
+    if "index" not in _estado:
+        cx = sum(lon for lat, lon in POIS_USUARIO) / len(POIS_USUARIO)
+        cy = sum(lat for lat, lon in POIS_USUARIO) / len(POIS_USUARIO)
+        html = render_template("index.html", cx=cx, cy=cy, num_pois=len(POIS_USUARIO),
+                               pois_json=json.dumps(POIS_USUARIO)).encode()
+        _estado["index"] = (html, hashlib.sha1(html).hexdigest()[:20])
+    html, etag = _estado["index"]
+    respuesta = Response(html, mimetype="text/html")
+    respuesta.set_etag(etag)
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = 300
+    return respuesta.make_conditional(request)
+
+@bp.route('/trafico/<modo>/<int:z>/<int:x>/<int:y>.json')
+def tesela_trafico(modo, z, x, y):
+    if modo not in MODOS_TRAFICO:
+        return jsonify({"error": f"Modo no válido: {modo}"}), 400
+    if not (0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "Tesela fuera de rango"}), 400
+    grafo, _ = obtener_grafo()
+    codificacion = codificacion_aceptada(request.headers.get("Accept-Encoding"))
+    cuerpo, etag = teselas_trafico.obtener(grafo, modo, z, x, y, codificacion)
+    respuesta = Response(cuerpo, mimetype="application/geo+json")
+    if codificacion:
+        respuesta.headers["Content-Encoding"] = codificacion
+    respuesta.headers["Vary"] = "Accept-Encoding"
+    respuesta.set_etag(etag)
+    # Corto: la congestión puede cambiar; el ETag evita reenviar lo que no cambió
+    respuesta.cache_control.public = True
+    respuesta.cache_control.max_age = 30
+    return respuesta.make_conditional(request)
+
+@bp.before_app_request
+def iniciar_calentamiento():
+    # Sin efectos al importar: el primer pedido (normalmente el sondeo de /listo)
+    # dispara la carga en segundo plano
+    if not _estado.get("calentando"):
+        with _estado_lock:
+            if not _estado.get("calentando"):
+                _estado["calentando"] = True
+                threading.Thread(target=calentar, daemon=True).start()
+
+@bp.route('/listo')
+def listo():
+    if not _estado.get("listo"):
+        return jsonify({"listo": False, "error": _estado.get("error")}), 503
+    grafo = _estado["grafo"]
+    despachador = _estado.get("despachador")
+    return jsonify({
+        "listo": True,
+        "nodos": grafo.num_nodos,
+        "aristas": grafo.num_aristas,
+        "rutas_precalculadas": len(grafo.tabla_rutas),
+        "generacion": grafo.generacion,
+        "memoria": memoria_proceso(),
+        "servicio": despachador.estadisticas() if despachador is not None else None
+    })
+
+@bp.route('/trafico', methods=['POST'])
+def actualizar_trafico():
+    # JSON {"aristas": [...], "congestion": [...]} o un flujo NDJSON
+    # (Content-Type: application/x-ndjson) con una actualización por línea
+    grafo, _ = obtener_grafo()
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            lineas = (linea.decode('utf-8') for linea in request.stream)
+            resumen = aplicar_lotes(grafo, leer_lotes_ndjson(lineas), cache_rutas)
+        else:
+            datos = request.get_json(silent=True)
+            if not isinstance(datos, dict) or "aristas" not in datos or "congestion" not in datos:
+                return jsonify({"error": "Se esperaba {\"aristas\": [...], \"congestion\": [...]}"}), 400
+            resumen = aplicar_lotes(grafo, [(datos["aristas"], datos["congestion"])], cache_rutas)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Las teselas de la versión anterior ya no se sirven
+    teselas_trafico.vaciar()
+    return jsonify(resumen)
+
+@bp.route('/simulacion', methods=['GET', 'POST'])
+def simulacion_endpoint():
+    # POST {"semilla": 1, "hora": "06:00", "minutos": 60, "paso": 5}: con
+    # semilla u hora (o la primera vez) la simulación empieza de nuevo; después
+    # avanza `minutos` en pasos de `paso` y la congestión final reemplaza la
+    # de todas las aristas
+    if request.method == 'GET':
+        simulador = _estado.get("simulador")
+        if simulador is None:
+            return jsonify({"error": "La simulación no se inició"}), 404
+        return jsonify(simulador.estado())
+
+    datos = request.get_json(silent=True) or {}
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON"}), 400
+    hora = datos.get("hora")
+    if hora is not None and (not isinstance(hora, str) or parsear_hora(hora) is None):
+        return jsonify({"error": f"Hora no válida (HH:MM): {hora}"}), 400
+    semilla = datos.get("semilla")
+    if semilla is not None and (not isinstance(semilla, int) or isinstance(semilla, bool) or semilla < 0):
+        return jsonify({"error": "La semilla debe ser un entero no negativo"}), 400
+    try:
+        minutos = float(datos.get("minutos", 0))
+        paso = float(datos.get("paso", PASO_MINUTOS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "'minutos' y 'paso' deben ser números"}), 400
+    if not (0 <= minutos <= MAX_MINUTOS_SIMULACION) or not (MIN_PASO_SIMULACION <= paso <= 60):
+        return jsonify({"error": f"'minutos' va de 0 a {MAX_MINUTOS_SIMULACION} y 'paso' de "
+                                 f"{MIN_PASO_SIMULACION} a 60"}), 400
+
+    grafo, _ = obtener_grafo()
+    with lock_simulacion:
+        simulador = _estado.get("simulador")
+        if simulador is None or len(simulador.u) != grafo.num_aristas or semilla is not None or hora is not None:
+            inicio = parsear_hora(hora) / 3600 if hora is not None else HORA_PICO
+            simulador = _estado["simulador"] = SimuladorTrafico(grafo.u, grafo.v, grafo.num_nodos, semilla, inicio)
+        segundos = time.perf_counter()
+        simulador.avanzar_minutos(minutos, paso)
+        segundos = time.perf_counter() - segundos
+        resumen = aplicar_congestion(grafo, simulador.congestion(), cache_rutas)
+    teselas_trafico.vaciar()
+    return jsonify({**simulador.estado(), "segundos_simulacion": segundos, **resumen})
+
+@bp.errorhandler(GrafoNoDisponible)
+def grafo_no_disponible(e):
+    return jsonify({"error": str(e)}), 503
+
+@bp.errorhandler(ServicioSaturado)
+def servicio_saturado(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+@bp.errorhandler(TiempoAgotado)
+def tiempo_agotado(e):
+    return jsonify({"error": "La búsqueda superó el tiempo límite"}), 504
+
+@bp.route('/matriz', methods=['POST'])
+def matriz_endpoint():
+    # {"origenes": [...], "destinos": [...], "modo": "peso_horapico"}; sin
+    # destinos, la matriz es de los orígenes entre sí
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict) or not isinstance(datos.get("origenes"), list):
+        return jsonify({"error": "Se esperaba {\"origenes\": [...], \"destinos\": [...]}"}), 400
+    origenes = datos["origenes"]
+    destinos = datos.get("destinos", origenes)
+    modo = datos.get("modo", "peso_horapico")
+    if not isinstance(destinos, list) or not all(isinstance(p, str) for p in origenes + destinos):
+        return jsonify({"error": "Los puntos deben ser nombres de POI o \"lat,lon\""}), 400
+    if not origenes or not destinos:
+        return jsonify({"error": "Faltan orígenes o destinos"}), 400
+    if len(origenes) > MAX_MATRIZ or len(destinos) > MAX_MATRIZ:
+        return jsonify({"error": f"Máximo {MAX_MATRIZ} orígenes y {MAX_MATRIZ} destinos"}), 400
+    if modo not in MODOS_TRAFICO:
+        return jsonify({"error": f"Modo no válido: {modo}"}), 400
+
+    grafo, poi_mapping = obtener_grafo()
+    try:
+        return jsonify(calcular_matriz(grafo, poi_mapping, origenes, destinos, modo))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@bp.route('/isocrona')
+def isocrona_endpoint():
+    origen = request.args.get('origen')
+    modo = request.args.get('modo', 'peso_horapico')
+    if not origen:
+        return jsonify({"error": "Falta el origen"}), 400
+    if modo not in MODOS_TRAFICO:
+        return jsonify({"error": f"Modo no válido: {modo}"}), 400
+    presupuestos = {}
+    for unidad in ('minutos', 'metros'):
+        valores = [v for v in request.args.get(unidad, '').split(',') if v]
+        try:
+            presupuestos[unidad] = [float(v) for v in valores]
+        except ValueError:
+            return jsonify({"error": f"Los {unidad} deben ser números separados por comas"}), 400
+    cantidad = len(presupuestos['minutos']) + len(presupuestos['metros'])
+    if cantidad == 0:
+        return jsonify({"error": "Faltan los presupuestos (minutos o metros)"}), 400
+    if cantidad > MAX_PRESUPUESTOS:
+        return jsonify({"error": f"Máximo {MAX_PRESUPUESTOS} presupuestos"}), 400
+    if any(not (math.isfinite(v) and v > 0) for valores in presupuestos.values() for v in valores):
+        return jsonify({"error": "Los presupuestos deben ser positivos"}), 400
+
+    grafo, poi_mapping = obtener_grafo()
+    resultado = calcular_isocrona(grafo, poi_mapping, origen, modo, **presupuestos)
+    if resultado is None:
+        return jsonify({"error": f"Punto no encontrado: {origen}"}), 404
+    return Response(json.dumps(resultado, separators=(",", ":")), mimetype="application/geo+json")
+
+@bp.route('/calcular_ruta')
 def calcular_ruta_endpoint():
     origen = request.args.get('origen')
     destino = request.args.get('destino')
     modo = request.args.get('modo', 'peso_horapico')
     tipo_ruta = request.args.get('tipo', 'normal')
     punto_c = request.args.get('punto_c')
+    algoritmo = request.args.get('algoritmo', 'dijkstra')
+    salida = request.args.get('salida')
+    formato = request.args.get('formato', 'json')
+    zoom = request.args.get('zoom')
+    alternativas = request.args.get('alternativas', '0')
     
     if not origen or not destino:
         return jsonify({"error": "Faltan parámetros"}), 400
+    if algoritmo not in ALGORITMOS:
+        return jsonify({"error": f"Algoritmo no válido: {algoritmo}"}), 400
+    if formato not in FORMATOS:
+        return jsonify({"error": f"Formato no válido: {formato}"}), 400
+    if zoom is not None:
+        if not zoom.isdigit() or not 0 <= int(zoom) <= 22:
+            return jsonify({"error": "El zoom debe ser un entero entre 0 y 22"}), 400
+        zoom = int(zoom)
+    if salida is not None and parsear_hora(salida) is None:
+        return jsonify({"error": f"Hora de salida no válida (HH:MM): {salida}"}), 400
+    if not alternativas.isdigit() or int(alternativas) > MAX_ALTERNATIVAS:
+        return jsonify({"error": f"Las alternativas deben ser un entero entre 0 y {MAX_ALTERNATIVAS}"}), 400
+    alternativas = int(alternativas)
+    if alternativas and (tipo_ruta != 'normal' or salida is not None or formato == 'binary'):
+        return jsonify({"error": "Las alternativas solo están disponibles para rutas normales, sin hora de salida "
+                                 "y fuera del formato binary"}), 400
+    if tipo_ruta in ('con_parada', 'con_obstaculo') and not punto_c:
+        mensaje = "Falta el punto de parada" if tipo_ruta == 'con_parada' else "Falta el punto obstáculo"
+        return jsonify({"error": mensaje}), 400
+    # Paradas separadas por ";" (las coordenadas "lat,lon" ya usan la coma)
+    paradas = [p for p in request.args.get('paradas', '').split(';') if p]
+    if tipo_ruta == 'multiparada':
+        if not paradas:
+            return jsonify({"error": "Faltan las paradas"}), 400
+        if len(paradas) > MAX_PARADAS:
+            return jsonify({"error": f"Máximo {MAX_PARADAS} paradas"}), 400
+        if salida is not None:
+            return jsonify({"error": "La ruta multiparada no admite hora de salida"}), 400
     
-    if tipo_ruta == 'con_parada':
-        if not punto_c:
-            return jsonify({"error": "Falta el punto de parada"}), 400
-        resultado = calcular_ruta_con_parada(G, poi_mapping, origen, punto_c, destino, modo)
-    elif tipo_ruta == 'con_obstaculo':
-        if not punto_c:
-            return jsonify({"error": "Falta el punto obstáculo"}), 400
-        resultado = calcular_ruta_con_obstaculo(G, poi_mapping, origen, destino, punto_c, modo)
+    grafo, poi_mapping = obtener_grafo()
+    segundos = parsear_hora(salida) if salida is not None else None
+    en_cache = clave_cache(grafo, poi_mapping, tipo_ruta, modo, origen, destino, punto_c, paradas, segundos,
+                           alternativas)
+    if en_cache is not None:
+        resultado = cache_rutas.obtener(*en_cache)
+        CONSULTAS_CACHE.inc(resultado="fallo" if resultado is None else "acierto")
+        if resultado is not None:
+            return responder_ruta(resultado, formato, zoom)
+
+    parametros = {"tipo_ruta": tipo_ruta, "modo": modo, "origen": origen, "destino": destino,
+                  "punto_c": punto_c, "paradas": paradas, "salida": segundos, "algoritmo": algoritmo,
+                  "alternativas": alternativas}
+    despachador = obtener_despachador()
+    if despachador is not None:
+        pesos = None
+        if segundos is None:
+            publicados = publicar_pesos(grafo, modo)
+            pesos = {modo: publicados} if publicados else None
+        resultado, detalle, anotado = despachador.ejecutar(_ruta_en_trabajador, parametros, pesos, grafo.generacion)
+        registro.fusionar(anotado)
     else:
-        resultado = calcular_ruta(G, poi_mapping, origen, destino, modo)
+        detalle = {}
+        resultado = resolver_ruta(grafo, poi_mapping, **parametros, detalle=detalle)
     
     if resultado is None:
         return jsonify({"error": f"No se encontró ruta de {origen} a {destino}"}), 404
+    if en_cache is not None:
+        cache_rutas.guardar(en_cache[0], en_cache[1], resultado, detalle or None)
     
-    return jsonify(resultado)
+    return responder_ruta(resultado, formato, zoom)
+
+@bp.route('/cache')
+def estadisticas_cache():
+    return jsonify({**cache_rutas.estadisticas(), "isocronas": arboles_isocrona.estadisticas()})
+
+@bp.before_request
+def iniciar_cronometro():
+    g.inicio_pedido = time.perf_counter()
+
+@bp.after_request
+def anotar_pedido(respuesta):
+    # La plantilla de la ruta (no la URL) mantiene acotadas las etiquetas
+    ruta = request.url_rule.rule if request.url_rule is not None else "desconocida"
+    PEDIDOS.inc(ruta=ruta, codigo=respuesta.status_code)
+    if "inicio_pedido" in g:
+        DURACION_PEDIDOS.observar(time.perf_counter() - g.inicio_pedido, ruta=ruta)
+    return respuesta
+
+@bp.route('/metrics')
+def metricas_endpoint():
+    return Response(registro.exponer(), mimetype="text/plain; version=0.0.4")
+
+@bp.route('/perfilador', methods=['GET', 'POST'])
+def perfilador_endpoint():
+    # POST {"activo": true, "intervalo": 0.005} enciende el muestreo de pilas
+    # del proceso del servidor; {"activo": false} lo apaga. GET devuelve las
+    # pilas plegadas acumuladas (texto para flamegraph.pl o speedscope)
+    if request.method == 'GET':
+        return Response(perfilador.plegadas(), mimetype="text/plain")
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict) or not isinstance(datos.get("activo"), bool):
+        return jsonify({"error": "Se esperaba {\"activo\": true|false}"}), 400
+    if datos["activo"]:
+        intervalo = datos.get("intervalo", 0.005)
+        if not isinstance(intervalo, (int, float)) or not 0.0005 <= intervalo <= 1:
+            return jsonify({"error": "El intervalo debe estar entre 0.0005 y 1 segundos"}), 400
+        perfilador.iniciar(float(intervalo))
+    else:
+        perfilador.detener()
+    return jsonify(perfilador.estado())
+
+def crear_app(calentar_al_iniciar=False, cache_compartido=None, trabajadores=0, max_pendientes=None,
+              timeout=TIMEOUT_RUTA):
+    # `cache_compartido`: archivo SQLite para compartir la caché de rutas
+    # entre procesos (por defecto, la variable de entorno CACHE_RUTAS_SQLITE).
+    # `trabajadores` > 0 activa el modo de producción: las búsquedas corren en
+    # ese número de procesos, con hasta `max_pendientes` pedidos en cola o en
+    # curso (el resto recibe 503) y `timeout` segundos por pedido (504)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    if trabajadores:
+        _estado["servicio"] = {"procesos": trabajadores, "max_pendientes": max_pendientes, "timeout": timeout}
+    cache_compartido = cache_compartido or os.environ.get("CACHE_RUTAS_SQLITE")
+    if cache_compartido:
+        cache_rutas.usar_sqlite(cache_compartido)
+
+    @app.cli.command("build-graph")
+    @click.option("--procesos", type=int, help="Teselas procesadas en paralelo (por defecto, una por CPU).")
+    @click.option("--sin-red", is_flag=True, help="Usar solo las respuestas OSM guardadas en cache/.")
+    @click.option("--osm", "extracto", help="Extracto OSM local (.osm, .osm.bz2 o .pbf).")
+    @click.option("--semilla", type=int, help="Semilla de la congestión simulada.")
+    def build_graph(procesos, sin_red, extracto, semilla):
+        """Construye el grafo desde OSM por teselas y regenera pickle, instantánea y tabla de rutas."""
+        construir_grafo(procesos, sin_red, extracto, semilla)
+
+    @app.cli.command("route-batch")
+    @click.argument("entrada")
+    @click.option("--salida", default="-", help="Archivo NDJSON, '-' (stdout), directorio .npy o archivo .parquet.")
+    @click.option("--procesos", type=int, help="Procesos de búsqueda (por defecto, uno por CPU; 0 = en este proceso).")
+    @click.option("--tam-bloque", type=int, default=TAM_BLOQUE, help="Pedidos por bloque enviado a un proceso.")
+    @click.option("--modos", help="Modos separados por coma; cada pedido se evalúa en todos.")
+    @click.option("--coordenadas", is_flag=True, help="Incluir la ruta como polyline (solo NDJSON).")
+    def route_batch(entrada, salida, procesos, tam_bloque, modos, coordenadas):
+        """Evalúa un NDJSON de pedidos de ruta ('-' = stdin) y escribe un resultado por pedido y modo."""
+        correr_lote(entrada, salida, procesos, tam_bloque, modos, coordenadas)
+
+    @app.cli.command("build-ch")
+    def build_ch():
+        """Preprocesa Contraction Hierarchies y las agrega a la instantánea."""
+        construir_jerarquias(*preparar_grafo())
+
+    if calentar_al_iniciar:
+        _estado["calentando"] = True
+        threading.Thread(target=calentar, daemon=True).start()
+    return app
+
+def correr_lote(entrada, salida, procesos, tam_bloque, modos, coordenadas):
+    modos = tuple(modo for modo in (modos or "").split(",") if modo) or None
+    no_validos = [modo for modo in modos or () if modo not in MODOS_TRAFICO]
+    if no_validos:
+        raise SystemExit(f"Modo no válido: {', '.join(no_validos)}")
+    if tam_bloque < 1:
+        raise SystemExit("El tamaño de bloque debe ser positivo")
+    try:
+        resumen = evaluar_lote(entrada, salida, procesos, tam_bloque, modos, coordenadas)
+    except (RuntimeError, OSError) as e:
+        # Sin grafo, sin instantánea para los procesos, sin pyarrow, un
+        # proceso de trabajo que murió (BrokenProcessPool) o una entrada o
+        # salida que no se puede abrir
+        raise SystemExit(str(e))
+    print(json.dumps(resumen), file=sys.stderr)
+
+def servir(host="127.0.0.1", puerto=5002, trabajadores=None, max_pendientes=None, timeout=TIMEOUT_RUTA):
+    # Servidor con hilos para las conexiones; el cálculo va al pool de procesos
+    # (con trabajadores=0, a los mismos hilos del servidor)
+    from werkzeug.serving import make_server
+    if trabajadores is None:
+        trabajadores = os.cpu_count() or 1
+    app = crear_app(calentar_al_iniciar=True, trabajadores=trabajadores, max_pendientes=max_pendientes,
+                    timeout=timeout)
+    print(f"\nIniciando servidor de producción en http://{host}:{puerto}")
+    make_server(host, puerto, app, threaded=True).serve_forever()
+
+app = crear_app()
 
 if __name__ == '__main__':
-    if os.path.exists(GRAFO_FILE):
-        os.remove(GRAFO_FILE)
-        print("Regenerando grafo...")
-    
-    G, poi_mapping, edges_data = crear_grafo()
-    guardar_grafo((G, poi_mapping, edges_data))
+    if sys.argv[1:2] == ["serve"]:
+        import argparse
+        parser = argparse.ArgumentParser(prog="app.py serve", description="Servidor de producción")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--puerto", type=int, default=5002)
+        parser.add_argument("--trabajadores", type=int, help="procesos de búsqueda (por defecto, uno por CPU; 0 = en el servidor)")
+        parser.add_argument("--max-pendientes", type=int, help="pedidos en cola o en curso antes de responder 503")
+        parser.add_argument("--timeout", type=float, default=TIMEOUT_RUTA, help="segundos por búsqueda")
+        args = parser.parse_args(sys.argv[2:])
+        servir(args.host, args.puerto, args.trabajadores, args.max_pendientes, args.timeout)
+        sys.exit(0)
+    if sys.argv[1:2] == ["build-graph"]:
+        import argparse
+        parser = argparse.ArgumentParser(prog="app.py build-graph", description="Construcción del grafo por teselas")
+        parser.add_argument("--procesos", type=int, help="teselas procesadas en paralelo (por defecto, una por CPU)")
+        parser.add_argument("--sin-red", action="store_true", help="usar solo las respuestas OSM guardadas en cache/")
+        parser.add_argument("--osm", dest="extracto", help="extracto OSM local (.osm, .osm.bz2 o .pbf)")
+        parser.add_argument("--semilla", type=int, help="semilla de la congestión simulada")
+        args = parser.parse_args(sys.argv[2:])
+        construir_grafo(args.procesos, args.sin_red, args.extracto, args.semilla)
+        sys.exit(0)
+    if sys.argv[1:2] == ["route-batch"]:
+        import argparse
+        parser = argparse.ArgumentParser(prog="app.py route-batch",
+                                         description="Evaluación de un NDJSON de pedidos de ruta")
+        parser.add_argument("entrada", help="archivo NDJSON de pedidos ('-' = stdin)")
+        parser.add_argument("--salida", default="-",
+                            help="archivo NDJSON, '-' (stdout), directorio .npy o archivo .parquet")
+        parser.add_argument("--procesos", type=int, help="procesos de búsqueda (por defecto, uno por CPU; 0 = en este proceso)")
+        parser.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE, help="pedidos por bloque enviado a un proceso")
+        parser.add_argument("--modos", help="modos separados por coma; cada pedido se evalúa en todos")
+        parser.add_argument("--coordenadas", action="store_true", help="incluir la ruta como polyline (solo NDJSON)")
+        args = parser.parse_args(sys.argv[2:])
+        correr_lote(args.entrada, args.salida, args.procesos, args.tam_bloque, args.modos, args.coordenadas)
+        sys.exit(0)
+    if sys.argv[1:] == ["build-ch"]:
+        construir_jerarquias(*preparar_grafo())
+        sys.exit(0)
     
+    app = crear_app(calentar_al_iniciar=True)
     print("\nIniciando servidor en http://localhost:5002")
-    app.run(debug=True, port=5002)
\ No newline at end of file
+    app.run(debug=True, port=5002)
@@ -0,0 +1,95 @@
+# Compara Dijkstra, A*, A* bidireccional y CH sobre todos los pares de POIs
+# y modos de tráfico: verifica que los costos coincidan con Dijkstra y reporta
+# nodos asentados y latencia media por algoritmo. Como referencia mide
+# networkx.shortest_path sobre el grafo del pickle (el motor anterior) y
+# la aceleración de cada algoritmo contra él.
+#
+#   python -m benchmarks.algoritmos [--repeticiones 20] [--grafo grafo_guardado_v3.pkl]
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+from motor_csr import ALGORITMOS
+from snapshot import cargar_snapshot
+
+MODOS_TRAFICO = ("peso_horapico", "peso_normal", "peso_libre")
+
+
+def pares_poi(grafo, poi_mapping):
+    nodos = [grafo.indice_nodo(osmid) for osmid in poi_mapping.values()]
+    return [(a, b) for a in nodos for b in nodos if a != b]
+
+
+def comparar(grafo, pares, modos, repeticiones, tolerancia=1e-9):
+    resultados = {}
+    errores = []
+    for algoritmo in ALGORITMOS:
+        asentados = 0
+        segundos = 0.0
+        consultas = 0
+        for modo in modos:
+            grafo.factor_heuristica(modo)
+            for origen, destino in pares:
+                esperado = grafo.dijkstra(origen, destino, modo)
+                estadisticas = {}
+                obtenido = grafo.buscar(origen, destino, modo, algoritmo, estadisticas=estadisticas)
+                asentados += estadisticas["asentados"]
+                if (esperado is None) != (obtenido is None) or (
+                        esperado is not None and abs(esperado[0] - obtenido[0]) > tolerancia * max(1.0, esperado[0])):
+                    errores.append({"algoritmo": algoritmo, "modo": modo, "origen": origen, "destino": destino,
+                                    "esperado": esperado and esperado[0], "obtenido": obtenido and obtenido[0]})
+
+                t = time.perf_counter()
+                for _ in range(repeticiones):
+                    grafo.buscar(origen, destino, modo, algoritmo)
+                segundos += time.perf_counter() - t
+                consultas += 1
+        resultados[algoritmo] = {
+            "asentados_promedio": asentados / consultas,
+            "ms_promedio": segundos / (consultas * repeticiones) * 1000,
+        }
+    return resultados, errores
+
+
+def medir_networkx(ruta, poi_mapping, modos, repeticiones):
+    import networkx as nx
+    with open(ruta, "rb") as f:
+        G, _, _ = pickle.load(f)
+    ids = list(poi_mapping.values())
+    pares = [(a, b) for a in ids for b in ids if a != b]
+    inicio = time.perf_counter()
+    for modo in modos:
+        for origen, destino in pares:
+            for _ in range(repeticiones):
+                nx.shortest_path(G, origen, destino, weight=modo)
+    return {"ms_promedio": (time.perf_counter() - inicio) / (len(pares) * len(modos) * repeticiones) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dijkstra vs A* vs A* bidireccional en pares de POIs")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--grafo", default="grafo_guardado_v3.pkl", help="pickle de networkx para la referencia")
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, poi_mapping = cargado
+
+    resultados, errores = comparar(grafo, pares_poi(grafo, poi_mapping), MODOS_TRAFICO, args.repeticiones)
+    if os.path.exists(args.grafo):
+        referencia = medir_networkx(args.grafo, poi_mapping, MODOS_TRAFICO, args.repeticiones)
+        resultados["networkx"] = referencia
+        for algoritmo in ALGORITMOS:
+            resultados[algoritmo]["aceleracion"] = referencia["ms_promedio"] / resultados[algoritmo]["ms_promedio"]
+    print(json.dumps({"algoritmos": resultados, "errores": errores}, indent=2))
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Rutas alternativas (alternativas.py): latencia de una búsqueda con k
+# alternativas contra una búsqueda simple (Dijkstra y A*) entre los mismos
+# pares, nodos asentados y cuántas alternativas salen, con su estiramiento
+# y la fracción compartida con la ruta óptima.
+#
+#   python -m benchmarks.alternativas [--cantidad 3] [--pares 200]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from alternativas import PRESUPUESTO, compartido, rutas_alternativas
+from app import MODOS_TRAFICO, obtener_grafo
+
+
+def medir(funcion):
+    estadisticas = {}
+    inicio = time.perf_counter()
+    resultado = funcion(estadisticas)
+    return resultado, time.perf_counter() - inicio, estadisticas.get("asentados", 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rutas alternativas contra una búsqueda simple")
+    parser.add_argument("--cantidad", type=int, default=3, help="alternativas pedidas")
+    parser.add_argument("--pares", type=int, default=200)
+    parser.add_argument("--modos", nargs="+", choices=MODOS_TRAFICO, default=list(MODOS_TRAFICO))
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    grafo, _ = obtener_grafo()
+    rng = np.random.default_rng(args.semilla)
+    pares = rng.integers(0, grafo.num_nodos, size=(args.pares, 2)).tolist()
+    resultados = {}
+    for modo in args.modos:
+        grafo.adyacencia(modo)
+        tiempos = {"dijkstra": [], "astar": [], "alternativas": []}
+        asentados = {"dijkstra": [], "astar": [], "alternativas": []}
+        cantidades, estiramientos, compartidos = [], [], []
+        for origen, destino in pares:
+            for algoritmo in ("dijkstra", "astar"):
+                _, segundos, nodos = medir(lambda e: grafo.buscar(origen, destino, modo, algoritmo, estadisticas=e))
+                tiempos[algoritmo].append(segundos)
+                asentados[algoritmo].append(nodos)
+            rutas, segundos, nodos = medir(lambda e: rutas_alternativas(grafo, origen, destino, modo,
+                                                                         args.cantidad, e))
+            tiempos["alternativas"].append(segundos)
+            asentados["alternativas"].append(nodos)
+            if not rutas:
+                continue
+            optima = rutas[0]
+            cantidades.append(len(rutas) - 1)
+            for costo, _, entradas in rutas[1:]:
+                estiramientos.append(costo / optima[0])
+                compartidos.append(compartido(grafo, entradas, optima[2], modo) / optima[0])
+
+        base = np.array(tiempos["dijkstra"])
+        resultados[modo] = {
+            "ms_p50": {nombre: round(float(np.median(t)) * 1000, 3) for nombre, t in tiempos.items()},
+            "ms_p95": {nombre: round(float(np.percentile(t, 95)) * 1000, 3) for nombre, t in tiempos.items()},
+            "asentados_p50": {nombre: float(np.median(a)) for nombre, a in asentados.items()},
+            "cociente_dijkstra_p50": round(float(np.median(np.array(tiempos["alternativas"]) / base)), 2),
+            "cociente_asentados_astar_max": round(float(np.max(np.array(asentados["alternativas"])
+                                                               / np.maximum(asentados["astar"], 1))), 2),
+            "alternativas_por_consulta": np.bincount(cantidades, minlength=args.cantidad + 1).tolist(),
+            "estiramiento_max": round(max(estiramientos), 3) if estiramientos else None,
+            "compartido_p50": round(float(np.median(compartidos)), 3) if compartidos else None,
+        }
+
+    print(json.dumps({"cantidad": args.cantidad, "pares": args.pares, "presupuesto": PRESUPUESTO,
+                      "modos": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Compara el arranque en frío: pickle de networkx + compilación contra la
+# instantánea binaria mapeada en memoria. Cada medición corre en un proceso
+# nuevo para que no haya nada importado ni cacheado en Python.
+#
+#   python -m benchmarks.arranque [--repeticiones 5]
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CODIGO_PICKLE = """
+import pickle, resource, time
+t = time.perf_counter()
+from motor_csr import compilar_grafo
+with open({grafo!r}, "rb") as f:
+    G, poi_mapping, edges_data = pickle.load(f)
+grafo = compilar_grafo(G)
+grafo.espacial
+print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+CODIGO_SNAPSHOT = """
+import resource, time
+t = time.perf_counter()
+from snapshot import cargar_snapshot
+grafo, poi_mapping = cargar_snapshot({snapshot!r}, verificar={verificar})
+print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def medir(codigo, repeticiones):
+    tiempos, memorias = [], []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", codigo], check=True,
+                                capture_output=True, text=True).stdout.split()
+        tiempos.append(float(salida[-2]))
+        memorias.append(int(salida[-1]))
+    return {
+        "segundos_mediana": statistics.median(tiempos),
+        "segundos_min": min(tiempos),
+        "rss_max_kb": max(memorias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío: pickle contra instantánea binaria")
+    parser.add_argument("--grafo", default="grafo_guardado_v3.pkl")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    resultados = {
+        "pickle": medir(CODIGO_PICKLE.format(grafo=args.grafo), args.repeticiones),
+        "snapshot": medir(CODIGO_SNAPSHOT.format(snapshot=args.snapshot, verificar=False), args.repeticiones),
+        "snapshot_verificado": medir(CODIGO_SNAPSHOT.format(snapshot=args.snapshot, verificar=True),
+                                     args.repeticiones),
+    }
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
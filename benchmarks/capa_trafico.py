@@ -0,0 +1,77 @@
+# Capa de tráfico: peso de la página y CPU por vista con la lista de aristas
+# incrustada en el HTML (como antes) contra la página fija y las teselas
+# comprimidas que cubren el grafo, en frío y desde la caché.
+#
+#   python -m benchmarks.capa_trafico [--zoom 15]
+import argparse
+import gzip
+import json
+import math
+import time
+
+import numpy as np
+
+from app import crear_app, obtener_grafo
+
+
+def teselas_del_grafo(grafo, z):
+    n = 2 ** z
+    x = ((grafo.lon + 180) / 360 * n).astype(int)
+    y = ((1 - np.arcsinh(np.tan(np.radians(grafo.lat))) / math.pi) / 2 * n).astype(int)
+    return sorted(set(zip(x.tolist(), y.tolist())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Página con aristas incrustadas contra teselas de tráfico")
+    parser.add_argument("--zoom", type=int, default=15)
+    parser.add_argument("--modo", default="peso_horapico")
+    args = parser.parse_args()
+
+    cliente = crear_app().test_client()
+    grafo, _ = obtener_grafo()
+
+    # Antes: cada vista serializaba todas las aristas dentro del HTML
+    t = time.perf_counter()
+    coords = np.stack((grafo.lat[grafo.u], grafo.lon[grafo.u], grafo.lat[grafo.v], grafo.lon[grafo.v]), axis=1)
+    incrustado = json.dumps([
+        {"coords": [[lat1, lon1], [lat2, lon2]], "congestion": congestion}
+        for (lat1, lon1, lat2, lon2), congestion in zip(coords.tolist(), grafo.congestion.tolist())
+    ]).encode()
+    antes_ms = (time.perf_counter() - t) * 1000
+
+    cliente.get("/")
+    t = time.perf_counter()
+    pagina = cliente.get("/").data
+    pagina_ms = (time.perf_counter() - t) * 1000
+
+    teselas = teselas_del_grafo(grafo, args.zoom)
+    urls = [f"/trafico/{args.modo}/{args.zoom}/{x}/{y}.json" for x, y in teselas]
+    cabeceras = {"Accept-Encoding": "gzip, br"}
+    t = time.perf_counter()
+    comprimidos = sum(len(cliente.get(url, headers=cabeceras).data) for url in urls)
+    frio_ms = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    for url in urls:
+        cliente.get(url, headers=cabeceras)
+    caliente_ms = (time.perf_counter() - t) * 1000
+
+    print(json.dumps({
+        "aristas": grafo.num_aristas,
+        "incrustado": {
+            "bytes_aristas": len(incrustado),
+            "bytes_aristas_gzip": len(gzip.compress(incrustado)),
+            "ms_por_vista": antes_ms,
+        },
+        "teselas": {
+            "bytes_pagina": len(pagina),
+            "ms_por_vista": pagina_ms,
+            "teselas": len(teselas),
+            "bytes_teselas_comprimidas": comprimidos,
+            "ms_teselas_frio": frio_ms,
+            "ms_teselas_cache": caliente_ms,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# Carga concurrente contra el servidor de producción (python app.py serve):
+# levanta un servidor por cada cantidad de trabajadores, lanza pedidos de
+# /calcular_ruta entre puntos al azar desde varios clientes a la vez y
+# reporta el rendimiento, la latencia y cuántos pedidos se rechazaron (503)
+# o vencieron (504). Con 0 trabajadores las búsquedas corren en los hilos
+# del servidor. Con --url se usa un servidor ya levantado.
+#
+#   python -m benchmarks.carga [--trabajadores 0 1 2 4] [--clientes 16] [--pedidos 400]
+#   python -m benchmarks.carga --url http://localhost:5002 --tipo con_parada
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from snapshot import cargar_snapshot
+
+
+def esperar_listo(url, proceso, limite=120):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        if proceso is not None and proceso.poll() is not None:
+            sys.exit(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/listo", timeout=2) as respuesta:
+                if respuesta.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.25)
+    sys.exit("El servidor no quedó listo a tiempo")
+
+
+def pedir(url):
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=60) as respuesta:
+            respuesta.read()
+            estado = respuesta.status
+    except urllib.error.HTTPError as e:
+        estado = e.code
+    return estado, time.perf_counter() - inicio
+
+
+def lanzar(url, consultas, clientes):
+    with ThreadPoolExecutor(clientes) as ejecutor:
+        inicio = time.perf_counter()
+        resultados = list(ejecutor.map(pedir, [url + consulta for consulta in consultas]))
+        total = time.perf_counter() - inicio
+
+    estados = Counter(estado for estado, _ in resultados)
+    latencias = np.array([segundos for estado, segundos in resultados if estado == 200]) * 1000
+    percentil = lambda q: float(np.percentile(latencias, q)) if latencias.size else None
+    return {
+        "pedidos_por_segundo": len(resultados) / total,
+        "p50_ms": percentil(50),
+        "p95_ms": percentil(95),
+        "p99_ms": percentil(99),
+        "ok": estados.pop(200, 0),
+        "rechazados_503": estados.pop(503, 0),
+        "vencidos_504": estados.pop(504, 0),
+        "otros": dict(estados),
+    }
+
+
+def medir(args, trabajadores, consultas):
+    url = f"http://127.0.0.1:{args.puerto}"
+    comando = [sys.executable, "app.py", "serve", "--puerto", str(args.puerto),
+               "--trabajadores", str(trabajadores), "--timeout", str(args.timeout)]
+    if args.max_pendientes:
+        comando += ["--max-pendientes", str(args.max_pendientes)]
+    proceso = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_listo(url, proceso)
+        return {"trabajadores": trabajadores, **lanzar(url, consultas, args.clientes)}
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga concurrente contra el servidor de producción")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--clientes", type=int, default=16, help="pedidos simultáneos")
+    parser.add_argument("--pedidos", type=int, default=400)
+    parser.add_argument("--max-pendientes", type=int)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--puerto", type=int, default=5090)
+    parser.add_argument("--url", help="servidor ya levantado; no se lanza ninguno")
+    parser.add_argument("--tipo", choices=("normal", "con_parada", "con_obstaculo"), default="normal")
+    parser.add_argument("--modo", default="peso_horapico")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+    latitudes, longitudes = grafo.coordenadas_listas()
+    rng = np.random.default_rng(args.semilla)
+    # Pares distintos en cada corrida para que la caché de rutas no responda
+    trios = rng.integers(0, grafo.num_nodos, size=(len(args.trabajadores), args.pedidos, 3))
+    corridas = [[f"/calcular_ruta?tipo={args.tipo}&modo={args.modo}&origen={latitudes[a]},{longitudes[a]}"
+                 f"&destino={latitudes[b]},{longitudes[b]}&punto_c={latitudes[c]},{longitudes[c]}"
+                 for a, b, c in corrida.tolist()] for corrida in trios]
+
+    if args.url:
+        esperar_listo(args.url.rstrip("/"), None)
+        resultados = [lanzar(args.url.rstrip("/"), corridas[0], args.clientes)]
+    else:
+        resultados = [medir(args, trabajadores, consultas)
+                      for trabajadores, consultas in zip(args.trabajadores, corridas)]
+    print(json.dumps({"clientes": args.clientes, "pedidos": args.pedidos, "tipo": args.tipo,
+                      "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
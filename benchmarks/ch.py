@@ -0,0 +1,94 @@
+# Contraction Hierarchies: costo del preproceso por modo y consultas CH contra
+# Dijkstra sobre pares aleatorios de nodos. Verifica que los costos coincidan
+# y cuenta cuántas rutas desempaquetadas son idénticas nodo a nodo.
+#
+#   python -m benchmarks.ch [--pares 500]
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from contraccion import construir_ch
+from snapshot import cargar_snapshot
+
+MODOS_TRAFICO = ("peso_horapico", "peso_normal", "peso_libre")
+
+
+def preprocesar(grafo, modo):
+    tracemalloc.start()
+    t = time.perf_counter()
+    jerarquia = construir_ch(grafo, modo)
+    segundos = time.perf_counter() - t
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return jerarquia, {
+        "segundos": segundos,
+        "memoria_pico_mb": pico / 2**20,
+        "atajos": jerarquia.num_atajos,
+        "aristas_subida": len(jerarquia.indices),
+    }
+
+
+def consultas(grafo, modo, pares):
+    base_s = ch_s = 0.0
+    asentados_base = asentados_ch = 0
+    errores = identicas = 0
+    for origen, destino in pares:
+        est_base, est_ch = {}, {}
+        t = time.perf_counter()
+        esperado = grafo.dijkstra(origen, destino, modo, estadisticas=est_base)
+        base_s += time.perf_counter() - t
+        t = time.perf_counter()
+        obtenido = grafo.ch(origen, destino, modo, estadisticas=est_ch)
+        ch_s += time.perf_counter() - t
+        asentados_base += est_base["asentados"]
+        asentados_ch += est_ch["asentados"]
+
+        if (esperado is None) != (obtenido is None):
+            errores += 1
+        elif esperado is not None:
+            if abs(esperado[0] - obtenido[0]) > 1e-9 * max(1.0, esperado[0]):
+                errores += 1
+            identicas += esperado[1] == obtenido[1]
+    n = len(pares)
+    return {
+        "dijkstra_ms": base_s / n * 1000,
+        "ch_ms": ch_s / n * 1000,
+        "aceleracion": base_s / ch_s if ch_s else None,
+        "asentados_dijkstra": asentados_base / n,
+        "asentados_ch": asentados_ch / n,
+        "errores": errores,
+        "caminos_identicos": identicas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preproceso y consultas de Contraction Hierarchies")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--pares", type=int, default=500)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+
+    rng = np.random.default_rng(args.semilla)
+    pares = rng.integers(0, grafo.num_nodos, size=(args.pares, 2)).tolist()
+    resultados = {}
+    for modo in MODOS_TRAFICO:
+        jerarquia, preproceso = preprocesar(grafo, modo)
+        grafo.jerarquias[modo] = jerarquia
+        resultados[modo] = {"preproceso": preproceso, "consultas": consultas(grafo, modo, pares)}
+
+    print(json.dumps(resultados, indent=2))
+    if any(r["consultas"]["errores"] for r in resultados.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
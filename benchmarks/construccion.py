@@ -0,0 +1,99 @@
+# Construcción del grafo por teselas (construccion.py) a partir de las
+# respuestas OSM guardadas en cache/: una construcción completa por cada
+# cantidad de procesos, seguida de una reconstrucción incremental (ninguna
+# tesela cambió), y el cálculo de largos y pesos de las aristas con el bucle
+# por arista de antes contra la versión vectorizada. Sin red: la carpeta se
+# copia a un directorio temporal y se trabaja con --sin-red.
+#
+#   python -m benchmarks.construccion [--procesos 1 2 4] [--aristas 200000]
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app import poligono_zona
+from construccion import TAM_TESELA, construir_red
+from motor_csr import haversine_arr
+
+
+def construir(poligono, carpeta, procesos, tam):
+    inicio = time.perf_counter()
+    red, resumen = construir_red(poligono, carpeta, procesos, sin_red=True, tam=tam)
+    return round(time.perf_counter() - inicio, 3), resumen
+
+
+def distancia_bucle(lat1, lon1, lat2, lon2):
+    R = 6371000
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+    a = math.sin(delta_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(delta_lambda/2)**2
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+
+def pesos(cantidad, semilla):
+    # Aristas al azar de unos 100 m alrededor de la zona
+    rng = np.random.default_rng(semilla)
+    lat1 = rng.uniform(14.58, 14.63, cantidad)
+    lon1 = rng.uniform(-90.52, -90.45, cantidad)
+    lat2 = lat1 + rng.uniform(-0.001, 0.001, cantidad)
+    lon2 = lon1 + rng.uniform(-0.001, 0.001, cantidad)
+
+    inicio = time.perf_counter()
+    atributos = []
+    for a, b, c, d in zip(lat1.tolist(), lon1.tolist(), lat2.tolist(), lon2.tolist()):
+        largo = distancia_bucle(a, b, c, d)
+        congestion = random.uniform(14.5, 15.9)
+        atributos.append({"length": largo, "peso_normal": largo, "peso_horapico": largo * congestion,
+                          "peso_libre": largo * 0.9})
+    bucle = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    largo = haversine_arr(lat1, lon1, lat2, lon2)
+    congestion = rng.uniform(14.5, 15.9, cantidad)
+    vectorizado = {"length": largo, "peso_normal": largo.copy(), "peso_horapico": largo * congestion,
+                   "peso_libre": largo * 0.9}
+    arreglos = time.perf_counter() - inicio
+
+    diferencia = float(np.max(np.abs(vectorizado["length"] - np.array([a["length"] for a in atributos]))))
+    return {"aristas": cantidad, "bucle_s": round(bucle, 3), "vectorizado_s": round(arreglos, 4),
+            "aceleracion": round(bucle / arreglos, 1), "diferencia_max_m": diferencia}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construcción del grafo por teselas, completa e incremental")
+    parser.add_argument("--cache", default="cache", help="carpeta con las respuestas OSM (*.json)")
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--tam", type=float, default=TAM_TESELA, help="lado de la tesela en grados")
+    parser.add_argument("--aristas", type=int, default=200000, help="aristas para la comparación de pesos")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    respuestas = glob.glob(os.path.join(args.cache, "*.json"))
+    if not respuestas:
+        sys.exit(f"No hay respuestas OSM en {args.cache}")
+    poligono = poligono_zona()
+    construcciones = []
+    for procesos in args.procesos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            for respuesta in respuestas:
+                shutil.copy(respuesta, carpeta)
+            completa, resumen = construir(poligono, carpeta, procesos, args.tam)
+            incremental, resumen_incremental = construir(poligono, carpeta, procesos, args.tam)
+        construcciones.append({"procesos": procesos, "completa_s": completa, "incremental_s": incremental,
+                               "reprocesadas_incremental": resumen_incremental["reprocesadas"], **resumen})
+
+    print(json.dumps({"cpus": os.cpu_count(), "construcciones": construcciones,
+                      "pesos": pesos(args.aristas, args.semilla)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
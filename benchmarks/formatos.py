@@ -0,0 +1,72 @@
+# Formatos de respuesta de /calcular_ruta sobre las rutas más largas entre
+# pares aleatorios: bytes y tiempo de codificación de JSON, polyline y
+# binario, con y sin simplificación de Douglas-Peucker.
+#
+#   python -m benchmarks.formatos [--rutas 20] [--zoom 14 16]
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from formatos import codificar_polyline, decodificar_polyline, empaquetar_binario, simplificar
+from snapshot import cargar_snapshot
+
+
+def medir(codificar, rutas, repeticiones=5):
+    t = time.perf_counter()
+    for _ in range(repeticiones):
+        tamanos = [len(codificar(coords)) for coords in rutas]
+    return {
+        "bytes_promedio": float(np.mean(tamanos)),
+        "ms_por_ruta": (time.perf_counter() - t) / (repeticiones * len(rutas)) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamaño y costo de los formatos de ruta")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--rutas", type=int, default=20, help="cuántas de las rutas más largas usar")
+    parser.add_argument("--candidatas", type=int, default=300)
+    parser.add_argument("--zoom", type=int, nargs="+", default=[14, 16])
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+
+    rng = np.random.default_rng(args.semilla)
+    caminos = []
+    for origen, destino in rng.integers(0, grafo.num_nodos, size=(args.candidatas, 2)).tolist():
+        encontrada = grafo.dijkstra(origen, destino, "peso_horapico")
+        if encontrada is not None:
+            caminos.append(encontrada[1])
+    caminos.sort(key=len, reverse=True)
+    rutas = [grafo.coordenadas(camino) for camino in caminos[:args.rutas]]
+
+    errores = 0
+    for coords in rutas:
+        errores += not np.allclose(decodificar_polyline(codificar_polyline(coords)), coords, atol=1e-5)
+
+    resultados = {
+        "puntos_promedio": float(np.mean([len(coords) for coords in rutas])),
+        "json": medir(lambda coords: json.dumps(coords).encode(), rutas),
+        "polyline": medir(codificar_polyline, rutas),
+        "binary": medir(empaquetar_binario, rutas),
+    }
+    for zoom in args.zoom:
+        resultados[f"polyline_zoom_{zoom}"] = medir(lambda coords: codificar_polyline(simplificar(coords, zoom)),
+                                                    rutas)
+        resultados[f"polyline_zoom_{zoom}"]["puntos_promedio"] = float(
+            np.mean([len(simplificar(coords, zoom)) for coords in rutas]))
+    resultados["errores"] = errores
+    print(json.dumps(resultados, indent=2))
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
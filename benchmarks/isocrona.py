@@ -0,0 +1,70 @@
+# Isocronas: una búsqueda acotada desde el origen contra lo que había que
+# hacer antes (una ruta punto a punto hacia cada nodo para ver si entra en el
+# presupuesto), y el costo de volver a pedir la isocrona con el árbol en
+# caché. Verifica que los nodos alcanzados coincidan.
+#
+#   python -m benchmarks.isocrona [--minutos 5 10 20] [--origenes 5]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import MODOS_TRAFICO, VELOCIDADES_MODO, arboles_isocrona, calcular_isocrona, obtener_grafo
+from isocronas import arbol_acotado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Isocronas: búsqueda acotada contra rutas punto a punto")
+    parser.add_argument("--minutos", type=float, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--origenes", type=int, default=5)
+    parser.add_argument("--modo", choices=MODOS_TRAFICO, default="peso_horapico")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    grafo, poi_mapping = obtener_grafo()
+    grafo.adyacencia(args.modo)
+    velocidad = VELOCIDADES_MODO[args.modo]
+    metros_max = max(args.minutos) / 60 * velocidad * 1000
+    rng = np.random.default_rng(args.semilla)
+    mediciones = []
+    for origen in rng.integers(0, grafo.num_nodos, args.origenes).tolist():
+        punto = f"{grafo.lat[origen]},{grafo.lon[origen]}"
+
+        inicio = time.perf_counter()
+        alcanzados = set()
+        for destino in range(grafo.num_nodos):
+            encontrada = grafo.buscar(origen, destino, args.modo) if destino != origen else (0.0, [origen], [])
+            if encontrada is not None and grafo.distancia(encontrada[2]) <= metros_max:
+                alcanzados.add(destino)
+        punto_a_punto = time.perf_counter() - inicio
+
+        estadisticas = {}
+        inicio = time.perf_counter()
+        arbol = arbol_acotado(grafo, origen, args.modo, metros_max, estadisticas)
+        acotada = time.perf_counter() - inicio
+
+        arboles_isocrona.vaciar()
+        inicio = time.perf_counter()
+        calcular_isocrona(grafo, poi_mapping, punto, args.modo, minutos=args.minutos)
+        completa = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        calcular_isocrona(grafo, poi_mapping, punto, args.modo, minutos=args.minutos)
+        en_cache = time.perf_counter() - inicio
+
+        mediciones.append({
+            "alcanzados": len(alcanzados),
+            "coinciden": alcanzados == set(arbol.nodos.tolist()),
+            "asentados": estadisticas["asentados"],
+            "punto_a_punto_ms": round(punto_a_punto * 1000, 1),
+            "busqueda_acotada_ms": round(acotada * 1000, 2),
+            "isocrona_ms": round(completa * 1000, 2),
+            "isocrona_en_cache_ms": round(en_cache * 1000, 2),
+        })
+
+    print(json.dumps({"modo": args.modo, "minutos": args.minutos, "nodos": grafo.num_nodos,
+                      "mediciones": mediciones}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Evaluación masiva (python app.py route-batch): genera --filas pedidos entre
+# POIs y puntos al azar dentro del grafo, los pasa por stdin sin escribirlos
+# a disco y reporta resultados por segundo y la memoria máxima del proceso
+# para cada cantidad de filas. Con la lectura en streaming la memoria no
+# debería crecer con las filas.
+#
+#   python -m benchmarks.lotes [--filas 10000 100000 1000000] [--procesos 0 2] [--salida /dev/null]
+import argparse
+import json
+import subprocess
+import sys
+import threading
+
+import numpy as np
+
+from app import MODOS_TRAFICO, SNAPSHOT_DIR
+from snapshot import cargar_snapshot
+
+
+def pedidos(poi_mapping, lat, lon, filas, semilla):
+    rng = np.random.default_rng(semilla)
+    pois = sorted(poi_mapping)
+    for i in range(filas):
+        puntos = []
+        for _ in range(2):
+            if rng.random() < 0.5:
+                puntos.append(pois[rng.integers(len(pois))])
+            else:
+                puntos.append(f"{rng.uniform(*lat):.6f},{rng.uniform(*lon):.6f}")
+        yield json.dumps({"id": i, "origen": puntos[0], "destino": puntos[1],
+                          "modo": MODOS_TRAFICO[rng.integers(len(MODOS_TRAFICO))]}) + "\n"
+
+
+def correr(lineas, procesos, salida, tam_bloque):
+    proceso = subprocess.Popen([sys.executable, "app.py", "route-batch", "-", "--salida", salida,
+                                "--procesos", str(procesos), "--tam-bloque", str(tam_bloque)],
+                               stdin=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    def escribir():
+        for linea in lineas:
+            proceso.stdin.write(linea)
+        proceso.stdin.close()
+
+    hilo = threading.Thread(target=escribir, daemon=True)
+    hilo.start()
+    errores = proceso.stderr.read()
+    proceso.wait()
+    hilo.join()
+    if proceso.returncode != 0:
+        raise RuntimeError(errores)
+    # El resumen es la última línea de stderr
+    return json.loads(errores.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento y memoria de route-batch según la cantidad de filas")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--procesos", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--salida", default="/dev/null")
+    parser.add_argument("--tam-bloque", type=int, default=256)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    grafo, poi_mapping = cargar_snapshot(SNAPSHOT_DIR)
+    lat = (float(grafo.lat.min()), float(grafo.lat.max()))
+    lon = (float(grafo.lon.min()), float(grafo.lon.max()))
+    resultados = []
+    for procesos in args.procesos:
+        for filas in args.filas:
+            resumen = correr(pedidos(poi_mapping, lat, lon, filas, args.semilla), procesos, args.salida,
+                             args.tam_bloque)
+            resultados.append({"filas": filas, **resumen})
+            print(json.dumps(resultados[-1]), file=sys.stderr)
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
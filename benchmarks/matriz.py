@@ -0,0 +1,79 @@
+# Matrices origen x destino: N² búsquedas punto a punto contra un árbol de
+# Dijkstra por origen, en el proceso y repartido entre procesos. Verifica que
+# las tres variantes den los mismos costos.
+#
+#   python -m benchmarks.matriz [--tam 500] [--procesos 4]
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from matriz import MIN_ORIGENES_PARALELO, matriz_costos
+from snapshot import cargar_snapshot
+from trabajadores import obtener_pool
+
+
+def par_a_par(grafo, nodos, modo):
+    costos = np.full((len(nodos), len(nodos)), math.inf)
+    for i, origen in enumerate(nodos):
+        for j, destino in enumerate(nodos):
+            encontrada = grafo.dijkstra(origen, destino, modo)
+            if encontrada is not None:
+                costos[i, j] = encontrada[0]
+    return costos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matriz de costos origen x destino")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--tam", type=int, default=500, help="orígenes y destinos")
+    parser.add_argument("--pares", type=int, default=50, help="tamaño de la matriz para la variante N²")
+    parser.add_argument("--procesos", type=int)
+    parser.add_argument("--modo", default="peso_horapico")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+    rng = np.random.default_rng(args.semilla)
+    nodos = rng.integers(0, grafo.num_nodos, size=args.tam).tolist()
+
+    # N² búsquedas sobre una submatriz, extrapolado al tamaño completo
+    chicos = nodos[:args.pares]
+    t = time.perf_counter()
+    esperado = par_a_par(grafo, chicos, args.modo)
+    n2_s = (time.perf_counter() - t) * (args.tam / len(chicos)) ** 2
+
+    t = time.perf_counter()
+    serie, _ = matriz_costos(grafo, nodos, nodos, args.modo)
+    serie_s = time.perf_counter() - t
+
+    _, procesos = obtener_pool(args.snapshot, args.procesos)
+    # Primera llamada fuera de la medición: arranque de los procesos
+    calentamiento = nodos[:1] * max(MIN_ORIGENES_PARALELO, procesos)
+    matriz_costos(grafo, calentamiento, nodos[:1], args.modo, args.snapshot, procesos)
+    t = time.perf_counter()
+    paralelo, _ = matriz_costos(grafo, nodos, nodos, args.modo, args.snapshot, procesos)
+    paralelo_s = time.perf_counter() - t
+
+    errores = int(np.count_nonzero(~np.isclose(serie[:len(chicos), :len(chicos)], esperado)))
+    errores += int(np.count_nonzero(~np.isclose(serie, paralelo)))
+    print(json.dumps({
+        "tam": args.tam,
+        "procesos": procesos,
+        "par_a_par_s_estimado": n2_s,
+        "arbol_por_origen_s": serie_s,
+        "arbol_por_origen_paralelo_s": paralelo_s,
+        "errores": errores,
+    }, indent=2))
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Memoria de los procesos de trabajo con una cuadrícula sintética de
+# alrededor de --aristas aristas, antes y después de compartir el grafo:
+#   - copias: cada proceso arma su propio grafo en memoria, como cuando cada
+#     uno deserializaba el pickle (la memoria privada crece con los procesos);
+#   - instantánea: los procesos de trabajo.py abren la instantánea con mmap
+#     y comparten sus páginas (pss reparte cada página entre los procesos).
+# Después publica una generación nueva de la instantánea con otra congestión,
+# verifica que los procesos calculen con ella y vuelve a medir.
+#
+#   python -m benchmarks.memoria [--aristas 500000] [--procesos 2] [--origenes 8]
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.rutas import grafo_cuadricula
+from matriz import matriz_costos
+from motor_csr import desde_aristas
+from snapshot import cargar_snapshot, guardar_snapshot
+from trabajadores import leer_pids, memoria_proceso, memoria_trabajadores, obtener_pool, pids_trabajadores
+
+_copia = {}
+
+
+def _cargar_copia(ruta_snapshot, pids):
+    # Todo el grafo en memoria propia del proceso
+    pids.put(os.getpid())
+    grafo, _ = cargar_snapshot(ruta_snapshot, verificar=False)
+    copia = desde_aristas(np.array(grafo.nodos), np.array(grafo.lat), np.array(grafo.lon), np.array(grafo.u),
+                          np.array(grafo.v), {peso: np.array(valores) for peso, valores in grafo.pesos.items()},
+                          np.array(grafo.congestion))
+    copia.espacial
+    _copia["grafo"] = copia
+
+
+def _filas_copia(origenes, destinos, peso):
+    return np.array([_copia["grafo"].uno_a_muchos(origen, destinos, peso)[0] for origen in origenes])
+
+
+def resumen(memorias):
+    memorias = [m for m in memorias if "rss_kb" in m]
+    if not memorias:
+        return {"procesos": []}
+    return {
+        "procesos": memorias,
+        "rss_kb_por_proceso": round(sum(m["rss_kb"] for m in memorias) / len(memorias)),
+        "privada_kb_por_proceso": round(sum(m["privada_kb"] for m in memorias) / len(memorias)),
+        "pss_kb_total": sum(m["pss_kb"] for m in memorias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por proceso de trabajo: copias del grafo contra instantánea compartida")
+    parser.add_argument("--aristas", type=int, default=500000)
+    parser.add_argument("--procesos", type=int, default=2)
+    parser.add_argument("--origenes", type=int, default=8, help="árboles de Dijkstra por medición")
+    parser.add_argument("--modo", default="peso_horapico")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    lado = max(2, math.ceil((1 + math.sqrt(1 + 2 * args.aristas)) / 2))
+    directorio = tempfile.mkdtemp(prefix="memoria_")
+    ruta = os.path.join(directorio, "grafo.snap")
+    try:
+        grafo = grafo_cuadricula(lado, args.semilla)
+        guardar_snapshot(ruta, grafo, {})
+        grafo, _ = cargar_snapshot(ruta)
+        rng = np.random.default_rng(args.semilla)
+        # Una fila por origen, a procesos * 4 destinos
+        origenes = rng.integers(0, grafo.num_nodos, size=max(args.origenes, args.procesos)).tolist()
+        destinos = rng.integers(0, grafo.num_nodos, size=args.procesos * 4).tolist()
+        resultado = {"nodos": grafo.num_nodos, "aristas": grafo.num_aristas, "procesos": args.procesos,
+                     "servidor": memoria_proceso()}
+
+        contexto = multiprocessing.get_context("spawn")
+        pids = contexto.SimpleQueue()
+        with ProcessPoolExecutor(args.procesos, mp_context=contexto, initializer=_cargar_copia,
+                                 initargs=(ruta, pids)) as pool:
+            futuros = [pool.submit(_filas_copia, [origen], destinos, args.modo) for origen in origenes]
+            esperado = np.concatenate([futuro.result() for futuro in futuros])
+            resultado["copias"] = resumen(memoria_trabajadores(leer_pids(pids)))
+
+        pool, _ = obtener_pool(ruta, args.procesos)
+        # MIN_ORIGENES_PARALELO: se repiten orígenes para que vaya al pool
+        repetidos = origenes * math.ceil(32 / len(origenes))
+        costos, _ = matriz_costos(grafo, repetidos, destinos, args.modo, ruta, args.procesos)
+        resultado["instantanea"] = resumen(memoria_trabajadores(pids_trabajadores()))
+        resultado["instantanea"]["generacion"] = grafo.generacion
+        resultado["instantanea"]["iguales"] = bool(np.allclose(costos[:len(origenes)], esperado))
+
+        # Generación nueva con otra congestión; el pool no se reinicia
+        nuevo = grafo_cuadricula(lado, args.semilla + 1)
+        guardar_snapshot(ruta, nuevo, {})
+        nuevo, _ = cargar_snapshot(ruta)
+        costos, _ = matriz_costos(nuevo, repetidos, destinos, args.modo, ruta, args.procesos)
+        esperado, _ = matriz_costos(nuevo, origenes, destinos, args.modo)
+        resultado["generacion_nueva"] = resumen(memoria_trabajadores(pids_trabajadores()))
+        resultado["generacion_nueva"]["generacion"] = nuevo.generacion
+        resultado["generacion_nueva"]["iguales"] = bool(np.allclose(costos[:len(origenes)], esperado))
+        pool.shutdown()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Rutas multiparada: tiempo total por cantidad de paradas (matriz de costos,
+# orden y trazado de los tramos) y distancia entre la heurística y el orden
+# exacto donde el exacto todavía es viable.
+#
+#   python -m benchmarks.multiparada [--paradas 5 10 12 25 50 80]
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app import calcular_ruta_multiparada, obtener_grafo
+from matriz import matriz_costos
+from paradas import MAX_EXACTO, costo_orden, orden_exacto, orden_heuristico
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orden de visita para rutas con varias paradas")
+    parser.add_argument("--paradas", type=int, nargs="+", default=[5, 10, 12, 25, 50, 80])
+    parser.add_argument("--modo", default="peso_horapico")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    grafo, poi_mapping = obtener_grafo()
+    rng = np.random.default_rng(args.semilla)
+    resultados = {}
+    for k in args.paradas:
+        tiempos, brechas = [], []
+        for _ in range(args.repeticiones):
+            nodos = rng.choice(grafo.num_nodos, size=k + 2, replace=False).tolist()
+            puntos = [f"{grafo.lat[n]},{grafo.lon[n]}" for n in nodos]
+            t = time.perf_counter()
+            calcular_ruta_multiparada(grafo, poi_mapping, puntos[0], puntos[1:-1], puntos[-1], args.modo)
+            tiempos.append(time.perf_counter() - t)
+            if k <= MAX_EXACTO:
+                costos, _ = matriz_costos(grafo, nodos, nodos, args.modo)
+                exacto = costo_orden(costos, [0, *orden_exacto(costos), k + 1])
+                heuristico = costo_orden(costos, [0, *orden_heuristico(costos), k + 1])
+                brechas.append(heuristico / exacto - 1 if exacto else 0.0)
+        resultados[k] = {
+            "metodo": "exacto" if k <= MAX_EXACTO else "heuristico",
+            "segundos_p50": float(np.median(tiempos)),
+            "segundos_max": max(tiempos),
+            "brecha_heuristica": max(brechas) if brechas else None,
+        }
+
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
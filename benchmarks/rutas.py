@@ -0,0 +1,174 @@
+# Latencia de calcular_ruta, calcular_ruta_con_parada y
+# calcular_ruta_con_obstaculo por modo de tráfico, sobre cuadrículas
+# sintéticas de distintos tamaños y sobre el grafo incluido
+# (grafo_guardado_v3.pkl). Los puntos van como "lat,lon", igual que en un
+# pedido real. Sin red: todo se genera o se lee del disco.
+#
+# El resultado es JSON; con --salida se guarda y con --comparar se contrasta
+# contra una corrida anterior (sale con código 1 si algún p95 empeoró más que
+# --umbral).
+#
+#   python -m benchmarks.rutas [--lados 30 100] [--consultas 200] [--salida base.json]
+#   python -m benchmarks.rutas --comparar base.json
+import argparse
+import json
+import pickle
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from app import MODOS_TRAFICO, calcular_ruta, calcular_ruta_con_obstaculo, calcular_ruta_con_parada
+from motor_csr import compilar_grafo, desde_aristas, haversine_arr
+
+# Separación entre nodos de la cuadrícula (grados, ~110 m) y su esquina
+PASO = 0.001
+LAT0, LON0 = 14.58, -90.52
+TIPOS = ("normal", "con_parada", "con_obstaculo")
+CONSULTAS_MEMORIA = 20
+
+
+def grafo_cuadricula(lado, semilla=0):
+    # Cuadrícula lado x lado con los mismos pesos que crear_red(): la
+    # congestión de cada arista al azar en [14.5, 15.9]
+    rng = np.random.default_rng(semilla)
+    filas, columnas = np.divmod(np.arange(lado * lado), lado)
+    lat = LAT0 + filas * PASO
+    lon = LON0 + columnas * PASO
+    ids = np.arange(lado * lado).reshape(lado, lado)
+    u = np.concatenate((ids[:, :-1].ravel(), ids[:-1, :].ravel())).astype(np.int32)
+    v = np.concatenate((ids[:, 1:].ravel(), ids[1:, :].ravel())).astype(np.int32)
+    longitud = haversine_arr(lat[u], lon[u], lat[v], lon[v])
+    congestion = rng.uniform(14.5, 15.9, len(u))
+    pesos = {"length": longitud, "peso_normal": longitud.copy(), "peso_horapico": longitud * congestion,
+             "peso_libre": longitud * 0.9}
+    nodos = np.arange(1, lado * lado + 1, dtype=np.int64)
+    return desde_aristas(nodos, lat, lon, u, v, pesos, congestion)
+
+
+def grafo_incluido(ruta):
+    with open(ruta, "rb") as f:
+        G, poi_mapping, _ = pickle.load(f)
+    grafo = compilar_grafo(G)
+    # Índice solo en memoria: el benchmark no reescribe indice_espacial_v3.npz
+    grafo.espacial
+    return grafo, poi_mapping
+
+
+def consultas(grafo, cantidad, rng):
+    # Tríos de puntos al azar: origen, destino y parada u obstáculo
+    latitudes, longitudes = grafo.coordenadas_listas()
+    return [tuple(f"{latitudes[n]},{longitudes[n]}" for n in trio)
+            for trio in rng.integers(0, grafo.num_nodos, size=(cantidad, 3)).tolist()]
+
+
+def ejecutar(grafo, poi_mapping, tipo, modo, origen, destino, tercero):
+    if tipo == "con_parada":
+        return calcular_ruta_con_parada(grafo, poi_mapping, origen, tercero, destino, modo)
+    if tipo == "con_obstaculo":
+        return calcular_ruta_con_obstaculo(grafo, poi_mapping, origen, destino, tercero, modo)
+    return calcular_ruta(grafo, poi_mapping, origen, destino, modo)
+
+
+def medir(grafo, poi_mapping, tipo, modo, trios):
+    # Una pasada de calentamiento (índices y vistas por modo), una medida y
+    # otra corta con tracemalloc para el pico de memoria de Python
+    ejecutar(grafo, poi_mapping, tipo, modo, *trios[0])
+    latencias = []
+    encontradas = 0
+    inicio = time.perf_counter()
+    for trio in trios:
+        t = time.perf_counter()
+        encontradas += ejecutar(grafo, poi_mapping, tipo, modo, *trio) is not None
+        latencias.append(time.perf_counter() - t)
+    total = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    for trio in trios[:CONSULTAS_MEMORIA]:
+        ejecutar(grafo, poi_mapping, tipo, modo, *trio)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(latencias) * 1000
+    return {
+        "consultas": len(trios),
+        "encontradas": encontradas,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "consultas_por_segundo": round(len(trios) / total, 1),
+        "memoria_pico_kb": round(pico / 1024, 1),
+    }
+
+
+def escenario(grafo, poi_mapping, args, rng):
+    trios = consultas(grafo, args.consultas, rng)
+    rutas = {}
+    for tipo in args.tipos:
+        for modo in args.modos:
+            rutas[f"{tipo}/{modo}"] = medir(grafo, poi_mapping, tipo, modo, trios)
+    return {"nodos": grafo.num_nodos, "aristas": grafo.num_aristas, "rutas": rutas}
+
+
+def comparar(actual, base, umbral):
+    # Cociente actual / base del p50 y el p95 de cada medición en común
+    comparacion = {}
+    regresiones = []
+    for nombre, datos in actual.items():
+        anteriores = base.get(nombre, {}).get("rutas", {})
+        for ruta, medicion in datos["rutas"].items():
+            anterior = anteriores.get(ruta)
+            if anterior is None:
+                continue
+            cocientes = {clave: round(medicion[clave] / anterior[clave], 3) if anterior[clave] else None
+                         for clave in ("p50_ms", "p95_ms")}
+            comparacion[f"{nombre}/{ruta}"] = cocientes
+            if cocientes["p95_ms"] is not None and cocientes["p95_ms"] > umbral:
+                regresiones.append(f"{nombre}/{ruta}")
+    return comparacion, regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de los tipos de ruta por modo de tráfico")
+    parser.add_argument("--lados", type=int, nargs="*", default=[30, 100],
+                        help="cuadrículas sintéticas de lado x lado nodos")
+    parser.add_argument("--grafo", default="grafo_guardado_v3.pkl", help="grafo incluido ('' para omitirlo)")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS, default=list(TIPOS))
+    parser.add_argument("--modos", nargs="+", choices=MODOS_TRAFICO, default=list(MODOS_TRAFICO))
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="archivo donde guardar el JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--umbral", type=float, default=1.2, help="cociente de p95 que cuenta como regresión")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    escenarios = {}
+    for lado in args.lados:
+        escenarios[f"cuadricula_{lado}"] = escenario(grafo_cuadricula(lado, args.semilla), {}, args, rng)
+    if args.grafo:
+        escenarios["incluido"] = escenario(*grafo_incluido(args.grafo), args, rng)
+
+    resultado = {
+        "python": sys.version.split()[0],
+        "escenarios": escenarios,
+        "rss_max_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    regresiones = []
+    if args.comparar:
+        with open(args.comparar) as f:
+            base = json.load(f)
+        resultado["comparacion"], regresiones = comparar(escenarios, base["escenarios"], args.umbral)
+        resultado["regresiones"] = regresiones
+    if args.salida:
+        with open(args.salida, "w") as f:
+            json.dump(resultado, f, indent=2)
+    print(json.dumps(resultado, indent=2))
+    if regresiones:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
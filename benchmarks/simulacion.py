@@ -0,0 +1,74 @@
+# Simulación de tráfico (simulacion.py) sobre una cuadrícula sintética de
+# alrededor de --aristas aristas: tiempo de creación, de cada paso y de un día
+# simulado completo, y lo que cuesta escribir la congestión en los pesos del
+# grafo (aplicar_congestion). Como referencia, el sorteo por arista en Python
+# con random.uniform que se usaba al construir el grafo.
+#
+#   python -m benchmarks.simulacion [--aristas 1000000] [--paso 5]
+import argparse
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+from benchmarks.rutas import grafo_cuadricula
+from simulacion import SimuladorTrafico
+from trafico import aplicar_congestion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pasos de la simulación de tráfico sobre un grafo grande")
+    parser.add_argument("--aristas", type=int, default=1000000)
+    parser.add_argument("--paso", type=float, default=5.0, help="minutos por paso")
+    parser.add_argument("--pasos", type=int, default=20, help="pasos medidos uno por uno")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    # Una cuadrícula de lado L tiene 2·L·(L-1) aristas
+    lado = max(2, math.ceil((1 + math.sqrt(1 + 2 * args.aristas)) / 2))
+    grafo = grafo_cuadricula(lado, args.semilla)
+
+    inicio = time.perf_counter()
+    simulador = SimuladorTrafico(grafo.u, grafo.v, grafo.num_nodos, args.semilla)
+    creacion = time.perf_counter() - inicio
+
+    tiempos = []
+    for _ in range(args.pasos):
+        inicio = time.perf_counter()
+        simulador.avanzar(args.paso)
+        tiempos.append(time.perf_counter() - inicio)
+
+    pasos_dia = round(1440 / args.paso)
+    inicio = time.perf_counter()
+    for _ in range(pasos_dia):
+        simulador.avanzar(args.paso)
+    dia = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    congestion = simulador.congestion()
+    calculo = time.perf_counter() - inicio
+    resumen = aplicar_congestion(grafo, congestion)
+
+    inicio = time.perf_counter()
+    [random.uniform(14.5, 15.9) for _ in range(grafo.num_aristas)]
+    por_arista = time.perf_counter() - inicio
+
+    ms = np.array(tiempos) * 1000
+    print(json.dumps({
+        "aristas": grafo.num_aristas,
+        "nodos": grafo.num_nodos,
+        "creacion_s": round(creacion, 3),
+        "paso_ms_p50": round(float(np.median(ms)), 2),
+        "paso_ms_max": round(float(ms.max()), 2),
+        "dia_simulado": {"pasos": pasos_dia, "segundos": round(dia, 2)},
+        "congestion_ms": round(calculo * 1000, 2),
+        "aplicar_al_grafo_ms": round(resumen["segundos"] * 1000, 2),
+        "sorteo_por_arista_python_ms": round(por_arista * 1000, 2),
+        "estado": simulador.estado(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Perfiles horarios contra los tres atributos de peso fijos: memoria por
+# arista y latencia de Dijkstra dependiente del tiempo frente a Dijkstra
+# estático, sobre pares aleatorios de nodos y varias horas de salida.
+#
+#   python -m benchmarks.tiempo_dependiente [--pares 300] [--intervalos 24 96]
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from app import MODOS_TRAFICO, parsear_hora, perfiles_por_hora
+from snapshot import cargar_snapshot
+from tiempo_dependiente import dijkstra_dependiente
+
+SALIDAS = ("07:30", "12:00", "18:45", "23:00")
+
+
+def memoria_estatica(grafo):
+    # Un float64 por arista y dos por entrada CSR para cada modo
+    por_arista = sum(grafo.pesos[modo].nbytes + grafo.pesos_csr[modo].nbytes for modo in MODOS_TRAFICO)
+    return por_arista / grafo.num_aristas
+
+
+def latencia(buscar, pares):
+    t = time.perf_counter()
+    for origen, destino in pares:
+        buscar(origen, destino)
+    return (time.perf_counter() - t) / len(pares) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfiles horarios de velocidad contra pesos fijos por modo")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--pares", type=int, default=300)
+    parser.add_argument("--intervalos", type=int, nargs="+", default=[24, 96])
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+
+    rng = np.random.default_rng(args.semilla)
+    pares = rng.integers(0, grafo.num_nodos, size=(args.pares, 2)).tolist()
+    resultados = {
+        "estatico": {
+            "bytes_por_arista": memoria_estatica(grafo),
+            "dijkstra_ms": {modo: latencia(lambda s, t: grafo.dijkstra(s, t, modo), pares)
+                            for modo in MODOS_TRAFICO},
+        },
+    }
+    for intervalos in args.intervalos:
+        grafo.perfiles = perfiles_por_hora(grafo, intervalos)
+        dependiente = {}
+        for salida in SALIDAS:
+            segundos = parsear_hora(salida)
+            dependiente[salida] = latencia(lambda s, t: dijkstra_dependiente(grafo, s, t, segundos), pares)
+        resultados[f"perfil_{intervalos}"] = {
+            "bytes_por_arista": grafo.perfiles.nbytes / grafo.num_aristas,
+            "dijkstra_ms": dependiente,
+        }
+
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Ingesta de congestión en vivo: aplica lotes de actualizaciones mientras
+# otros hilos siguen calculando rutas, y reporta aristas por segundo,
+# consultas por segundo y errores de los lectores.
+#
+#   python -m benchmarks.trafico [--total 100000 --lote 1000 --lectores 2]
+import argparse
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from snapshot import cargar_snapshot
+from trafico import aplicar_lote
+
+
+def lector(grafo, pares, detener, contador, errores):
+    i = 0
+    while not detener.is_set():
+        origen, destino = pares[i % len(pares)]
+        try:
+            grafo.dijkstra(origen, destino, "peso_horapico")
+        except Exception as e:  # un lector nunca debería fallar por una actualización
+            errores.append(repr(e))
+        contador[0] += 1
+        i += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualizaciones de congestión con consultas concurrentes")
+    parser.add_argument("--snapshot", default="grafo_v3.snap")
+    parser.add_argument("--total", type=int, default=100000)
+    parser.add_argument("--lote", type=int, default=1000)
+    parser.add_argument("--lectores", type=int, default=2)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    cargado = cargar_snapshot(args.snapshot)
+    if cargado is None:
+        sys.exit(f"No se pudo abrir la instantánea {args.snapshot}")
+    grafo, _ = cargado
+
+    rng = np.random.default_rng(args.semilla)
+    pares = rng.integers(0, grafo.num_nodos, size=(256, 2)).tolist()
+    detener = threading.Event()
+    contadores = [[0] for _ in range(args.lectores)]
+    errores = []
+    hilos = [threading.Thread(target=lector, args=(grafo, pares, detener, c, errores)) for c in contadores]
+    for hilo in hilos:
+        hilo.start()
+
+    inicio = time.perf_counter()
+    actualizadas = 0
+    while actualizadas < args.total:
+        n = min(args.lote, args.total - actualizadas)
+        aplicar_lote(grafo, rng.integers(0, grafo.num_aristas, n), rng.uniform(14.5, 15.9, n))
+        actualizadas += n
+    segundos = time.perf_counter() - inicio
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+
+    print(json.dumps({
+        "aristas_grafo": grafo.num_aristas,
+        "actualizaciones": actualizadas,
+        "tam_lote": args.lote,
+        "segundos": segundos,
+        "actualizaciones_por_segundo": actualizadas / segundos,
+        "consultas_por_segundo": sum(c[0] for c in contadores) / segundos,
+        "errores_lectores": errores[:5],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
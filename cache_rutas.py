@@ -0,0 +1,136 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Caché de respuestas de /calcular_ruta. En memoria: LRU acotada con TTL. La
+# capa compartida opcional es un archivo SQLite que varios procesos del
+# servidor pueden abrir a la vez; lo que uno calcula lo aprovechan los demás.
+# Cada entrada guarda la generación (huella de los pesos con que se calculó):
+# si los pesos cambian, la entrada deja de valer aunque no haya expirado.
+# Tras un lote de tráfico, revalidar() pasa a la huella nueva las entradas que
+# el lote no afecta (según el detalle de la ruta: origen, destino, costo y
+# aristas) y descarta el resto, en lugar de perderlas todas.
+
+CAPACIDAD = 2048
+TTL_SEGUNDOS = 600
+# La tabla compartida se recorta cada tantas escrituras
+PODA_CADA = 256
+
+
+class CacheRutas:
+
+    def __init__(self, capacidad=CAPACIDAD, ttl=TTL_SEGUNDOS, ruta_sqlite=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self._entradas = OrderedDict()   # clave -> (generación, expira, valor, detalle)
+        self._lock = threading.Lock()
+        self._sqlite = None
+        self._escrituras = 0
+        self.contadores = dict.fromkeys(
+            ("aciertos", "aciertos_compartidos", "fallos", "desalojos", "expiradas", "invalidadas"), 0)
+        if ruta_sqlite:
+            self.usar_sqlite(ruta_sqlite)
+
+    def usar_sqlite(self, ruta):
+        conexion = sqlite3.connect(ruta, timeout=5, check_same_thread=False, isolation_level=None)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        conexion.execute("CREATE TABLE IF NOT EXISTS rutas (clave TEXT PRIMARY KEY, generacion TEXT, "
+                         "expira REAL, usada REAL, valor TEXT)")
+        with self._lock:
+            anterior, self._sqlite = self._sqlite, conexion
+        if anterior is not None:
+            anterior.close()
+
+    def obtener(self, clave, generacion):
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] == generacion and entrada[1] > ahora:
+                    self._entradas.move_to_end(clave)
+                    self.contadores["aciertos"] += 1
+                    return entrada[2]
+                del self._entradas[clave]
+                self.contadores["invalidadas" if entrada[0] != generacion else "expiradas"] += 1
+
+            if self._sqlite is not None:
+                texto = json.dumps(clave)
+                fila = self._sqlite.execute(
+                    "SELECT valor FROM rutas WHERE clave = ? AND generacion = ? AND expira > ?",
+                    (texto, generacion, ahora)).fetchone()
+                if fila is not None:
+                    self._sqlite.execute("UPDATE rutas SET usada = ? WHERE clave = ?", (ahora, texto))
+                    valor = json.loads(fila[0])
+                    self._guardar_memoria(clave, (generacion, ahora + self.ttl, valor, None))
+                    self.contadores["aciertos_compartidos"] += 1
+                    return valor
+            self.contadores["fallos"] += 1
+            return None
+
+    def guardar(self, clave, generacion, valor, detalle=None):
+        ahora = time.time()
+        with self._lock:
+            self._guardar_memoria(clave, (generacion, ahora + self.ttl, valor, detalle))
+            if self._sqlite is not None:
+                self._sqlite.execute("INSERT OR REPLACE INTO rutas VALUES (?, ?, ?, ?, ?)",
+                                     (json.dumps(clave), generacion, ahora + self.ttl, ahora, json.dumps(valor)))
+                self._escrituras += 1
+                if self._escrituras % PODA_CADA == 0:
+                    self._podar_sqlite(ahora)
+
+    def _guardar_memoria(self, clave, entrada):
+        self._entradas[clave] = entrada
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.capacidad:
+            self._entradas.popitem(last=False)
+            self.contadores["desalojos"] += 1
+
+    def _podar_sqlite(self, ahora):
+        # Fuera lo expirado y, si sobra, lo usado hace más tiempo
+        self._sqlite.execute("DELETE FROM rutas WHERE expira <= ?", (ahora,))
+        self._sqlite.execute("DELETE FROM rutas WHERE clave NOT IN "
+                             "(SELECT clave FROM rutas ORDER BY usada DESC LIMIT ?)", (self.capacidad * 4,))
+
+    def revalidar(self, anterior, nueva, afectada):
+        # Entradas de la generación `anterior`: las que tienen detalle y
+        # `afectada(detalle)` no las alcanza pasan a `nueva` (también en la
+        # capa compartida); las demás se descartan. Devuelve cuántas se descartaron
+        with self._lock:
+            vigentes, descartadas = [], []
+            for clave, entrada in self._entradas.items():
+                if entrada[0] != anterior:
+                    continue
+                detalle = entrada[3]
+                (descartadas if detalle is None or afectada(detalle) else vigentes).append(clave)
+            for clave in descartadas:
+                del self._entradas[clave]
+            for clave in vigentes:
+                self._entradas[clave] = (nueva, *self._entradas[clave][1:])
+            if self._sqlite is not None and vigentes:
+                self._sqlite.executemany("UPDATE rutas SET generacion = ? WHERE clave = ? AND generacion = ?",
+                                         [(nueva, json.dumps(clave), anterior) for clave in vigentes])
+            self.contadores["invalidadas"] += len(descartadas)
+            return len(descartadas)
+
+    def vaciar(self):
+        with self._lock:
+            self.contadores["desalojos"] += len(self._entradas)
+            self._entradas.clear()
+            if self._sqlite is not None:
+                self._sqlite.execute("DELETE FROM rutas")
+
+    def estadisticas(self):
+        with self._lock:
+            c = self.contadores
+            consultas = c["aciertos"] + c["aciertos_compartidos"] + c["fallos"]
+            return {
+                **c,
+                "entradas": len(self._entradas),
+                "capacidad": self.capacidad,
+                "ttl_segundos": self.ttl,
+                "compartida": self._sqlite is not None,
+                "tasa_aciertos": (consultas - c["fallos"]) / consultas if consultas else None,
+            }
@@ -0,0 +1 @@
+# Permite importar los módulos de la raíz desde tests/
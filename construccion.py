@@ -0,0 +1,439 @@
+import bz2
+import gzip
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import urllib.parse
+import urllib.request
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from motor_csr import haversine_arr
+
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+# Construcción de la red vial por teselas. El área se divide en una grilla
+# fija de teselas de TAM_TESELA grados; cada tesela se descarga de Overpass
+# (la respuesta queda en cache/, igual que las de osmnx) o se recorta de un
+# extracto local, y se convierte en arreglos: nodos, vías y el largo de cada
+# tramo (haversine vectorizado). El resultado de cada tesela se guarda con la
+# firma de sus datos de origen; al reconstruir, solo se reprocesan las teselas
+# cuya firma cambió. Al final se unen todas, se recorta al polígono, se
+# simplifica (una arista entre cada par de intersecciones), se conserva la
+# componente conexa mayor y se contraen las uniones de vías sin cruce.
+
+TAM_TESELA = 0.01
+URL_OVERPASS = "https://overpass-api.de/api/interpreter"
+# Mismo filtro que network_type="drive" de osmnx
+FILTRO_VIAL = ('["highway"]["area"!~"yes"]["access"!~"private"]'
+               '["highway"!~"abandoned|bridleway|bus_guideway|construction|corridor|cycleway|elevator|'
+               'escalator|footway|no|path|pedestrian|planned|platform|proposed|raceway|razed|service|'
+               'steps|track"]["motor_vehicle"!~"no"]["motorcar"!~"no"]'
+               '["service"!~"alley|driveway|emergency_access|parking|parking_aisle|private"]')
+VIAS_EXCLUIDAS = frozenset(("abandoned bridleway bus_guideway construction corridor cycleway elevator escalator "
+                            "footway no path pedestrian planned platform proposed raceway razed service steps "
+                            "track").split())
+SERVICIOS_EXCLUIDOS = frozenset(("alley", "driveway", "emergency_access", "parking", "parking_aisle", "private"))
+# Si cambia la forma de procesar una tesela, cambia la firma de todas
+VERSION_TESELA = 1
+
+
+class SinDatos(RuntimeError):
+    pass
+
+
+def es_vial(etiquetas):
+    # El filtro de Overpass, aplicado a las etiquetas de una vía ya descargada
+    return ("highway" in etiquetas
+            and etiquetas.get("area") != "yes"
+            and etiquetas.get("access") != "private"
+            and etiquetas["highway"] not in VIAS_EXCLUIDAS
+            and etiquetas.get("motor_vehicle") != "no"
+            and etiquetas.get("motorcar") != "no"
+            and etiquetas.get("service") not in SERVICIOS_EXCLUIDOS)
+
+
+def _elementos(ids, lat, lon, vias, inicios, refs):
+    # Nodos ordenados por id y sin repetir; vías como refs planas + inicios
+    ids = np.asarray(ids, dtype=np.int64)
+    ids, unicos = np.unique(ids, return_index=True)
+    return {
+        "ids": ids,
+        "lat": np.asarray(lat, dtype=np.float64)[unicos],
+        "lon": np.asarray(lon, dtype=np.float64)[unicos],
+        "vias": np.asarray(vias, dtype=np.int64),
+        "inicios": np.asarray(inicios, dtype=np.int64),
+        "refs": np.asarray(refs, dtype=np.int64),
+    }
+
+
+def leer_overpass(datos):
+    ids, lat, lon = [], [], []
+    vias, inicios, refs = [], [0], []
+    for elemento in datos.get("elements", ()):
+        if elemento["type"] == "node":
+            ids.append(elemento["id"])
+            lat.append(elemento["lat"])
+            lon.append(elemento["lon"])
+        elif elemento["type"] == "way" and es_vial(elemento.get("tags", {})):
+            vias.append(elemento["id"])
+            refs.extend(elemento["nodes"])
+            inicios.append(len(refs))
+    return _elementos(ids, lat, lon, vias, inicios, refs)
+
+
+def leer_xml(ruta):
+    # Extracto .osm (también .osm.bz2 / .osm.gz), leído en streaming
+    abrir = bz2.open if ruta.endswith(".bz2") else gzip.open if ruta.endswith(".gz") else open
+    ids, lat, lon = [], [], []
+    vias, inicios, refs = [], [0], []
+    with abrir(ruta, "rb") as f:
+        for _, elemento in ET.iterparse(f):
+            if elemento.tag == "node":
+                ids.append(int(elemento.get("id")))
+                lat.append(float(elemento.get("lat")))
+                lon.append(float(elemento.get("lon")))
+                elemento.clear()
+            elif elemento.tag == "way":
+                etiquetas = {tag.get("k"): tag.get("v") for tag in elemento.iter("tag")}
+                if es_vial(etiquetas):
+                    vias.append(int(elemento.get("id")))
+                    refs.extend(int(nd.get("ref")) for nd in elemento.iter("nd"))
+                    inicios.append(len(refs))
+                elemento.clear()
+    return _elementos(ids, lat, lon, vias, inicios, refs)
+
+
+def leer_pbf(ruta):
+    if osmium is None:
+        raise SinDatos("Leer .pbf requiere el paquete osmium; o convierta con 'osmium cat extracto.pbf -o "
+                       "extracto.osm'")
+    ids, lat, lon = [], [], []
+    vias, inicios, refs = [], [0], []
+    for objeto in osmium.FileProcessor(ruta):
+        if objeto.is_node():
+            ids.append(objeto.id)
+            lat.append(objeto.location.lat)
+            lon.append(objeto.location.lon)
+        elif objeto.is_way() and es_vial(dict(objeto.tags)):
+            vias.append(objeto.id)
+            refs.extend(nodo.ref for nodo in objeto.nodes)
+            inicios.append(len(refs))
+    return _elementos(ids, lat, lon, vias, inicios, refs)
+
+
+def leer_extracto(ruta):
+    return leer_pbf(ruta) if ruta.endswith(".pbf") else leer_xml(ruta)
+
+
+def respuestas_en_cache(carpeta):
+    # Todas las respuestas de Overpass guardadas en la carpeta (las propias y
+    # las de osmnx tienen el mismo formato)
+    for nombre in sorted(os.listdir(carpeta)) if os.path.isdir(carpeta) else ():
+        if nombre.endswith(".json"):
+            with open(os.path.join(carpeta, nombre)) as f:
+                datos = json.load(f)
+            if isinstance(datos, dict) and "elements" in datos:
+                yield datos
+
+
+def _tomar_vias(elementos, indices, *por_ref):
+    # Las vías `indices` (con sus refs y los arreglos alineados a las refs)
+    inicios = elementos["inicios"]
+    largos = inicios[indices + 1] - inicios[indices]
+    nuevos = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(largos, out=nuevos[1:])
+    posiciones = np.repeat(inicios[indices] - nuevos[:-1], largos) + np.arange(nuevos[-1])
+    return (elementos["vias"][indices], nuevos) + tuple(arreglo[posiciones] for arreglo in por_ref)
+
+
+def unir(partes):
+    # Une elementos de varias fuentes o teselas; nodos y vías repetidos
+    # (una vía que cruza teselas viene en todas) quedan una sola vez
+    partes = [p for p in partes if len(p["ids"])]
+    if not partes:
+        return _elementos([], [], [], [], [0], [])
+    desplazamientos = np.cumsum([0] + [len(p["refs"]) for p in partes[:-1]])
+    juntos = {
+        "vias": np.concatenate([p["vias"] for p in partes]),
+        "inicios": np.concatenate([p["inicios"][:-1] + d for p, d in zip(partes, desplazamientos)]
+                                  + [[sum(len(p["refs"]) for p in partes)]]),
+        "refs": np.concatenate([p["refs"] for p in partes]),
+    }
+    por_ref = [clave for clave in ("largos",) if all(clave in p for p in partes)]
+    for clave in por_ref:
+        juntos[clave] = np.concatenate([p[clave] for p in partes])
+    _, primeras = np.unique(juntos["vias"], return_index=True)
+    vias, inicios, refs, *resto = _tomar_vias(juntos, primeras, juntos["refs"], *(juntos[c] for c in por_ref))
+    unido = _elementos(np.concatenate([p["ids"] for p in partes]), np.concatenate([p["lat"] for p in partes]),
+                       np.concatenate([p["lon"] for p in partes]), vias, inicios, refs)
+    unido.update(zip(por_ref, resto))
+    return unido
+
+
+def _posiciones(elementos, refs):
+    # Índice de cada ref en los nodos, y si el nodo está en los datos
+    ids = elementos["ids"]
+    posiciones = np.minimum(np.searchsorted(ids, refs), max(len(ids) - 1, 0))
+    existe = ids[posiciones] == refs if len(ids) else np.zeros(len(refs), dtype=bool)
+    return posiciones, existe
+
+
+def recortar(elementos, caja):
+    # Vías con algún nodo dentro de la caja (lat_min, lat_max, lon_min,
+    # lon_max), completas, y los nodos que usan
+    lat_min, lat_max, lon_min, lon_max = caja
+    posiciones, existe = _posiciones(elementos, elementos["refs"])
+    lat, lon = elementos["lat"][posiciones], elementos["lon"][posiciones]
+    dentro = existe & (lat >= lat_min) & (lat < lat_max) & (lon >= lon_min) & (lon < lon_max)
+    inicios = elementos["inicios"]
+    con_datos = inicios[1:] > inicios[:-1]
+    alguna = np.zeros(len(elementos["vias"]), dtype=bool)
+    if con_datos.any():
+        alguna[con_datos] = np.logical_or.reduceat(dentro, inicios[:-1][con_datos])
+    vias, nuevos, refs = _tomar_vias(elementos, np.flatnonzero(alguna), elementos["refs"])
+    usados = np.unique(refs)
+    posiciones, existe = _posiciones(elementos, usados)
+    posiciones = posiciones[existe]
+    return {"ids": elementos["ids"][posiciones], "lat": elementos["lat"][posiciones],
+            "lon": elementos["lon"][posiciones], "vias": vias, "inicios": nuevos, "refs": refs}
+
+
+def firma(elementos):
+    h = hashlib.sha1(str(VERSION_TESELA).encode())
+    for clave in ("ids", "lat", "lon", "vias", "inicios", "refs"):
+        h.update(np.ascontiguousarray(elementos[clave]).tobytes())
+    return h.hexdigest()
+
+
+def largos_tramos(elementos):
+    # Largo (m) de cada tramo refs[i] -> refs[i + 1]; 0 en la última ref de
+    # cada vía y NaN si falta alguno de los dos nodos
+    refs = elementos["refs"]
+    posiciones, existe = _posiciones(elementos, refs)
+    lat, lon = elementos["lat"][posiciones], elementos["lon"][posiciones]
+    largos = np.zeros(len(refs))
+    if len(refs) > 1:
+        largos[:-1] = haversine_arr(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        largos[:-1][~(existe[:-1] & existe[1:])] = np.nan
+    largos[elementos["inicios"][1:] - 1] = 0.0
+    return largos
+
+
+def teselas_caja(lat_min, lat_max, lon_min, lon_max, tam=TAM_TESELA):
+    # Claves de la grilla fija que cubren la caja; la grilla no depende del
+    # polígono, así que las teselas interiores conservan su clave si este cambia
+    filas = range(math.floor(lat_min / tam), math.floor(lat_max / tam) + 1)
+    columnas = range(math.floor(lon_min / tam), math.floor(lon_max / tam) + 1)
+    return [(fila, columna) for fila in filas for columna in columnas]
+
+
+def caja_tesela(fila, columna, tam=TAM_TESELA):
+    return fila * tam, (fila + 1) * tam, columna * tam, (columna + 1) * tam
+
+
+def consulta_overpass(caja):
+    lat_min, lat_max, lon_min, lon_max = caja
+    return (f"[out:json][timeout:180];(way{FILTRO_VIAL}"
+            f"({lat_min:.7f},{lon_min:.7f},{lat_max:.7f},{lon_max:.7f});>;);out;")
+
+
+def descargar(consulta, carpeta, sin_red=False):
+    # Respuesta de Overpass para la consulta, desde cache/ si ya se descargó
+    ruta = os.path.join(carpeta, hashlib.sha1(consulta.encode()).hexdigest() + ".json")
+    if os.path.exists(ruta):
+        with open(ruta) as f:
+            return json.load(f)
+    if sin_red:
+        raise SinDatos(f"La tesela no está en {carpeta} y no se permite usar la red")
+    cuerpo = urllib.parse.urlencode({"data": consulta}).encode()
+    with urllib.request.urlopen(URL_OVERPASS, data=cuerpo, timeout=300) as respuesta:
+        datos = json.load(respuesta)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(datos, f)
+    os.replace(temporal, ruta)
+    return datos
+
+
+def procesar_tesela(clave, carpeta, firma_anterior, elementos=None, sin_red=False, tam=TAM_TESELA):
+    # Corre en un proceso del pool. Sin `elementos`, la tesela se pide a
+    # Overpass (o a cache/). Devuelve (clave, firma, si se reprocesó)
+    caja = caja_tesela(*clave, tam)
+    if elementos is None:
+        elementos = recortar(leer_overpass(descargar(consulta_overpass(caja), carpeta, sin_red)), caja)
+    firma_nueva = firma(elementos)
+    ruta = ruta_tesela(carpeta, clave, tam)
+    if firma_nueva == firma_anterior and os.path.exists(ruta):
+        return clave, firma_nueva, False
+    temporal = ruta + ".tmp.npz"
+    np.savez(temporal, largos=largos_tramos(elementos), **elementos)
+    os.replace(temporal, ruta)
+    return clave, firma_nueva, True
+
+
+def ruta_tesela(carpeta, clave, tam=TAM_TESELA):
+    return os.path.join(carpeta, "teselas", f"{tam:g}_{clave[0]}_{clave[1]}.npz")
+
+
+def simplificar_red(elementos, dentro):
+    # Una arista por cada tramo de vía entre dos nodos "clave": extremos de un
+    # tramo continuo dentro del polígono o nodos que aparecen en más de un
+    # lugar (intersecciones). Devuelve (u, v, largo) con ids OSM
+    refs = elementos["refs"]
+    n = len(refs)
+    if n < 2:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, np.zeros(0)
+    via = np.repeat(np.arange(len(elementos["vias"])), np.diff(elementos["inicios"]))
+    tramo = np.zeros(n, dtype=bool)
+    tramo[:-1] = (via[:-1] == via[1:]) & dentro[:-1] & dentro[1:] & (refs[:-1] != refs[1:])
+    tramo &= ~np.isnan(elementos["largos"])
+    llega = np.zeros(n, dtype=bool)
+    llega[1:] = tramo[:-1]
+    usado = tramo | llega
+    extremo = usado & ~(tramo & llega)
+    _, inversa, veces = np.unique(refs[usado], return_inverse=True, return_counts=True)
+    repetido = np.zeros(n, dtype=bool)
+    repetido[usado] = veces[inversa] > 1
+    claves = np.flatnonzero(usado & (extremo | repetido))
+
+    tramos = np.flatnonzero(tramo)
+    arista = np.searchsorted(claves, tramos, side="right") - 1
+    numeradas, arista = np.unique(arista, return_inverse=True)
+    largo = np.bincount(arista, weights=elementos["largos"][tramos], minlength=len(numeradas))
+    u, v = refs[claves[numeradas]], refs[claves[numeradas + 1]]
+
+    return _sin_paralelas(u, v, largo)
+
+
+def _sin_paralelas(u, v, largo):
+    # Sin lazos; entre dos nodos queda la arista más corta
+    distinta = u != v
+    u, v, largo = u[distinta], v[distinta], largo[distinta]
+    a, b = np.minimum(u, v), np.maximum(u, v)
+    orden = np.lexsort((largo, b, a))
+    a, b, largo = a[orden], b[orden], largo[orden]
+    primera = np.ones(len(a), dtype=bool)
+    primera[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+    return a[primera], b[primera], largo[primera]
+
+
+def componente_mayor(n, u, v):
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    _, etiquetas = connected_components(coo_matrix((np.ones(len(u)), (u, v)), shape=(n, n)), directed=False)
+    return etiquetas == np.argmax(np.bincount(etiquetas))
+
+
+def contraer(n, u, v, largo):
+    # Como la simplificación de osmnx: un nodo con exactamente dos aristas
+    # (la unión de dos vías, sin cruce) desaparece y las cadenas de esos
+    # nodos quedan en una sola arista con la suma de los largos. Devuelve
+    # qué nodos se conservan y las aristas nuevas entre ellos
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+    m = len(u)
+    medio = np.bincount(np.concatenate((u, v)), minlength=n) == 2
+    # Las dos aristas de cada nodo del medio van en la misma cadena
+    extremos = np.concatenate((u, v))
+    aristas = np.tile(np.arange(m), 2)
+    orden = np.argsort(extremos, kind="stable")
+    extremos, aristas = extremos[orden], aristas[orden]
+    pares = aristas[medio[extremos]].reshape(-1, 2)
+    _, cadena = connected_components(coo_matrix((np.ones(len(pares)), (pares[:, 0], pares[:, 1])), shape=(m, m)),
+                                     directed=False)
+    largo = np.bincount(cadena, weights=largo)
+
+    # Cada cadena termina en dos nodos conservados (un ciclo aislado, en ninguno)
+    fuera = ~medio[extremos]
+    orden = np.argsort(cadena[aristas[fuera]], kind="stable")
+    puntas = extremos[fuera][orden].reshape(-1, 2)
+    cadenas = cadena[aristas[fuera]][orden][::2]
+    conservar = ~medio
+    nuevos = np.cumsum(conservar) - 1
+    a, b, largo = _sin_paralelas(nuevos[puntas[:, 0]], nuevos[puntas[:, 1]], largo[cadenas])
+    return conservar, a, b, largo
+
+
+def ensamblar(rutas, poligono):
+    # Une las teselas, recorta al polígono y simplifica. Devuelve los nodos
+    # (ids, lat, lon) y las aristas como índices a ellos, con su largo
+    import shapely
+    elementos = unir([dict(np.load(ruta)) for ruta in rutas])
+    posiciones, existe = _posiciones(elementos, elementos["refs"])
+    en_poligono = shapely.contains_xy(poligono, elementos["lon"], elementos["lat"])
+    a, b, largo = simplificar_red(elementos, existe & en_poligono[posiciones])
+
+    if not len(a):
+        raise SinDatos("No quedó ninguna calle dentro del polígono")
+    ids, inversa = np.unique(np.concatenate((a, b)), return_inverse=True)
+    u, v = inversa[:len(a)], inversa[len(a):]
+    mayor = componente_mayor(len(ids), u, v)
+    nuevos = np.cumsum(mayor) - 1
+    aristas = mayor[u]
+    ids = ids[mayor]
+    conservar, u, v, largo = contraer(len(ids), nuevos[u[aristas]], nuevos[v[aristas]], largo[aristas])
+    posiciones, _ = _posiciones(elementos, ids[conservar])
+    return {
+        "nodos": ids[conservar],
+        "lat": elementos["lat"][posiciones],
+        "lon": elementos["lon"][posiciones],
+        "u": u.astype(np.int32),
+        "v": v.astype(np.int32),
+        "longitud": largo,
+    }
+
+
+def construir_red(poligono, carpeta="cache", procesos=None, sin_red=False, extracto=None, tam=TAM_TESELA):
+    # `sin_red` o `extracto`: los datos salen de las respuestas ya guardadas
+    # en `carpeta` y/o del extracto OSM (.osm, .osm.bz2, .pbf), y cada tesela
+    # es un recorte de ellos. Si no, cada tesela se pide a Overpass
+    lon_min, lat_min, lon_max, lat_max = poligono.bounds
+    claves = teselas_caja(lat_min, lat_max, lon_min, lon_max, tam)
+    os.makedirs(os.path.join(carpeta, "teselas"), exist_ok=True)
+    ruta_manifiesto = os.path.join(carpeta, "teselas", "manifest.json")
+    manifiesto = {}
+    if os.path.exists(ruta_manifiesto):
+        with open(ruta_manifiesto) as f:
+            manifiesto = json.load(f)
+
+    locales = None
+    if sin_red or extracto:
+        fuentes = [leer_overpass(datos) for datos in respuestas_en_cache(carpeta)]
+        if extracto:
+            fuentes.append(leer_extracto(extracto))
+        locales = unir(fuentes)
+        if not len(locales["vias"]):
+            raise SinDatos(f"No hay datos OSM en {carpeta}" + (f" ni en {extracto}" if extracto else ""))
+
+    procesos = procesos or os.cpu_count() or 1
+    reprocesadas = 0
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futuros = []
+        for clave in claves:
+            nombre = os.path.basename(ruta_tesela(carpeta, clave, tam))
+            elementos = recortar(locales, caja_tesela(*clave, tam)) if locales is not None else None
+            futuros.append(pool.submit(procesar_tesela, clave, carpeta, manifiesto.get(nombre), elementos,
+                                       sin_red, tam))
+        for futuro in futuros:
+            clave, firma_tesela, cambio = futuro.result()
+            manifiesto[os.path.basename(ruta_tesela(carpeta, clave, tam))] = firma_tesela
+            reprocesadas += cambio
+
+    temporal = ruta_manifiesto + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(manifiesto, f, indent=1, sort_keys=True)
+    os.replace(temporal, ruta_manifiesto)
+
+    red = ensamblar([ruta_tesela(carpeta, clave, tam) for clave in claves], poligono)
+    resumen = {"teselas": len(claves), "reprocesadas": reprocesadas, "reutilizadas": len(claves) - reprocesadas,
+               "nodos": len(red["nodos"]), "aristas": len(red["u"])}
+    return red, resumen
@@ -0,0 +1,246 @@
+import heapq
+import math
+
+import numpy as np
+
+from motor_csr import sha1_arreglo
+
+# Contraction Hierarchies sobre GrafoCSR (no dirigido).
+#
+# Preproceso: se contraen los nodos de menor a mayor importancia; al quitar v
+# se agrega un atajo u-x por cada par de vecinos cuyo camino más corto pasa
+# por v. Cada atajo recuerda las dos aristas que reemplaza para poder
+# desempaquetarlo. Consulta: Dijkstra "hacia arriba" desde ambos extremos
+# sobre el grafo de subida (solo aristas hacia nodos de mayor rango).
+
+LIMITE_TESTIGOS = 500
+
+
+class JerarquiaCH:
+
+    def __init__(self, rango, ch_u, ch_v, ch_hijo1, ch_hijo2, ch_entrada, indptr, indices, ids, pesos, huella):
+        self.rango = rango
+        self.ch_u = ch_u              # extremos de cada arista de la jerarquía
+        self.ch_v = ch_v
+        self.ch_hijo1 = ch_hijo1      # aristas que reemplaza un atajo (-1 si es original)
+        self.ch_hijo2 = ch_hijo2
+        self.ch_entrada = ch_entrada  # entrada CSR original (-1 si es atajo)
+        self.indptr = indptr          # grafo de subida en formato CSR
+        self.indices = indices
+        self.ids = ids
+        self.pesos = pesos
+        self.huella = huella          # sha1 de los pesos con que se construyó
+        self._vistas = None
+
+    @property
+    def num_atajos(self):
+        return int(np.count_nonzero(self.ch_entrada < 0))
+
+    def arreglos(self):
+        return {
+            "rango": self.rango, "ch_u": self.ch_u, "ch_v": self.ch_v,
+            "ch_hijo1": self.ch_hijo1, "ch_hijo2": self.ch_hijo2, "ch_entrada": self.ch_entrada,
+            "indptr": self.indptr, "indices": self.indices, "ids": self.ids, "pesos": self.pesos,
+        }
+
+    def _subida(self):
+        if self._vistas is None:
+            self._vistas = (memoryview(self.indptr), memoryview(self.indices),
+                            memoryview(self.ids), memoryview(self.pesos))
+        return self._vistas
+
+    def consultar(self, origen, destino, estadisticas=None):
+        indptr, indices, ids, pesos = self._subida()
+        dist = ({origen: 0.0}, {destino: 0.0})
+        pred = ({}, {})
+        heaps = ([(0.0, origen)], [(0.0, destino)])
+        visitados = (set(), set())
+        mejor, encuentro = (0.0, origen) if origen == destino else (math.inf, None)
+        inserciones = 2
+
+        while heaps[0] or heaps[1]:
+            # Se alterna entre direcciones; cada una termina cuando su tope
+            # ya no puede mejorar el mejor camino encontrado
+            for lado in (0, 1):
+                heap = heaps[lado]
+                if not heap:
+                    continue
+                if heap[0][0] >= mejor:
+                    heap.clear()
+                    continue
+                d, nodo = heapq.heappop(heap)
+                if nodo in visitados[lado]:
+                    continue
+                visitados[lado].add(nodo)
+                otro = dist[1 - lado].get(nodo)
+                if otro is not None and d + otro < mejor:
+                    mejor, encuentro = d + otro, nodo
+                for k in range(indptr[nodo], indptr[nodo + 1]):
+                    vecino = indices[k]
+                    nd = d + pesos[k]
+                    if nd < dist[lado].get(vecino, math.inf):
+                        dist[lado][vecino] = nd
+                        pred[lado][vecino] = (nodo, ids[k])
+                        heapq.heappush(heap, (nd, vecino))
+                        inserciones += 1
+
+        if estadisticas is not None:
+            estadisticas["asentados"] = estadisticas.get("asentados", 0) + len(visitados[0]) + len(visitados[1])
+            estadisticas["inserciones"] = estadisticas.get("inserciones", 0) + inserciones
+        if encuentro is None:
+            return None
+
+        # Aristas de la jerarquía en orden de recorrido, cada una con su nodo de partida
+        tramos = []
+        nodo = encuentro
+        while nodo != origen:
+            anterior, arista = pred[0][nodo]
+            tramos.append((arista, anterior))
+            nodo = anterior
+        tramos.reverse()
+        nodo = encuentro
+        while nodo != destino:
+            siguiente, arista = pred[1][nodo]
+            tramos.append((arista, nodo))
+            nodo = siguiente
+
+        camino = [origen]
+        entradas = []
+        for arista, desde in tramos:
+            self._desempaquetar(arista, desde, camino, entradas)
+        return mejor, camino, entradas
+
+    def _desempaquetar(self, arista, desde, camino, entradas):
+        ch_u, ch_v = self.ch_u, self.ch_v
+        pila = [(arista, desde)]
+        while pila:
+            arista, desde = pila.pop()
+            hasta = int(ch_u[arista]) + int(ch_v[arista]) - desde
+            hijo1 = int(self.ch_hijo1[arista])
+            if hijo1 < 0:
+                entradas.append(int(self.ch_entrada[arista]))
+                camino.append(hasta)
+                continue
+            hijo2 = int(self.ch_hijo2[arista])
+            if desde not in (int(ch_u[hijo1]), int(ch_v[hijo1])):
+                hijo1, hijo2 = hijo2, hijo1
+            medio = int(ch_u[hijo1]) + int(ch_v[hijo1]) - desde
+            # Pila: primero se procesa el tramo desde -> medio
+            pila.append((hijo2, medio))
+            pila.append((hijo1, desde))
+
+
+def construir_ch(grafo, peso, limite_testigos=LIMITE_TESTIGOS):
+    n = grafo.num_nodos
+    pesos = grafo.pesos[peso]
+
+    # Entrada CSR u->v de cada arista original
+    fuentes = np.repeat(np.arange(n), np.diff(grafo.indptr))
+    directas = fuentes == grafo.u[grafo.aristas]
+    entrada_de_arista = np.empty(grafo.num_aristas, dtype=np.int64)
+    entrada_de_arista[grafo.aristas[directas]] = np.flatnonzero(directas)
+
+    ch_u, ch_v, ch_w, hijo1, hijo2, entrada = [], [], [], [], [], []
+    adj = [dict() for _ in range(n)]
+
+    def agregar(a, b, w, h1, h2, k):
+        ch_u.append(a)
+        ch_v.append(b)
+        ch_w.append(w)
+        hijo1.append(h1)
+        hijo2.append(h2)
+        entrada.append(k)
+        return len(ch_u) - 1
+
+    for e, (a, b, w, k) in enumerate(zip(grafo.u.tolist(), grafo.v.tolist(), pesos.tolist(),
+                                         entrada_de_arista.tolist())):
+        if a == b or (b in adj[a] and adj[a][b][0] <= w):
+            continue
+        i = agregar(a, b, w, -1, -1, k)
+        adj[a][b] = (w, i)
+        adj[b][a] = (w, i)
+
+    def testigos(origen, excluido, limite):
+        dist = {origen: 0.0}
+        heap = [(0.0, origen)]
+        asentados = 0
+        while heap and asentados < limite_testigos:
+            d, nodo = heapq.heappop(heap)
+            if d > limite:
+                break
+            if d > dist[nodo]:
+                continue
+            asentados += 1
+            for vecino, (w, _) in adj[nodo].items():
+                if vecino == excluido:
+                    continue
+                nd = d + w
+                if nd < dist.get(vecino, math.inf):
+                    dist[vecino] = nd
+                    heapq.heappush(heap, (nd, vecino))
+        return dist
+
+    def atajos(v):
+        vecinos = list(adj[v].items())
+        nuevos = []
+        for i, (a, (wa, ia)) in enumerate(vecinos):
+            resto = vecinos[i + 1:]
+            if not resto:
+                continue
+            limite = wa + max(wb for _, (wb, _) in resto)
+            dist = testigos(a, v, limite)
+            for b, (wb, ib) in resto:
+                if dist.get(b, math.inf) > wa + wb:
+                    nuevos.append((a, b, wa + wb, ia, ib))
+        return nuevos
+
+    contraidos_vecinos = [0] * n
+
+    def prioridad(v):
+        return len(atajos(v)) - len(adj[v]) + contraidos_vecinos[v]
+
+    heap = [(prioridad(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rango = np.empty(n, dtype=np.int32)
+    subida = [None] * n
+    siguiente = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        # Actualización perezosa: si la prioridad empeoró, se reinserta
+        actual = prioridad(v)
+        if heap and actual > heap[0][0]:
+            heapq.heappush(heap, (actual, v))
+            continue
+
+        nuevos = atajos(v)
+        rango[v] = siguiente
+        siguiente += 1
+        subida[v] = [(x, w, i) for x, (w, i) in adj[v].items()]
+        for x in adj[v]:
+            del adj[x][v]
+            contraidos_vecinos[x] += 1
+        adj[v] = {}
+        for a, b, w, ia, ib in nuevos:
+            if b in adj[a] and adj[a][b][0] <= w:
+                continue
+            i = agregar(a, b, w, ia, ib, -1)
+            adj[a][b] = (w, i)
+            adj[b][a] = (w, i)
+
+    # Grafo de subida en CSR: cada nodo apunta solo a vecinos de mayor rango
+    grados = [len(s) for s in subida]
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(grados, out=indptr[1:])
+    plano = [item for s in subida for item in s]
+    indices = np.array([x for x, _, _ in plano], dtype=np.int32)
+    ids = np.array([i for _, _, i in plano], dtype=np.int32)
+    pesos_subida = np.array([w for _, w, _ in plano], dtype=np.float64)
+
+    return JerarquiaCH(
+        rango,
+        np.array(ch_u, dtype=np.int32), np.array(ch_v, dtype=np.int32),
+        np.array(hijo1, dtype=np.int32), np.array(hijo2, dtype=np.int32),
+        np.array(entrada, dtype=np.int64),
+        indptr, indices, ids, pesos_subida,
+        sha1_arreglo(pesos),
+    )
@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+from motor_csr import RADIO_TIERRA
+
+# Formatos compactos para las coordenadas de una ruta: polyline codificada
+# (formato de Google, precisión 1e-5) y un buffer binario de int32
+# little-endian con deltas en 1e-6 grados (el primer punto va absoluto).
+# Opcionalmente se simplifica con Douglas-Peucker a la tolerancia de un píxel
+# en el zoom pedido.
+
+FORMATOS = ("json", "polyline", "binary")
+PRECISION_POLYLINE = 5
+ESCALA_BINARIO = 1e6
+CIRCUNFERENCIA = 2 * math.pi * RADIO_TIERRA
+
+
+def metros_por_pixel(lat, zoom):
+    return CIRCUNFERENCIA * math.cos(math.radians(lat)) / (256 * 2 ** zoom)
+
+
+def simplificar(coords, zoom):
+    # Douglas-Peucker sobre una proyección equirectangular en metros
+    coords = np.asarray(coords, dtype=np.float64)
+    n = len(coords)
+    if n < 3:
+        return coords
+    lat0 = math.radians(coords[:, 0].mean())
+    xy = np.radians(coords[:, ::-1]) * RADIO_TIERRA
+    xy[:, 0] *= math.cos(lat0)
+    tolerancia = metros_por_pixel(math.degrees(lat0), zoom)
+
+    conservar = np.zeros(n, dtype=bool)
+    conservar[[0, -1]] = True
+    pila = [(0, n - 1)]
+    while pila:
+        i, j = pila.pop()
+        if j <= i + 1:
+            continue
+        segmento = xy[j] - xy[i]
+        puntos = xy[i + 1:j] - xy[i]
+        largo = math.hypot(*segmento)
+        if largo == 0:
+            distancias = np.hypot(puntos[:, 0], puntos[:, 1])
+        else:
+            distancias = np.abs(segmento[0] * puntos[:, 1] - segmento[1] * puntos[:, 0]) / largo
+        k = int(np.argmax(distancias))
+        if distancias[k] > tolerancia:
+            medio = i + 1 + k
+            conservar[medio] = True
+            pila.append((i, medio))
+            pila.append((medio, j))
+    return coords[conservar]
+
+
+def codificar_polyline(coords, precision=PRECISION_POLYLINE):
+    enteros = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(enteros, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    salida = []
+    for valor in zigzag.tolist():
+        while valor >= 0x20:
+            salida.append(chr((0x20 | (valor & 0x1f)) + 63))
+            valor >>= 5
+        salida.append(chr(valor + 63))
+    return "".join(salida)
+
+
+def decodificar_polyline(texto, precision=PRECISION_POLYLINE):
+    valores = []
+    valor = desplazamiento = 0
+    for caracter in texto:
+        b = ord(caracter) - 63
+        valor |= (b & 0x1f) << desplazamiento
+        desplazamiento += 5
+        if b < 0x20:
+            valores.append(~(valor >> 1) if valor & 1 else valor >> 1)
+            valor = desplazamiento = 0
+    return (np.cumsum(np.array(valores, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision).tolist()
+
+
+def empaquetar_binario(coords):
+    enteros = np.round(np.asarray(coords, dtype=np.float64).reshape(-1, 2) * ESCALA_BINARIO).astype(np.int64)
+    deltas = np.diff(enteros, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return deltas.astype("<i4").tobytes()
+
+
+def desempaquetar_binario(datos):
+    deltas = np.frombuffer(datos, dtype="<i4").reshape(-1, 2).astype(np.int64)
+    return (np.cumsum(deltas, axis=0) / ESCALA_BINARIO).tolist()
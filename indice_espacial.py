@@ -0,0 +1,157 @@
+import math
+
+import numpy as np
+
+RADIO_TIERRA = 6371000
+VERSION_INDICE = 1
+# Anillos de celdas que recorre la búsqueda del más cercano; un punto más
+# lejos de todos los nodos se resuelve comparando contra todos de una vez
+MAX_ANILLOS = 64
+
+
+class IndiceEspacial:
+    # Rejilla uniforme sobre las coordenadas de los nodos proyectadas a metros
+    # (proyección equirectangular centrada en la latitud media del grafo).
+    # Sirve para ajustar puntos al nodo más cercano y para consultas por radio.
+
+    def __init__(self, lat, lon, tam_celda=200.0, lat0=None):
+        self.tam_celda = float(tam_celda)
+        if lat0 is None:
+            lat0 = float(np.mean(lat)) if len(lat) else 0.0
+        self.lat0 = float(lat0)
+        self.cos_lat0 = math.cos(math.radians(self.lat0))
+        self.x, self.y = self.proyectar(lat, lon)
+
+        cx = np.floor(self.x / self.tam_celda).astype(np.int64)
+        cy = np.floor(self.y / self.tam_celda).astype(np.int64)
+        self.orden = np.lexsort((cy, cx))
+        self._armar_celdas()
+
+    def _armar_celdas(self):
+        cx = np.floor(self.x[self.orden] / self.tam_celda).astype(np.int64)
+        cy = np.floor(self.y[self.orden] / self.tam_celda).astype(np.int64)
+
+        # celda -> (inicio, fin) dentro de `orden`
+        cortes = np.flatnonzero((np.diff(cx) != 0) | (np.diff(cy) != 0)) + 1
+        inicios = np.concatenate(([0], cortes)).tolist()
+        fines = np.concatenate((cortes, [len(cx)])).tolist()
+        self.celdas = {}
+        if len(cx):
+            for a, b in zip(inicios, fines):
+                self.celdas[(int(cx[a]), int(cy[a]))] = (a, b)
+            self.limites = (int(cx.min()), int(cx.max()), int(cy.min()), int(cy.max()))
+        else:
+            self.limites = (0, -1, 0, -1)
+
+    def proyectar(self, lat, lon):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        x = np.radians(lon) * RADIO_TIERRA * self.cos_lat0
+        y = np.radians(lat) * RADIO_TIERRA
+        return x, y
+
+    def _celda(self, x, y):
+        return math.floor(x / self.tam_celda), math.floor(y / self.tam_celda)
+
+    def _candidatos(self, i0, i1, j0, j1):
+        candidatos = []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                rango = self.celdas.get((i, j))
+                if rango is not None:
+                    candidatos.append(self.orden[rango[0]:rango[1]])
+        return candidatos
+
+    def en_radio(self, lat, lon, radio_metros):
+        x, y = self.proyectar(lat, lon)
+        return self._en_radio_xy(float(x), float(y), radio_metros)
+
+    def en_radio_lote(self, lats, lons, radio_metros):
+        xs, ys = self.proyectar(lats, lons)
+        return [self._en_radio_xy(x, y, radio_metros) for x, y in zip(xs.tolist(), ys.tolist())]
+
+    def _en_radio_xy(self, x, y, radio_metros):
+        if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(radio_metros)):
+            return np.empty(0, dtype=np.int64)
+        i0, j0 = self._celda(x - radio_metros, y - radio_metros)
+        i1, j1 = self._celda(x + radio_metros, y + radio_metros)
+        candidatos = self._candidatos(i0, i1, j0, j1)
+        if not candidatos:
+            return np.empty(0, dtype=np.int64)
+
+        candidatos = np.concatenate(candidatos)
+        d2 = (self.x[candidatos] - x) ** 2 + (self.y[candidatos] - y) ** 2
+        return candidatos[d2 < radio_metros ** 2]
+
+    def mas_cercano(self, lat, lon):
+        x, y = self.proyectar(lat, lon)
+        return self._mas_cercano_xy(float(x), float(y))
+
+    def mas_cercanos(self, lats, lons):
+        # Versión por lotes: devuelve (nodos, distancias en metros)
+        xs, ys = self.proyectar(lats, lons)
+        nodos = np.empty(len(xs), dtype=np.int64)
+        distancias = np.empty(len(xs), dtype=np.float64)
+        for k, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            nodos[k], distancias[k] = self._mas_cercano_xy(x, y)
+        return nodos, distancias
+
+    def _mas_cercano_xy(self, x, y):
+        if not self.celdas or not (math.isfinite(x) and math.isfinite(y)):
+            return -1, math.inf
+        ci, cj = self._celda(x, y)
+        i_min, i_max, j_min, j_max = self.limites
+        r_max = max(abs(ci - i_min), abs(ci - i_max), abs(cj - j_min), abs(cj - j_max))
+
+        mejor, mejor_d2 = -1, math.inf
+        for r in range(r_max + 1):
+            if r > MAX_ANILLOS:
+                # Punto lejos de la rejilla: cada anillo vacío cuesta 8r
+                # búsquedas en el dict, así que se compara con todos los nodos
+                d2 = (self.x - x) ** 2 + (self.y - y) ** 2
+                mejor = int(np.argmin(d2))
+                return mejor, math.sqrt(float(d2[mejor]))
+            # Anillo de celdas a distancia r (en celdas) de la celda del punto
+            if r == 0:
+                candidatos = self._candidatos(ci, ci, cj, cj)
+            else:
+                candidatos = (self._candidatos(ci - r, ci + r, cj - r, cj - r)
+                              + self._candidatos(ci - r, ci + r, cj + r, cj + r)
+                              + self._candidatos(ci - r, ci - r, cj - r + 1, cj + r - 1)
+                              + self._candidatos(ci + r, ci + r, cj - r + 1, cj + r - 1))
+            if candidatos:
+                candidatos = np.concatenate(candidatos)
+                d2 = (self.x[candidatos] - x) ** 2 + (self.y[candidatos] - y) ** 2
+                k = int(np.argmin(d2))
+                if d2[k] < mejor_d2:
+                    mejor, mejor_d2 = int(candidatos[k]), float(d2[k])
+            # Todo lo que queda fuera del anillo r está al menos a r celdas
+            if mejor >= 0 and mejor_d2 <= (r * self.tam_celda) ** 2:
+                break
+        return mejor, math.sqrt(mejor_d2)
+
+    def guardar(self, ruta, huella):
+        np.savez(ruta, version=VERSION_INDICE, huella=huella, tam_celda=self.tam_celda,
+                 lat0=self.lat0, x=self.x, y=self.y, orden=self.orden)
+
+
+def cargar_indice(ruta, huella):
+    # Devuelve None si el archivo no existe o no corresponde a la huella dada
+    try:
+        with np.load(ruta) as datos:
+            if int(datos["version"]) != VERSION_INDICE or str(datos["huella"]) != huella:
+                return None
+            return desde_arreglos(datos["x"], datos["y"], datos["orden"],
+                                  float(datos["tam_celda"]), float(datos["lat0"]))
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def desde_arreglos(x, y, orden, tam_celda, lat0):
+    indice = IndiceEspacial.__new__(IndiceEspacial)
+    indice.tam_celda = tam_celda
+    indice.lat0 = lat0
+    indice.cos_lat0 = math.cos(math.radians(lat0))
+    indice.x, indice.y, indice.orden = x, y, orden
+    indice._armar_celdas()
+    return indice
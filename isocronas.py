@@ -0,0 +1,124 @@
+import heapq
+import math
+
+import numpy as np
+
+from motor_csr import _anotar
+
+# Isocronas: lo que se alcanza desde un origen dentro de un presupuesto de
+# distancia (o de tiempo, que es la distancia a la velocidad del modo, igual
+# que en calcular_ruta). Un solo Dijkstra por el peso del modo, que sigue los
+# mismos caminos que calcular_ruta y acumula sus metros. Los metros no crecen
+# en el orden del peso, así que la búsqueda no para en el primer nodo fuera
+# del presupuesto: para cuando el costo pasa de metros_max · factor_maximo,
+# desde donde ningún camino mide menos que el presupuesto. Un mismo árbol
+# sirve para cualquier presupuesto menor o igual.
+
+DECIMALES = 6
+
+
+class ArbolIsocrona:
+
+    def __init__(self, metros_max, nodos, metros, aristas, metros_aristas, asentados):
+        self.metros_max = metros_max      # presupuesto con el que se buscó
+        self.nodos = nodos                # nodos alcanzados, por metros crecientes
+        self.metros = metros
+        self.aristas = aristas            # aristas con los dos extremos alcanzados
+        self.metros_aristas = metros_aristas   # metros hasta su extremo más lejano, crecientes
+        self.asentados = asentados
+
+    def dentro(self, metros):
+        # (nodos, aristas) alcanzables con `metros` <= metros_max
+        return (self.nodos[:np.searchsorted(self.metros, metros, side="right")],
+                self.aristas[:np.searchsorted(self.metros_aristas, metros, side="right")])
+
+
+def arbol_acotado(grafo, origen, peso, metros_max, estadisticas=None):
+    indptr, indices, w = grafo.adyacencia(peso)
+    _, _, largo = grafo.adyacencia("length")
+    cota = metros_max * grafo.factor_maximo(peso)
+    dist = {origen: 0.0}
+    metros = {origen: 0.0}
+    visitados = set()
+    alcanzados = []
+    heap = [(0.0, origen)]
+    inserciones = 1
+    while heap:
+        d, nodo = heapq.heappop(heap)
+        if nodo in visitados:
+            continue
+        if d > cota:
+            break
+        visitados.add(nodo)
+        m = metros[nodo]
+        if m <= metros_max:
+            alcanzados.append(nodo)
+        for k in range(indptr[nodo], indptr[nodo + 1]):
+            vecino = indices[k]
+            nd = d + w[k]
+            if nd <= cota and nd < dist.get(vecino, math.inf):
+                dist[vecino] = nd
+                metros[vecino] = m + largo[k]
+                heapq.heappush(heap, (nd, vecino))
+                inserciones += 1
+    _anotar(estadisticas, len(visitados), inserciones)
+
+    nodos = np.array(alcanzados, dtype=np.int64)
+    metros_nodos = np.array([metros[nodo] for nodo in alcanzados], dtype=np.float64)
+    orden = np.argsort(metros_nodos, kind="stable")
+    nodos, metros_nodos = nodos[orden], metros_nodos[orden]
+
+    llegada = np.full(grafo.num_nodos, math.inf)
+    llegada[nodos] = metros_nodos
+    metros_aristas = np.maximum(llegada[grafo.u], llegada[grafo.v])
+    aristas = np.flatnonzero(np.isfinite(metros_aristas))
+    aristas = aristas[np.argsort(metros_aristas[aristas], kind="stable")]
+    return ArbolIsocrona(metros_max, nodos, metros_nodos, aristas, metros_aristas[aristas], len(visitados))
+
+
+def contorno_convexo(x, y):
+    # Cadena monótona de Andrew. Devuelve los vértices (x, y) en sentido
+    # antihorario, sin repetir el primero
+    puntos = np.unique(np.column_stack((x, y)), axis=0)
+    if len(puntos) < 3:
+        return puntos
+
+    def cadena(pts):
+        pila = []
+        for p in pts:
+            while len(pila) >= 2:
+                (ax, ay), (bx, by) = pila[-2], pila[-1]
+                if (bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax) > 0:
+                    break
+                pila.pop()
+            pila.append(p)
+        return pila
+
+    lista = puntos.tolist()
+    inferior = cadena(lista)
+    superior = cadena(reversed(lista))
+    return np.array(inferior[:-1] + superior[:-1])
+
+
+def isocrona_geojson(grafo, arbol, presupuestos):
+    # Por presupuesto: el contorno convexo de los nodos alcanzados (Polygon) y
+    # las aristas alcanzadas (MultiLineString). `presupuestos` es una lista
+    # de (propiedades, metros)
+    features = []
+    for propiedades, metros in presupuestos:
+        nodos, aristas = arbol.dentro(metros)
+        propiedades = {**propiedades, "nodos": len(nodos), "aristas": len(aristas),
+                       "largo_metros": round(float(grafo.pesos["length"][aristas].sum()), 1)}
+        contorno = contorno_convexo(grafo.lon[nodos], grafo.lat[nodos])
+        poligono = None
+        if len(contorno) >= 3:
+            anillo = np.round(np.vstack((contorno, contorno[:1])), DECIMALES).tolist()
+            poligono = {"type": "Polygon", "coordinates": [anillo]}
+        features.append({"type": "Feature", "properties": {**propiedades, "tipo": "contorno"},
+                         "geometry": poligono})
+        lineas = np.round(np.stack((grafo.lon[grafo.u[aristas]], grafo.lat[grafo.u[aristas]],
+                                    grafo.lon[grafo.v[aristas]], grafo.lat[grafo.v[aristas]]), axis=1), DECIMALES)
+        features.append({"type": "Feature", "properties": {**propiedades, "tipo": "aristas"},
+                         "geometry": {"type": "MultiLineString",
+                                      "coordinates": lineas.reshape(-1, 2, 2).tolist()}})
+    return {"type": "FeatureCollection", "features": features}
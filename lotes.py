@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Evaluación masiva de pedidos de ruta desde un archivo NDJSON. Todo es una
+# cadena de generadores: las líneas se leen de a una, se agrupan en bloques,
+# los bloques se reparten entre procesos con un máximo de bloques en vuelo y
+# los resultados se escriben en el orden de entrada a medida que llegan. La
+# memoria no depende del largo del archivo.
+
+TAM_BLOQUE = 256
+BLOQUES_EN_VUELO = 2   # por proceso
+# Columnas de la salida en columnas (.npy por columna o Parquet)
+COLUMNAS = (("fila", "<i8"), ("ok", "|b1"), ("distancia_metros", "<f8"), ("tiempo_minutos", "<f8"),
+            ("puntos", "<i4"), ("modo", "|u1"), ("tipo", "|u1"))
+MANIFIESTO = "manifest.json"
+
+
+def leer_pedidos(lineas):
+    # (fila, pedido) por línea no vacía; fila cuenta desde 1 como en un
+    # editor. Una línea que no es un objeto JSON va como pedido None
+    for fila, linea in enumerate(lineas, start=1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            pedido = json.loads(linea)
+        except ValueError:
+            pedido = None
+        yield fila, pedido if isinstance(pedido, dict) else None
+
+
+def en_bloques(elementos, tam=TAM_BLOQUE):
+    bloque = []
+    for elemento in elementos:
+        bloque.append(elemento)
+        if len(bloque) >= tam:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def mapa_ordenado(funcion, bloques, pool=None, en_vuelo=1, *argumentos):
+    # Como map(), pero con a lo sumo `en_vuelo` bloques enviados al pool y sin
+    # terminar; sin pool corre en el proceso
+    if pool is None:
+        for bloque in bloques:
+            yield funcion(bloque, *argumentos)
+        return
+    pendientes = deque()
+    for bloque in bloques:
+        pendientes.append(pool.submit(funcion, bloque, *argumentos))
+        if len(pendientes) >= en_vuelo:
+            yield pendientes.popleft().result()
+    while pendientes:
+        yield pendientes.popleft().result()
+
+
+class EscritorNDJSON:
+
+    def __init__(self, ruta):
+        self._archivo = sys.stdout if ruta == "-" else open(ruta, "w", encoding="utf-8")
+
+    def escribir(self, resultados):
+        self._archivo.write("".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                    for r in resultados))
+
+    def cerrar(self):
+        self._archivo.flush()
+        if self._archivo is not sys.stdout:
+            self._archivo.close()
+
+
+def _columnas(resultados, categorias):
+    valores = {
+        "fila": [r["fila"] for r in resultados],
+        "ok": [r["ok"] for r in resultados],
+        "distancia_metros": [r["distancia_metros"] if r["ok"] else np.nan for r in resultados],
+        "tiempo_minutos": [r["tiempo_minutos"] if r["ok"] else np.nan for r in resultados],
+        "puntos": [r.get("puntos", 0) for r in resultados],
+    }
+    # Categóricas: código 255 si el valor no es uno de los conocidos
+    for nombre, conocidos in categorias.items():
+        codigos = {valor: i for i, valor in enumerate(conocidos)}
+        valores[nombre] = [codigos.get(r.get(nombre), 255) for r in resultados]
+    return {nombre: np.asarray(valores[nombre], dtype=dtype) for nombre, dtype in COLUMNAS}
+
+
+class EscritorColumnas:
+    # Un directorio con un .npy por columna, como la instantánea del grafo.
+    # Cada .npy se escribe con largo 0 y se le agregan los bloques al final;
+    # al cerrar se reescribe la cabecera con el largo final (el formato deja
+    # lugar para eso), así que se abre con np.load(..., mmap_mode="r")
+
+    def __init__(self, ruta, categorias):
+        self.ruta = ruta
+        self.categorias = categorias
+        self.filas = 0
+        self._temporal = ruta + ".tmp"
+        shutil.rmtree(self._temporal, ignore_errors=True)
+        os.makedirs(self._temporal)
+        self._archivos = {}
+        for nombre, dtype in COLUMNAS:
+            archivo = open(os.path.join(self._temporal, nombre + ".npy"), "wb")
+            self._cabecera(archivo, dtype, 0)
+            self._archivos[nombre] = archivo
+
+    @staticmethod
+    def _cabecera(archivo, dtype, largo):
+        np.lib.format.write_array_header_1_0(archivo, {"descr": dtype, "fortran_order": False, "shape": (largo,)})
+
+    def escribir(self, resultados):
+        for nombre, valores in _columnas(resultados, self.categorias).items():
+            self._archivos[nombre].write(valores.tobytes())
+        self.filas += len(resultados)
+
+    def cerrar(self):
+        for nombre, dtype in COLUMNAS:
+            archivo = self._archivos[nombre]
+            archivo.seek(0)
+            self._cabecera(archivo, dtype, self.filas)
+            archivo.close()
+        with open(os.path.join(self._temporal, MANIFIESTO), "w") as f:
+            json.dump({"filas": self.filas, "columnas": dict(COLUMNAS),
+                       "categorias": {nombre: list(valores) for nombre, valores in self.categorias.items()}}, f)
+        shutil.rmtree(self.ruta, ignore_errors=True)
+        os.replace(self._temporal, self.ruta)
+
+
+class EscritorParquet:
+    # Un grupo de filas por bloque; requiere pyarrow
+
+    def __init__(self, ruta, categorias):
+        if pyarrow is None:
+            raise RuntimeError("La salida .parquet requiere el paquete pyarrow")
+        self.categorias = categorias
+        self._esquema = pyarrow.schema([(nombre, pyarrow.from_numpy_dtype(np.dtype(dtype)))
+                                        for nombre, dtype in COLUMNAS])
+        self._escritor = pyarrow.parquet.ParquetWriter(ruta, self._esquema)
+
+    def escribir(self, resultados):
+        columnas = _columnas(resultados, self.categorias)
+        self._escritor.write_table(pyarrow.table(columnas, schema=self._esquema))
+
+    def cerrar(self):
+        self._escritor.close()
+
+
+def abrir_escritor(ruta, categorias):
+    # Por la extensión: .parquet, .npy (directorio de columnas) o NDJSON
+    if ruta.endswith(".parquet"):
+        return EscritorParquet(ruta, categorias)
+    if ruta.endswith(".npy") or ruta.endswith(os.sep):
+        return EscritorColumnas(ruta.rstrip(os.sep), categorias)
+    return EscritorNDJSON(ruta)
+
+
+def evaluar_archivo(entrada, salida, funcion, pool=None, procesos=1, tam_bloque=TAM_BLOQUE, categorias=None,
+                    argumentos=(), cada=5.0):
+    # Corre `funcion(bloque, *argumentos)` sobre los bloques de (fila, pedido)
+    # del NDJSON `entrada` ("-" = stdin) y escribe lo que devuelve. Informa el
+    # avance por stderr cada `cada` segundos y devuelve el resumen
+    archivo = sys.stdin if entrada == "-" else open(entrada, encoding="utf-8")
+    escritor = abrir_escritor(salida, categorias or {})
+    inicio = ultimo = time.perf_counter()
+    pedidos = resultados = errores = 0
+    try:
+        bloques = en_bloques(leer_pedidos(archivo), tam_bloque)
+        for bloque_resultados in mapa_ordenado(funcion, bloques, pool, BLOQUES_EN_VUELO * procesos, *argumentos):
+            escritor.escribir(bloque_resultados)
+            resultados += len(bloque_resultados)
+            errores += sum(not r["ok"] for r in bloque_resultados)
+            pedidos = bloque_resultados[-1]["fila"] if bloque_resultados else pedidos
+            ahora = time.perf_counter()
+            if ahora - ultimo >= cada:
+                ultimo = ahora
+                print(f"{resultados} resultados, {resultados / (ahora - inicio):.0f}/s", file=sys.stderr)
+    finally:
+        escritor.cerrar()
+        if archivo is not sys.stdin:
+            archivo.close()
+    segundos = time.perf_counter() - inicio
+    return {
+        "lineas": pedidos,
+        "resultados": resultados,
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "resultados_por_segundo": round(resultados / segundos, 1) if segundos > 0 else None,
+        "procesos": procesos if pool is not None else 0,
+        "rss_max_kb": _rss_max_kb(),
+    }
+
+
+def _rss_max_kb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
@@ -0,0 +1,72 @@
+import math
+import time
+
+import numpy as np
+
+from trabajadores import ServicioSaturado, TiempoAgotado, aplicar_pesos, obtener_pool, publicar_pesos
+
+# Matrices origen x destino. Cada origen es un árbol de Dijkstra compartido
+# por todos los destinos (GrafoCSR.uno_a_muchos); los orígenes se reparten en
+# bloques entre los procesos de trabajo (trabajadores.py), que comparten el
+# grafo de la instantánea. En el servidor los bloques pasan por el
+# Despachador, así que cuentan contra su máximo de tareas pendientes y el
+# pedido entero vence a su tiempo límite.
+
+MIN_ORIGENES_PARALELO = 32
+BLOQUES_POR_PROCESO = 4
+
+
+def _filas(origenes, destinos, peso, publicados, generacion):
+    grafo = aplicar_pesos({peso: publicados} if publicados else None, generacion)
+    return _calcular_filas(grafo, origenes, destinos, peso)
+
+
+def _calcular_filas(grafo, origenes, destinos, peso):
+    costos = np.empty((len(origenes), len(destinos)), dtype=np.float64)
+    metros = np.empty_like(costos)
+    for i, origen in enumerate(origenes):
+        costos[i], metros[i] = grafo.uno_a_muchos(origen, destinos, peso)
+    return costos, metros
+
+
+def matriz_costos(grafo, origenes, destinos, peso, ruta_snapshot=None, procesos=None, despachador=None):
+    # Devuelve (costos, metros) de forma (orígenes, destinos) con inf donde
+    # no hay camino. Pocas filas, o sin instantánea ni despachador, se
+    # calculan en el proceso
+    if despachador is not None:
+        procesos = despachador.procesos
+    if ((ruta_snapshot is None and despachador is None) or len(origenes) < MIN_ORIGENES_PARALELO
+            or procesos == 1):
+        return _calcular_filas(grafo, origenes, destinos, peso)
+
+    publicados = publicar_pesos(grafo, peso)
+    if despachador is not None:
+        # Un bloque por proceso: con BLOQUES_POR_PROCESO una sola matriz
+        # ocuparía todos los cupos del despachador
+        tam = max(1, math.ceil(len(origenes) / procesos))
+        bloques = [origenes[i:i + tam] for i in range(0, len(origenes), tam)]
+        partes = _en_despachador(despachador, [(_filas, bloque, destinos, peso, publicados, grafo.generacion)
+                                               for bloque in bloques])
+    else:
+        pool, procesos = obtener_pool(ruta_snapshot, procesos)
+        tam = max(1, math.ceil(len(origenes) / (procesos * BLOQUES_POR_PROCESO)))
+        bloques = [origenes[i:i + tam] for i in range(0, len(origenes), tam)]
+        futuros = [pool.submit(_filas, bloque, destinos, peso, publicados, grafo.generacion) for bloque in bloques]
+        partes = [futuro.result() for futuro in futuros]
+    return (np.concatenate([costos for costos, _ in partes]),
+            np.concatenate([metros for _, metros in partes]))
+
+
+def _en_despachador(despachador, tareas):
+    # Todas las tareas comparten el tiempo límite de un pedido. Si no hay
+    # cupo para alguna o se vence el plazo, se cancelan las que sigan en cola
+    futuros = []
+    try:
+        for funcion, *args in tareas:
+            futuros.append(despachador.enviar(funcion, *args))
+        limite = time.monotonic() + despachador.timeout
+        return [despachador.esperar(futuro, max(limite - time.monotonic(), 0)) for futuro in futuros]
+    except (ServicioSaturado, TiempoAgotado):
+        for futuro in futuros:
+            futuro.cancel()
+        raise
@@ -0,0 +1,219 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Contadores e histogramas en el formato de texto de Prometheus, sin
+# dependencias. Todas las métricas de un registro comparten un lock: así los
+# procesos de trabajo pueden extraer lo acumulado de una vez (y dejarlo en
+# cero) para que el servidor lo sume al suyo.
+
+CUBETAS_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                    2.5, 5.0, 10.0)
+CUBETAS_NODOS = (10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    pares = (f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores))
+    return "{" + ",".join(pares) + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor):
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Contador:
+
+    def __init__(self, nombre, ayuda, etiquetas, lock):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}   # valores de las etiquetas -> total
+        self._lock = lock
+
+    def inc(self, valor=1, **etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        with self._lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def lineas(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        for clave, valor in sorted(self.valores.items()):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+
+    def fusionar(self, valores):
+        for clave, valor in valores.items():
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+
+class Histograma:
+
+    def __init__(self, nombre, ayuda, cubetas, etiquetas, lock):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.cubetas = tuple(cubetas)
+        self.etiquetas = tuple(etiquetas)
+        self.valores = {}   # valores de las etiquetas -> [conteo por cubeta (+Inf al final), suma]
+        self._lock = lock
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        cubeta = bisect.bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self.valores.get(clave)
+            if serie is None:
+                serie = self.valores[clave] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][cubeta] += 1
+            serie[1] += valor
+
+    def lineas(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        limites = [_numero(limite) for limite in self.cubetas] + ["+Inf"]
+        for clave, (conteos, suma) in sorted(self.valores.items()):
+            acumulado = 0
+            for limite, conteo in zip(limites, conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas + ("le",), clave + (limite,))
+                yield f"{self.nombre}_bucket{etiquetas} {acumulado}"
+            etiquetas = _etiquetas(self.etiquetas, clave)
+            yield f"{self.nombre}_sum{etiquetas} {_numero(suma)}"
+            yield f"{self.nombre}_count{etiquetas} {acumulado}"
+
+    def fusionar(self, valores):
+        for clave, (conteos, suma) in valores.items():
+            serie = self.valores.get(clave)
+            if serie is None:
+                self.valores[clave] = [list(conteos), suma]
+            else:
+                serie[0] = [a + b for a, b in zip(serie[0], conteos)]
+                serie[1] += suma
+
+
+class Registro:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas, self._lock))
+
+    def histograma(self, nombre, ayuda, cubetas=CUBETAS_SEGUNDOS, etiquetas=()):
+        return self._registrar(Histograma(nombre, ayuda, cubetas, etiquetas, self._lock))
+
+    def _registrar(self, metrica):
+        with self._lock:
+            if metrica.nombre in self._metricas:
+                raise ValueError(f"Métrica duplicada: {metrica.nombre}")
+            self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def exponer(self):
+        with self._lock:
+            lineas = [linea for metrica in self._metricas.values() for linea in metrica.lineas()]
+        return "\n".join(lineas) + "\n"
+
+    def extraer(self):
+        # Lo acumulado desde la última extracción, en tipos simples (se envía
+        # entre procesos); el registro queda en cero
+        with self._lock:
+            extraido = {}
+            for nombre, metrica in self._metricas.items():
+                if metrica.valores:
+                    extraido[nombre], metrica.valores = metrica.valores, {}
+        return extraido
+
+    def fusionar(self, extraido):
+        with self._lock:
+            for nombre, valores in extraido.items():
+                self._metricas[nombre].fusionar(valores)
+
+
+@contextmanager
+def cronometrar(histograma, **etiquetas):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observar(time.perf_counter() - inicio, **etiquetas)
+
+
+class Perfilador:
+    # Perfilador por muestreo: cada `intervalo` segundos toma la pila de todos
+    # los hilos del proceso y cuenta cuántas veces aparece cada una. El
+    # resultado sale en formato de pilas plegadas ("a;b;c N"), el que leen
+    # flamegraph.pl y speedscope
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self.intervalo = None
+        self.muestras = 0
+        self.pilas = Counter()
+
+    @property
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self, intervalo=0.005):
+        with self._lock:
+            if self.activo:
+                return False
+            self.intervalo = intervalo
+            self.muestras = 0
+            self.pilas = Counter()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+            self._hilo.start()
+            return True
+
+    def detener(self):
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is None:
+            return False
+        self._detener.set()
+        hilo.join()
+        return True
+
+    def _muestrear(self):
+        propio = threading.get_ident()
+        while not self._detener.wait(self.intervalo):
+            muestra = Counter()
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while marco is not None:
+                    codigo = marco.f_code
+                    pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                    marco = marco.f_back
+                muestra[";".join(reversed(pila))] += 1
+            with self._lock:
+                self.pilas.update(muestra)
+                self.muestras += 1
+
+    def plegadas(self):
+        with self._lock:
+            pilas = self.pilas.copy()
+        return "".join(f"{pila} {cuenta}\n" for pila, cuenta in pilas.most_common())
+
+    def estado(self):
+        return {"activo": self.activo, "intervalo": self.intervalo, "muestras": self.muestras,
+                "pilas": len(self.pilas)}
+
+
+registro = Registro()
+perfilador = Perfilador()
@@ -0,0 +1,547 @@
+import hashlib
+import heapq
+import math
+import threading
+
+import numpy as np
+
+from indice_espacial import IndiceEspacial
+
+ATRIBUTOS_PESO = ("length", "peso_normal", "peso_horapico", "peso_libre")
+RADIO_TIERRA = 6371000
+ALGORITMOS = ("dijkstra", "astar", "bidireccional", "ch")
+
+
+class GrafoCSR:
+    # Grafo no dirigido compilado a arreglos planos (formato CSR).
+    # Cada arista aparece dos veces en la adyacencia (u->v y v->u); `aristas`
+    # apunta desde cada entrada CSR a su arista, donde viven los pesos.
+
+    def __init__(self, nodos, lat, lon, indptr, indices, aristas, u, v, pesos, congestion,
+                 pesos_csr=None, orden_ids=None, espacial=None, jerarquias=None, perfiles=None):
+        self.nodos = nodos            # id OSM de cada nodo
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices        # nodo vecino de cada entrada CSR
+        self.aristas = aristas        # arista de cada entrada CSR
+        self.u = u                    # extremos de cada arista
+        self.v = v
+        self.pesos = pesos            # atributo -> float64 por arista
+        self.congestion = congestion
+        if pesos_csr is None:
+            pesos_csr = {attr: valores[aristas] for attr, valores in pesos.items()}
+        self.pesos_csr = pesos_csr    # atributo -> float64 por entrada CSR
+        if orden_ids is None:
+            orden_ids = np.argsort(nodos, kind="stable")
+        self.orden_ids = orden_ids    # permite buscar ids OSM sin un dict por nodo
+        self._espacial = espacial
+        self.jerarquias = jerarquias or {}   # peso -> JerarquiaCH (contraccion.py)
+        self.perfiles = perfiles      # uint8 (aristas x intervalos) (tiempo_dependiente.py)
+        self._huella = None
+        self.tabla_rutas = {}
+        self.tabla_detalle = {}
+        self._vistas = {}
+        self.version_pesos = 0
+        self.generacion = None        # generación de la instantánea (snapshot.py)
+        self._escritura = threading.Lock()
+
+    @property
+    def espacial(self):
+        if self._espacial is None:
+            self._espacial = IndiceEspacial(self.lat, self.lon)
+        return self._espacial
+
+    @espacial.setter
+    def espacial(self, indice):
+        self._espacial = indice
+
+    def huella_coordenadas(self):
+        h = hashlib.sha1()
+        for arr in (self.nodos, self.lat, self.lon):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
+
+    @property
+    def num_nodos(self):
+        return len(self.nodos)
+
+    @property
+    def num_aristas(self):
+        return len(self.u)
+
+    def indice_nodo(self, osmid):
+        if osmid is None:
+            return None
+        k = int(np.searchsorted(self.nodos, osmid, sorter=self.orden_ids))
+        if k < len(self.nodos) and self.nodos[self.orden_ids[k]] == osmid:
+            return int(self.orden_ids[k])
+        return None
+
+    def _vista(self, clave, construir):
+        # Las vistas publicadas nunca se modifican: quien no encuentra una la
+        # construye y publica una copia del dict con ella agregada. Solo ese
+        # caso toma el lock de escritura, y si los pesos cambiaron mientras
+        # tanto la vista se usa pero no se guarda
+        vistas = self._vistas
+        if clave in vistas:
+            return vistas[clave]
+        version = self.version_pesos
+        valor = construir()
+        with self._escritura:
+            if self.version_pesos == version and clave not in self._vistas:
+                self._vistas = {**self._vistas, clave: valor}
+        return valor
+
+    def adyacencia(self, peso):
+        # El bucle de búsqueda corre en Python. Un memoryview devuelve ints y
+        # floats nativos tan rápido como una lista, sin copiar los arreglos
+        # (que pueden estar mapeados en memoria y compartidos entre procesos)
+        indptr, indices = self._vista("base", lambda: (memoryview(self.indptr), memoryview(self.indices)))
+        return indptr, indices, self._vista(peso, lambda: self._valores_csr(peso))
+
+    def _valores_csr(self, peso):
+        if peso in self.pesos_csr:
+            return memoryview(np.ascontiguousarray(self.pesos_csr[peso]))
+        # networkx usa peso 1 cuando el atributo no existe
+        return memoryview(np.ones(len(self.indices)))
+
+    def coordenadas_listas(self):
+        return self._vista("coords", lambda: (memoryview(self.lat), memoryview(self.lon)))
+
+    def buscar(self, origen, destino, peso, algoritmo="dijkstra", bloqueados=None, estadisticas=None):
+        if algoritmo not in ALGORITMOS:
+            raise ValueError(f"Algoritmo desconocido: {algoritmo}")
+        return getattr(self, algoritmo)(origen, destino, peso, bloqueados=bloqueados, estadisticas=estadisticas)
+
+    def dijkstra(self, origen, destino, peso, bloqueados=None, estadisticas=None):
+        # `bloqueados` es un conjunto de nodos propio de cada consulta: el
+        # grafo compartido nunca se modifica. Sin nodos bloqueados la búsqueda
+        # corre en C (scipy.sparse.csgraph); con ellos, en el bucle de Python,
+        # que los salta sin copiar la matriz
+        if not bloqueados:
+            return self._dijkstra_csgraph(origen, destino, peso, estadisticas)
+        indptr, indices, w = self.adyacencia(peso)
+        dist = {origen: 0.0}
+        pred = {}
+        visitados = set()
+        heap = [(0.0, origen)]
+        inserciones = 1
+        encontrada = None
+        while heap:
+            d, nodo = heapq.heappop(heap)
+            if nodo in visitados:
+                continue
+            if nodo == destino:
+                encontrada = (d, *self._reconstruir(pred, origen, destino))
+                break
+            visitados.add(nodo)
+            for k in range(indptr[nodo], indptr[nodo + 1]):
+                vecino = indices[k]
+                if bloqueados and vecino in bloqueados:
+                    continue
+                nd = d + w[k]
+                if nd < dist.get(vecino, math.inf):
+                    dist[vecino] = nd
+                    pred[vecino] = (nodo, k)
+                    heapq.heappush(heap, (nd, vecino))
+                    inserciones += 1
+        _anotar(estadisticas, len(visitados), inserciones)
+        return encontrada
+
+    def matriz(self, peso):
+        # Matriz dispersa de scipy sobre los mismos arreglos CSR. scipy se
+        # importa acá: tarda en importarse y solo hace falta para buscar
+        def construir():
+            from scipy.sparse import csr_matrix
+            valores = np.asarray(self.pesos_csr[peso]) if peso in self.pesos_csr else np.ones(len(self.indices))
+            return csr_matrix((valores, np.asarray(self.indices), np.asarray(self.indptr)),
+                              shape=(self.num_nodos, self.num_nodos))
+        return self._vista(("matriz", peso), construir)
+
+    def _dijkstra_csgraph(self, origen, destino, peso, estadisticas=None):
+        from scipy.sparse.csgraph import dijkstra
+        if origen == destino:
+            _anotar(estadisticas, 0, 0)
+            return 0.0, [origen], []
+        # Árbol completo desde el origen: csgraph no corta al llegar al
+        # destino, pero en C sigue siendo varias veces más rápido que el
+        # bucle de Python que sí corta
+        dist, pred = dijkstra(self.matriz(peso), indices=origen, return_predecessors=True)
+        alcanzados = int(np.count_nonzero(np.isfinite(dist)))
+        _anotar(estadisticas, alcanzados, alcanzados)
+        if not np.isfinite(dist[destino]):
+            return None
+        camino = [destino]
+        while camino[-1] != origen:
+            camino.append(int(pred[camino[-1]]))
+        camino.reverse()
+        # El predecesor es un nodo; la entrada CSR es la más liviana entre
+        # los dos (puede haber aristas paralelas)
+        indptr, indices, w = self.adyacencia(peso)
+        entradas = []
+        for a, b in zip(camino, camino[1:]):
+            entradas.append(min((k for k in range(indptr[a], indptr[a + 1]) if indices[k] == b),
+                                key=w.__getitem__))
+        return float(dist[destino]), camino, entradas
+
+    def uno_a_muchos(self, origen, destinos, peso, estadisticas=None):
+        # Un solo árbol de Dijkstra desde `origen` para todos los destinos; se
+        # detiene al asentarlos a todos. Devuelve (costos, metros) alineados
+        # con `destinos`, con inf en los que no se alcanzan
+        indptr, indices, w = self.adyacencia(peso)
+        _, _, largo = self.adyacencia("length")
+        pendientes = set(destinos)
+        dist = {origen: 0.0}
+        metros = {origen: 0.0}
+        visitados = set()
+        heap = [(0.0, origen)]
+        inserciones = 1
+        while heap and pendientes:
+            d, nodo = heapq.heappop(heap)
+            if nodo in visitados:
+                continue
+            visitados.add(nodo)
+            pendientes.discard(nodo)
+            m = metros[nodo]
+            for k in range(indptr[nodo], indptr[nodo + 1]):
+                vecino = indices[k]
+                nd = d + w[k]
+                if nd < dist.get(vecino, math.inf):
+                    dist[vecino] = nd
+                    metros[vecino] = m + largo[k]
+                    heapq.heappush(heap, (nd, vecino))
+                    inserciones += 1
+        _anotar(estadisticas, len(visitados), inserciones)
+        costos = np.array([dist.get(t, math.inf) for t in destinos], dtype=np.float64)
+        return costos, np.array([metros.get(t, math.inf) for t in destinos], dtype=np.float64)
+
+    def astar(self, origen, destino, peso, factor=None, bloqueados=None, estadisticas=None):
+        # `factor` convierte metros en línea recta a unidades de `peso`; debe
+        # ser una cota inferior para que la heurística sea admisible
+        if factor is None:
+            factor = self.factor_heuristica(peso)
+        indptr, indices, w = self.adyacencia(peso)
+        lat, lon = self.coordenadas_listas()
+        lat_d, lon_d = lat[destino], lon[destino]
+
+        def h(nodo):
+            return factor * haversine(lat[nodo], lon[nodo], lat_d, lon_d)
+
+        dist = {origen: 0.0}
+        pred = {}
+        visitados = set()
+        heap = [(h(origen), 0.0, origen)]
+        inserciones = 1
+        encontrada = None
+        while heap:
+            _, d, nodo = heapq.heappop(heap)
+            if nodo in visitados:
+                continue
+            if nodo == destino:
+                encontrada = (d, *self._reconstruir(pred, origen, destino))
+                break
+            visitados.add(nodo)
+            for k in range(indptr[nodo], indptr[nodo + 1]):
+                vecino = indices[k]
+                if vecino in visitados or (bloqueados and vecino in bloqueados):
+                    continue
+                nd = d + w[k]
+                if nd < dist.get(vecino, math.inf):
+                    dist[vecino] = nd
+                    pred[vecino] = (nodo, k)
+                    heapq.heappush(heap, (nd + h(vecino), nd, vecino))
+                    inserciones += 1
+        _anotar(estadisticas, len(visitados), inserciones)
+        return encontrada
+
+    def bidireccional(self, origen, destino, peso, factor=None, bloqueados=None, estadisticas=None):
+        # A* bidireccional con potenciales promediados: p(v) = (h_t(v) - h_s(v)) / 2.
+        # Ambas búsquedas ven los mismos costos reducidos, así que se puede
+        # parar en cuanto tope_adelante + tope_atras >= mejor camino visto
+        if origen == destino:
+            _anotar(estadisticas, 0, 0)
+            return 0.0, [origen], []
+        if factor is None:
+            factor = self.factor_heuristica(peso)
+        indptr, indices, w = self.adyacencia(peso)
+        lat, lon = self.coordenadas_listas()
+        lat_s, lon_s = lat[origen], lon[origen]
+        lat_t, lon_t = lat[destino], lon[destino]
+        mitad = factor / 2
+        potenciales = {}
+
+        def p(nodo):
+            valor = potenciales.get(nodo)
+            if valor is None:
+                la, lo = lat[nodo], lon[nodo]
+                valor = mitad * (haversine(la, lo, lat_t, lon_t) - haversine(la, lo, lat_s, lon_s))
+                potenciales[nodo] = valor
+            return valor
+
+        dist = ({origen: 0.0}, {destino: 0.0})
+        pred = ({}, {})
+        visitados = (set(), set())
+        heaps = ([(p(origen), origen)], [(-p(destino), destino)])
+        signo = (1, -1)
+        inserciones = 2
+        mejor, encuentro = math.inf, None
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= mejor:
+                break
+            lado = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, nodo = heapq.heappop(heaps[lado])
+            if nodo in visitados[lado]:
+                continue
+            visitados[lado].add(nodo)
+            d = dist[lado][nodo]
+            dist_otro = dist[1 - lado]
+            for k in range(indptr[nodo], indptr[nodo + 1]):
+                vecino = indices[k]
+                if vecino in visitados[lado] or (bloqueados and vecino in bloqueados):
+                    continue
+                nd = d + w[k]
+                if nd < dist[lado].get(vecino, math.inf):
+                    dist[lado][vecino] = nd
+                    pred[lado][vecino] = (nodo, k)
+                    heapq.heappush(heaps[lado], (nd + signo[lado] * p(vecino), vecino))
+                    inserciones += 1
+                    if vecino in dist_otro and nd + dist_otro[vecino] < mejor:
+                        mejor = nd + dist_otro[vecino]
+                        encuentro = vecino
+
+        _anotar(estadisticas, len(visitados[0]) + len(visitados[1]), inserciones)
+        if encuentro is None:
+            return None
+        camino, entradas = self._reconstruir(pred[0], origen, encuentro)
+        # La búsqueda hacia atrás recorrió las entradas al revés (nodo->vecino);
+        # el camino usa la gemela en el sentido de avance
+        gemelas = self.entradas_de_aristas()
+        nodo = encuentro
+        while nodo != destino:
+            nodo, k = pred[1][nodo]
+            par = gemelas[self.aristas[k]]
+            camino.append(nodo)
+            entradas.append(int(par[0] if par[1] == k else par[1]))
+        return mejor, camino, entradas
+
+    def ch(self, origen, destino, peso, bloqueados=None, estadisticas=None):
+        jerarquia = self.jerarquias.get(peso)
+        if jerarquia is None or bloqueados:
+            # Sin jerarquía para este modo, o con nodos bloqueados (un atajo
+            # podría cruzar la zona bloqueada): búsqueda sobre el grafo base
+            if estadisticas is not None:
+                estadisticas["degradacion"] = "ch_con_bloqueados" if bloqueados else "ch_sin_jerarquia"
+            return self.bidireccional(origen, destino, peso, bloqueados=bloqueados, estadisticas=estadisticas)
+        encontrada = jerarquia.consultar(origen, destino, estadisticas)
+        if encontrada is None:
+            return None
+        # La jerarquía guarda una sola entrada (u->v) por arista original; las
+        # recorridas de v a u se cambian por su gemela
+        costo, camino, entradas = encontrada
+        if entradas:
+            entradas = np.asarray(entradas, dtype=np.int64)
+            invertidas = self.indices[entradas] != np.asarray(camino[1:])
+            if invertidas.any():
+                pares = self.entradas_de_aristas()[self.aristas[entradas[invertidas]]]
+                entradas[invertidas] = np.where(pares[:, 0] == entradas[invertidas], pares[:, 1], pares[:, 0])
+            entradas = entradas.tolist()
+        return costo, camino, entradas
+
+    def factor_heuristica(self, peso):
+        # Menor relación peso/longitud en línea recta entre todas las aristas:
+        # con ese factor la heurística es admisible y consistente para el modo
+        # Se guarda junto a las vistas para que cambie con ellas al actualizar pesos
+        return self._vista(("factor", peso), lambda: factor_admisible(self, peso))
+
+    def factor_maximo(self, peso):
+        # Mayor relación peso/longitud entre las aristas: un camino de costo c
+        # mide al menos c / factor metros (inf si hay aristas de largo 0 con peso)
+        return self._vista(("factor_maximo", peso), lambda: relacion_maxima(self, peso))
+
+    def actualizar_congestion(self, aristas, congestion):
+        # Copia y reemplazo: cada búsqueda toma sus vistas al empezar y conserva
+        # los arreglos anteriores, así que los lectores no esperan a este lock
+        # (solo lo toman para publicar una vista que faltaba, ver _vista).
+        # Solo la hora pico depende de la congestión (peso = longitud * congestión).
+        # Devuelve los pesos anteriores y nuevos de las aristas, y la huella de
+        # la hora pico antes y después del lote
+        aristas = np.asarray(aristas, dtype=np.int64)
+        congestion = np.asarray(congestion, dtype=np.float64)
+        # Antes del lock: si falta, construirla también lo toma
+        entradas = self.entradas_de_aristas()[aristas].ravel()
+        with self._escritura:
+            nueva_congestion = np.array(self.congestion, dtype=np.float64)
+            nueva_congestion[aristas] = congestion
+            anteriores = np.array(self.pesos["peso_horapico"][aristas])
+            horapico = np.array(self.pesos["peso_horapico"])
+            horapico[aristas] = self.pesos["length"][aristas] * congestion
+            horapico_csr = np.array(self.pesos_csr["peso_horapico"])
+            horapico_csr[entradas] = horapico[self.aristas[entradas]]
+            clave_huella = ("huella", "peso_horapico")
+            huella_anterior = self._vistas.get(clave_huella) or self._calcular_huella_pesos("peso_horapico")
+            h = hashlib.sha1(huella_anterior.encode())
+            h.update(aristas.tobytes())
+            h.update(horapico[aristas].tobytes())
+            huella_nueva = h.hexdigest()
+
+            # Orden de publicación: pesos primero, luego vistas (que vuelven a
+            # construirse desde los pesos nuevos) y al final lo derivado
+            self.pesos = {**self.pesos, "peso_horapico": horapico}
+            self.pesos_csr = {**self.pesos_csr, "peso_horapico": horapico_csr}
+            self.congestion = nueva_congestion
+            descartadas = ("peso_horapico", ("factor", "peso_horapico"), ("factor_maximo", "peso_horapico"),
+                           ("matriz", "peso_horapico"))
+            self._vistas = {**{clave: valor for clave, valor in dict(self._vistas).items()
+                               if clave not in descartadas}, clave_huella: huella_nueva}
+            # La jerarquía ya no corresponde a los pesos nuevos
+            self.jerarquias = {peso: j for peso, j in self.jerarquias.items() if peso != "peso_horapico"}
+            self._huella = None
+            self.version_pesos += 1
+        return anteriores, horapico[aristas], (huella_anterior, huella_nueva)
+
+    def reemplazar_pesos(self, peso, valores):
+        # Reemplazo completo de los pesos de un modo (por ejemplo, los que un
+        # proceso de trabajo recibe del servidor tras cambios de tráfico)
+        valores = np.asarray(valores, dtype=np.float64)
+        with self._escritura:
+            self.pesos = {**self.pesos, peso: valores}
+            self.pesos_csr = {**self.pesos_csr, peso: valores[self.aristas]}
+            self._vistas = {clave: valor for clave, valor in dict(self._vistas).items()
+                            if clave not in (peso, ("factor", peso), ("factor_maximo", peso), ("huella", peso),
+                                             ("matriz", peso))}
+            self.jerarquias = {p: j for p, j in self.jerarquias.items() if p != peso}
+            self._huella = None
+            self.version_pesos += 1
+
+    def entradas_de_aristas(self):
+        # (m, 2): las dos entradas CSR (u->v y v->u) de cada arista
+        return self._vista("entradas_de_aristas",
+                           lambda: np.argsort(self.aristas, kind="stable").reshape(-1, 2))
+
+    def _reconstruir(self, pred, origen, destino):
+        camino = [destino]
+        entradas = []
+        nodo = destino
+        while nodo != origen:
+            nodo, k = pred[nodo]
+            camino.append(nodo)
+            entradas.append(k)
+        camino.reverse()
+        entradas.reverse()
+        return camino, entradas
+
+    def coordenadas(self, camino):
+        return np.column_stack((self.lat[camino], self.lon[camino])).tolist()
+
+    def distancia(self, entradas, peso="length"):
+        if not entradas:
+            return 0.0
+        return float(self.pesos_csr[peso][entradas].sum())
+
+    def huella_pesos(self, peso):
+        # Identifica la estructura y los pesos de un modo ("perfiles" para los
+        # perfiles horarios). Se calcula una vez sobre los arreglos completos;
+        # actualizar_congestion la encadena con cada lote, sin volver a leerlos
+        return self._vista(("huella", peso), lambda: self._calcular_huella_pesos(peso))
+
+    def _calcular_huella_pesos(self, peso):
+        valores = self.perfiles if peso == "perfiles" else self.pesos.get(peso)
+        h = hashlib.sha1(peso.encode())
+        for arr in (self.nodos, self.indices, valores):
+            if arr is not None:
+                h.update(np.ascontiguousarray(arr).tobytes())
+        return h.hexdigest()
+
+    def huella(self):
+        if self._huella is not None:
+            return self._huella
+        h_arreglos = [self.nodos, self.indptr, self.indices, self.aristas]
+        h_arreglos += [self.pesos[attr] for attr in sorted(self.pesos)]
+        h = hashlib.sha1()
+        for arr in h_arreglos:
+            h.update(np.ascontiguousarray(arr).tobytes())
+        self._huella = h.hexdigest()
+        return self._huella
+
+
+def sha1_arreglo(arr):
+    # sha1 del contenido de un arreglo (el manifiesto de snapshot.py guarda
+    # el de cada uno)
+    return hashlib.sha1(memoryview(np.ascontiguousarray(arr)).cast("B")).hexdigest()
+
+
+def _anotar(estadisticas, asentados, inserciones):
+    if estadisticas is not None:
+        estadisticas["asentados"] = estadisticas.get("asentados", 0) + asentados
+        estadisticas["inserciones"] = estadisticas.get("inserciones", 0) + inserciones
+
+
+def relacion_maxima(grafo, peso):
+    valores = grafo.pesos.get(peso)
+    largo = grafo.pesos["length"]
+    if valores is None or (valores[largo <= 0] > 0).any():
+        return math.inf
+    validas = largo > 0
+    return float(np.max(valores[validas] / largo[validas], initial=0.0)) * (1 + 1e-9)
+
+
+def factor_admisible(grafo, peso):
+    if peso not in grafo.pesos:
+        return 0.0
+    recta = haversine_arr(grafo.lat[grafo.u], grafo.lon[grafo.u], grafo.lat[grafo.v], grafo.lon[grafo.v])
+    validas = recta > 0
+    if not validas.any():
+        return 0.0
+    # Margen para el redondeo de la haversine en coma flotante
+    return float(np.min(grafo.pesos[peso][validas] / recta[validas])) * (1 - 1e-9)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return RADIO_TIERRA * 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_arr(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return RADIO_TIERRA * 2 * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def compilar_grafo(G):
+    nodos = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    indice = {n: i for i, n in enumerate(nodos.tolist())}
+    lat = np.array([G.nodes[n]["y"] for n in G.nodes], dtype=np.float64)
+    lon = np.array([G.nodes[n]["x"] for n in G.nodes], dtype=np.float64)
+
+    m = G.number_of_edges()
+    u = np.empty(m, dtype=np.int32)
+    v = np.empty(m, dtype=np.int32)
+    pesos = {attr: np.zeros(m, dtype=np.float64) for attr in ATRIBUTOS_PESO}
+    congestion = np.zeros(m, dtype=np.float64)
+    for e, (a, b, data) in enumerate(G.edges(data=True)):
+        u[e] = indice[a]
+        v[e] = indice[b]
+        for attr in ATRIBUTOS_PESO:
+            pesos[attr][e] = float(data.get(attr, 0.0))
+        congestion[e] = data.get("congestion", 1.0)
+
+    return desde_aristas(nodos, lat, lon, u, v, pesos, congestion)
+
+
+def desde_aristas(nodos, lat, lon, u, v, pesos, congestion):
+    n = len(nodos)
+    m = len(u)
+    fuentes = np.concatenate((u, v))
+    destinos = np.concatenate((v, u))
+    aristas = np.concatenate((np.arange(m), np.arange(m)))
+    orden = np.argsort(fuentes, kind="stable")
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(fuentes, minlength=n), out=indptr[1:])
+    indices = destinos[orden].astype(np.int32)
+    aristas = aristas[orden].astype(np.int32)
+    return GrafoCSR(nodos, lat, lon, indptr, indices, aristas, u, v, pesos, congestion)
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Orden de visita para rutas con varias paradas. Se trabaja sobre la matriz
+# de costos entre todos los puntos (un árbol de Dijkstra por punto, ver
+# matriz.py): índice 0 = origen, 1..k = paradas, k+1 = destino. El origen y
+# el destino quedan fijos; las paradas se visitan en el orden de menor costo.
+# El grafo es no dirigido, así que la matriz es simétrica.
+
+MAX_EXACTO = 12
+
+
+def costo_orden(costos, secuencia):
+    return float(sum(costos[a, b] for a, b in zip(secuencia, secuencia[1:])))
+
+
+def orden_exacto(costos):
+    # Held-Karp: dp[S, j] = menor costo desde el origen visitando el conjunto
+    # S de paradas y terminando en j. O(2^k · k²), vectorizado por conjunto
+    k = len(costos) - 2
+    if k <= 0:
+        return []
+    entre = costos[1:k + 1, 1:k + 1]
+    total = 1 << k
+    bits = 1 << np.arange(k)
+    dp = np.full((total, k), np.inf)
+    padre = np.full((total, k), -1, dtype=np.int64)
+    dp[bits, np.arange(k)] = costos[0, 1:k + 1]
+    for conjunto in range(1, total):
+        ultimas = np.flatnonzero(conjunto & bits)
+        if len(ultimas) < 2:
+            continue
+        # Fila por cada parada final posible: llegar desde cualquier otra del
+        # conjunto (las que no están en el conjunto previo valen inf)
+        candidatos = dp[conjunto ^ bits[ultimas]] + entre[:, ultimas].T
+        mejores = np.argmin(candidatos, axis=1)
+        dp[conjunto, ultimas] = candidatos[np.arange(len(ultimas)), mejores]
+        padre[conjunto, ultimas] = mejores
+
+    conjunto = total - 1
+    j = int(np.argmin(dp[conjunto] + costos[1:k + 1, k + 1]))
+    orden = []
+    while j >= 0:
+        orden.append(j + 1)
+        conjunto, j = conjunto ^ (1 << j), int(padre[conjunto, j])
+    orden.reverse()
+    return orden
+
+
+def orden_heuristico(costos):
+    # Vecino más cercano desde el origen y luego 2-opt y Or-opt hasta que
+    # ninguna de las dos mejore el recorrido
+    k = len(costos) - 2
+    c = np.asarray(costos, dtype=np.float64).tolist()
+    pendientes = set(range(1, k + 1))
+    secuencia = [0]
+    while pendientes:
+        actual = secuencia[-1]
+        siguiente = min(pendientes, key=lambda p: c[actual][p])
+        secuencia.append(siguiente)
+        pendientes.remove(siguiente)
+    secuencia.append(k + 1)
+
+    mejoro = True
+    while mejoro:
+        mejoro = _dos_opt(c, secuencia) | _or_opt(c, secuencia)
+    return secuencia[1:-1]
+
+
+def _dos_opt(c, secuencia):
+    # Invierte el tramo secuencia[i..j] si reconectar sus bordes es más barato
+    mejoro = False
+    n = len(secuencia)
+    for i in range(1, n - 2):
+        for j in range(i + 1, n - 1):
+            a, b = secuencia[i - 1], secuencia[i]
+            d, e = secuencia[j], secuencia[j + 1]
+            if c[a][d] + c[b][e] < c[a][b] + c[d][e] - 1e-9:
+                secuencia[i:j + 1] = secuencia[i:j + 1][::-1]
+                mejoro = True
+    return mejoro
+
+
+def _or_opt(c, secuencia):
+    # Mueve tramos de 1 a 3 paradas a otra posición, sin invertirlos
+    mejoro = False
+    for largo in (1, 2, 3):
+        i = 1
+        while i + largo < len(secuencia):
+            a, b = secuencia[i - 1], secuencia[i]
+            d, e = secuencia[i + largo - 1], secuencia[i + largo]
+            ahorro = c[a][b] + c[d][e] - c[a][e]
+            tramo = secuencia[i:i + largo]
+            resto = secuencia[:i] + secuencia[i + largo:]
+            mejor, donde = 1e-9, None
+            for p in range(len(resto) - 1):
+                x, y = resto[p], resto[p + 1]
+                ganancia = ahorro - (c[x][b] + c[d][y] - c[x][y])
+                if ganancia > mejor:
+                    mejor, donde = ganancia, p
+            if donde is not None:
+                secuencia[:] = resto[:donde + 1] + tramo + resto[donde + 1:]
+                mejoro = True
+            i += 1
+    return mejoro
+
+
+def optimizar_orden(costos, max_exacto=MAX_EXACTO):
+    # Devuelve (orden de las paradas como índices 1..k, método usado)
+    k = len(costos) - 2
+    if k <= max_exacto:
+        return orden_exacto(costos), "exacto"
+    return orden_heuristico(costos), "heuristico"
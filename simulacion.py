@@ -0,0 +1,123 @@
+import math
+
+import numpy as np
+
+# Simulación de la congestión de todas las aristas, en pasos vectorizados.
+# La congestión de una arista es
+#     1 + (base - 1) · curva(hora) · exp(ruido)
+# - base: nivel propio de la arista en hora pico, entre `minimo` y `maximo`
+#   (el rango con que se construye el grafo), correlacionado en el espacio;
+# - curva(hora): cuánto del exceso sobre el flujo libre hay a esa hora (1 en
+#   la hora pico), interpolada entre los valores de CURVA_HORARIA;
+# - ruido: proceso AR(1) por arista con desvío SIGMA y memoria TAU_MINUTOS.
+#   Cada paso suma ruido nuevo suavizado sobre el grafo, así que las aristas
+#   vecinas suben y bajan juntas.
+# El suavizado promedia cada arista con las que comparten sus extremos
+# (dos np.bincount por ronda), así que un paso es O(aristas) y no depende de
+# la forma del grafo. Con la misma semilla la simulación se repite igual.
+
+# Fracción del exceso de congestión por hora del día (0..23)
+CURVA_HORARIA = (0.10, 0.08, 0.06, 0.06, 0.10, 0.30, 0.75, 1.00, 0.95, 0.70, 0.55, 0.55,
+                 0.60, 0.60, 0.55, 0.60, 0.75, 0.95, 1.00, 0.85, 0.55, 0.35, 0.22, 0.14)
+SIGMA = 0.15
+TAU_MINUTOS = 30.0
+PASO_MINUTOS = 5.0
+RONDAS_SUAVIZADO = 2
+HORA_PICO = 8.0
+# Pasos por llamada a avanzar_minutos: un día en pasos de 6 segundos
+MAX_PASOS = 14400
+
+
+def curva_en(hora, curva=CURVA_HORARIA):
+    # Interpolación lineal y periódica entre los valores de cada hora
+    return float(np.interp(hora % 24, np.arange(len(curva) + 1), (*curva, curva[0])))
+
+
+class SimuladorTrafico:
+
+    def __init__(self, u, v, num_nodos, semilla=None, hora=HORA_PICO, minimo=14.5, maximo=15.9,
+                 sigma=SIGMA, tau=TAU_MINUTOS, curva=CURVA_HORARIA, rondas=RONDAS_SUAVIZADO):
+        self.u = np.asarray(u, dtype=np.int64)
+        self.v = np.asarray(v, dtype=np.int64)
+        self.num_nodos = num_nodos
+        self.semilla = semilla
+        self.hora = float(hora) % 24
+        self.sigma = sigma
+        self.tau = tau
+        self.curva = tuple(curva)
+        self.rondas = rondas
+        self.pasos = 0
+        self._rng = np.random.default_rng(semilla)
+        grado = np.bincount(self.u, minlength=num_nodos) + np.bincount(self.v, minlength=num_nodos)
+        self._inverso_grado = 1.0 / np.maximum(grado, 1)
+
+        # El suavizado achica el desvío; se corrige con una muestra para que
+        # el ruido estacionario tenga desvío `sigma`
+        m = len(self.u)
+        muestra = self.suavizar(self._rng.standard_normal(m))
+        desvio = float(muestra.std()) if m > 1 else 1.0
+        self._escala = 1.0 / desvio if desvio > 0 else 1.0
+
+        # Base: un campo suavizado llevado por rango a [minimo, maximo], así
+        # que cada arista sigue uniforme en ese rango como antes
+        campo = self.suavizar(self._rng.standard_normal(m))
+        rango = np.empty(m)
+        rango[np.argsort(campo, kind="stable")] = (np.arange(m) + 0.5) / max(m, 1)
+        self.base = minimo + (maximo - minimo) * rango
+        self.ruido = self._ruido_nuevo()
+
+    def suavizar(self, valores):
+        # Cada ronda: promedio por nodo de sus aristas y, por arista, promedio
+        # de sus dos extremos
+        for _ in range(self.rondas):
+            por_nodo = (np.bincount(self.u, valores, self.num_nodos)
+                        + np.bincount(self.v, valores, self.num_nodos)) * self._inverso_grado
+            valores = (por_nodo[self.u] + por_nodo[self.v]) * 0.5
+        return valores
+
+    def _ruido_nuevo(self):
+        return self.suavizar(self._rng.standard_normal(len(self.u))) * (self._escala * self.sigma)
+
+    def avanzar(self, minutos=PASO_MINUTOS):
+        # Un paso de `minutos`: el ruido conserva exp(-minutos / tau) de lo
+        # anterior y la hora avanza
+        rho = math.exp(-minutos / self.tau)
+        self.ruido *= rho
+        self.ruido += self._ruido_nuevo() * math.sqrt(1 - rho * rho)
+        self.hora = (self.hora + minutos / 60) % 24
+        self.pasos += 1
+        return self.congestion()
+
+    def avanzar_minutos(self, minutos, paso=PASO_MINUTOS):
+        # `minutos` en pasos de `paso` (el último, lo que sobre). Devuelve la
+        # cantidad de pasos; ValueError si serían más de MAX_PASOS
+        if not paso > 0 or not minutos >= 0:
+            raise ValueError("'minutos' no puede ser negativo y 'paso' debe ser positivo")
+        pasos = int(minutos // paso)
+        resto = minutos - pasos * paso
+        total = pasos + (resto > 0)
+        if total > MAX_PASOS:
+            raise ValueError(f"{total} pasos; el máximo es {MAX_PASOS}")
+        for _ in range(pasos):
+            self.avanzar(paso)
+        if resto > 0:
+            self.avanzar(resto)
+        return total
+
+    def congestion(self):
+        # exp(ruido - sigma²/2) vale 1 en promedio: la curva fija el nivel medio
+        factor = curva_en(self.hora, self.curva) * np.exp(self.ruido - self.sigma * self.sigma / 2)
+        return 1.0 + (self.base - 1.0) * factor
+
+    def estado(self):
+        congestion = self.congestion()
+        hora = int(round(self.hora * 60)) % 1440
+        return {
+            "semilla": self.semilla,
+            "hora": f"{hora // 60:02d}:{hora % 60:02d}",
+            "pasos": self.pasos,
+            "aristas": len(self.u),
+            "curva": round(curva_en(self.hora, self.curva), 3),
+            "congestion_media": round(float(congestion.mean()), 3) if len(congestion) else None,
+            "congestion_p95": round(float(np.percentile(congestion, 95)), 3) if len(congestion) else None,
+        }
@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from contraccion import JerarquiaCH
+from indice_espacial import desde_arreglos
+from motor_csr import ATRIBUTOS_PESO, GrafoCSR, sha1_arreglo
+
+# Formato de la instantánea: un directorio con un .npy por arreglo y un
+# manifest.json con la versión, la huella del grafo y el sha1 de cada arreglo.
+# Los .npy se abren con mmap_mode="r", así que varios procesos comparten las
+# mismas páginas a través de la caché del sistema operativo.
+#
+# Cada reconstrucción escribe una generación nueva en "<ruta>.<n>" y cambia
+# el enlace simbólico <ruta> de una vez (os.replace), así que quien abre la
+# instantánea ve la generación anterior completa o la nueva completa. Las
+# generaciones viejas se borran dejando GENERACIONES_GUARDADAS; un proceso
+# que todavía tenga mapeados sus archivos los sigue leyendo hasta soltarlos.
+VERSION_SNAPSHOT = 1
+MANIFIESTO = "manifest.json"
+GENERACIONES_GUARDADAS = 2
+
+
+def _arreglos(grafo):
+    arreglos = {
+        "nodos": grafo.nodos,
+        "orden_ids": grafo.orden_ids,
+        "lat": grafo.lat,
+        "lon": grafo.lon,
+        "indptr": grafo.indptr,
+        "indices": grafo.indices,
+        "aristas": grafo.aristas,
+        "u": grafo.u,
+        "v": grafo.v,
+        "congestion": grafo.congestion,
+        "espacial_x": grafo.espacial.x,
+        "espacial_y": grafo.espacial.y,
+        "espacial_orden": grafo.espacial.orden,
+    }
+    for attr in ATRIBUTOS_PESO:
+        arreglos[f"pesos_{attr}"] = grafo.pesos[attr]
+        arreglos[f"pesos_csr_{attr}"] = grafo.pesos_csr[attr]
+    if grafo.perfiles is not None:
+        arreglos["perfiles"] = grafo.perfiles
+    for peso, jerarquia in grafo.jerarquias.items():
+        for campo, arr in jerarquia.arreglos().items():
+            arreglos[f"ch_{peso}_{campo}"] = arr
+    return arreglos
+
+
+def generacion_snapshot(ruta):
+    # Nombre de la generación a la que apunta <ruta>; None si <ruta> es un
+    # directorio común (instantánea anterior a las generaciones) o no existe.
+    # Es un readlink: se puede consultar en cada pedido
+    try:
+        return os.readlink(ruta)
+    except OSError:
+        return None
+
+
+def _generaciones(ruta):
+    # [(n, nombre)] de las generaciones en disco, de la más vieja a la más nueva
+    directorio, base = os.path.split(os.path.abspath(ruta))
+    generaciones = []
+    for nombre in os.listdir(directorio):
+        sufijo = nombre[len(base) + 1:]
+        if nombre.startswith(base + ".") and sufijo.isdigit():
+            generaciones.append((int(sufijo), nombre))
+    return sorted(generaciones)
+
+
+def _publicar_generacion(ruta, generacion):
+    # Cambia el enlace <ruta> a la generación nueva de una sola vez
+    enlace = f"{ruta}.enlace"
+    try:
+        if os.path.lexists(enlace):
+            os.remove(enlace)
+        os.symlink(generacion, enlace)
+    except OSError:
+        # Sin enlaces simbólicos (p. ej. Windows sin permisos): se reemplaza
+        # el directorio, como antes de las generaciones
+        shutil.rmtree(ruta, ignore_errors=True)
+        os.replace(os.path.join(os.path.dirname(ruta), generacion), ruta)
+        return
+    if os.path.isdir(ruta) and not os.path.islink(ruta):
+        # Primera generación sobre una instantánea anterior
+        shutil.rmtree(ruta)
+    os.replace(enlace, ruta)
+
+
+def guardar_snapshot(ruta, grafo, poi_mapping):
+    ruta = ruta.rstrip(os.sep)
+    generaciones = _generaciones(ruta)
+    generacion = f"{os.path.basename(ruta)}.{generaciones[-1][0] + 1 if generaciones else 1}"
+    temporal = os.path.join(os.path.dirname(ruta), generacion + ".tmp")
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+
+    manifiesto = {
+        "version": VERSION_SNAPSHOT,
+        "huella": grafo.huella(),
+        "poi_mapping": {nombre: int(nodo) for nombre, nodo in poi_mapping.items()},
+        "espacial": {"tam_celda": grafo.espacial.tam_celda, "lat0": grafo.espacial.lat0},
+        "jerarquias": {peso: jerarquia.huella for peso, jerarquia in grafo.jerarquias.items()},
+        "arreglos": {},
+    }
+    for nombre, arr in _arreglos(grafo).items():
+        arr = np.ascontiguousarray(arr)
+        archivo = os.path.join(temporal, nombre + ".npy")
+        np.save(archivo, arr)
+        sha1 = sha1_arreglo(arr)
+        # Se verifica al escribir, cuando los datos todavía están en memoria;
+        # la carga normal solo compara tipo y forma para no leer todo el mmap
+        if sha1_arreglo(np.load(archivo, mmap_mode="r")) != sha1:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise OSError(f"La instantánea no se escribió bien: {archivo}")
+        manifiesto["arreglos"][nombre] = {
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "sha1": sha1,
+        }
+    # El manifiesto se escribe al final: sin él la instantánea no es válida
+    with open(os.path.join(temporal, MANIFIESTO), "w") as f:
+        json.dump(manifiesto, f)
+
+    os.replace(temporal, os.path.join(os.path.dirname(ruta), generacion))
+    _publicar_generacion(ruta, generacion)
+    vigente = grafo.generacion = generacion_snapshot(ruta)
+    viejas = [viejo for _, viejo in _generaciones(ruta) if viejo != vigente]
+    for viejo in viejas[:max(len(viejas) - GENERACIONES_GUARDADAS + 1, 0)]:
+        shutil.rmtree(os.path.join(os.path.dirname(ruta), viejo), ignore_errors=True)
+
+
+def cargar_snapshot(ruta, verificar=False):
+    # Devuelve (grafo, poi_mapping) o None si falta, es de otra versión o está dañada.
+    # Por defecto solo se comparan tipo y forma (np.load falla si el archivo es
+    # más corto que lo que declara su encabezado), sin tocar las páginas del
+    # mmap; verificar=True además recalcula el sha1 de cada arreglo
+    generacion = generacion_snapshot(ruta)
+    if generacion is not None:
+        ruta = os.path.join(os.path.dirname(ruta.rstrip(os.sep)), generacion)
+    try:
+        with open(os.path.join(ruta, MANIFIESTO)) as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifiesto.get("version") != VERSION_SNAPSHOT:
+        return None
+
+    arreglos = {}
+    try:
+        for nombre, meta in manifiesto["arreglos"].items():
+            arr = np.load(os.path.join(ruta, nombre + ".npy"), mmap_mode="r")
+            if arr.dtype.str != meta["dtype"] or list(arr.shape) != meta["shape"]:
+                return None
+            if verificar and sha1_arreglo(arr) != meta["sha1"]:
+                return None
+            arreglos[nombre] = arr
+    except (OSError, ValueError, KeyError):
+        return None
+
+    try:
+        jerarquias = {}
+        for peso, huella in manifiesto.get("jerarquias", {}).items():
+            # Una jerarquía construida con otros pesos daría rutas que ya no
+            # son las más cortas: se descarta (se compara con el sha1 del
+            # manifiesto, sin leer los pesos)
+            if huella != manifiesto["arreglos"][f"pesos_{peso}"]["sha1"]:
+                continue
+            campos = {campo: arreglos[f"ch_{peso}_{campo}"] for campo in (
+                "rango", "ch_u", "ch_v", "ch_hijo1", "ch_hijo2", "ch_entrada", "indptr", "indices", "ids", "pesos")}
+            jerarquias[peso] = JerarquiaCH(huella=huella, **campos)
+        espacial = desde_arreglos(arreglos["espacial_x"], arreglos["espacial_y"], arreglos["espacial_orden"],
+                                  manifiesto["espacial"]["tam_celda"], manifiesto["espacial"]["lat0"])
+        grafo = GrafoCSR(
+            arreglos["nodos"], arreglos["lat"], arreglos["lon"],
+            arreglos["indptr"], arreglos["indices"], arreglos["aristas"],
+            arreglos["u"], arreglos["v"],
+            {attr: arreglos[f"pesos_{attr}"] for attr in ATRIBUTOS_PESO},
+            arreglos["congestion"],
+            pesos_csr={attr: arreglos[f"pesos_csr_{attr}"] for attr in ATRIBUTOS_PESO},
+            orden_ids=arreglos["orden_ids"],
+            espacial=espacial,
+            jerarquias=jerarquias,
+            perfiles=arreglos.get("perfiles"),
+        )
+    except KeyError:
+        return None
+    grafo._huella = manifiesto["huella"]
+    # Manifiesto y arreglos se leyeron de esta generación aunque el enlace
+    # haya cambiado mientras tanto
+    grafo.generacion = generacion
+    return grafo, dict(manifiesto["poi_mapping"])
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Capa de tráfico en teselas XYZ. Cada tesela es un GeoJSON con una
+# MultiLineString por color (el color depende del modo y de la congestión de
+# la arista), serializado y comprimido una sola vez. La caché se indexa con la
+# versión de los pesos, así que una actualización de tráfico genera teselas
+# nuevas sin servir las viejas.
+
+ZOOM_MINIMO = 12
+CAPACIDAD = 4096
+DECIMALES = 6
+
+
+def limites_tesela(z, x, y):
+    # (lat_min, lat_max, lon_min, lon_max) de la tesela en Web Mercator
+    n = 2 ** z
+    lon_min = x / n * 360 - 180
+    lon_max = (x + 1) / n * 360 - 180
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lat_min, lat_max, lon_min, lon_max
+
+
+def colores(congestion, modo):
+    # Mismos umbrales que tenía la capa dibujada en el navegador
+    if modo == "peso_libre":
+        return np.full(len(congestion), "#00cc00", dtype=object)
+    if modo == "peso_normal":
+        return np.where(congestion > 2.5, "#ffcc00", "#0066ff").astype(object)
+    return np.select([congestion > 2.8, congestion > 2.2], ["#b30000", "#ff6600"], "#ffcc00").astype(object)
+
+
+def tesela_geojson(grafo, modo, z, x, y):
+    if z < ZOOM_MINIMO:
+        return b'{"type":"FeatureCollection","features":[]}'
+    lat_min, lat_max, lon_min, lon_max = limites_tesela(z, x, y)
+    # Margen de medio ancho de tesela para que las líneas no se corten en el borde
+    margen_lat = (lat_max - lat_min) / 2
+    margen_lon = (lon_max - lon_min) / 2
+    lat_u, lat_v = grafo.lat[grafo.u], grafo.lat[grafo.v]
+    lon_u, lon_v = grafo.lon[grafo.u], grafo.lon[grafo.v]
+    dentro = ((np.maximum(lat_u, lat_v) >= lat_min - margen_lat) & (np.minimum(lat_u, lat_v) <= lat_max + margen_lat)
+              & (np.maximum(lon_u, lon_v) >= lon_min - margen_lon) & (np.minimum(lon_u, lon_v) <= lon_max + margen_lon))
+    aristas = np.flatnonzero(dentro)
+
+    lineas = np.round(np.stack((lon_u[aristas], lat_u[aristas], lon_v[aristas], lat_v[aristas]), axis=1), DECIMALES)
+    por_color = {}
+    for color, (x1, y1, x2, y2) in zip(colores(np.asarray(grafo.congestion)[aristas], modo), lineas.tolist()):
+        por_color.setdefault(color, []).append([[x1, y1], [x2, y2]])
+    capa = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"color": color},
+             "geometry": {"type": "MultiLineString", "coordinates": coordenadas}}
+            for color, coordenadas in por_color.items()
+        ],
+    }
+    return json.dumps(capa, separators=(",", ":")).encode()
+
+
+def codificacion_aceptada(accept_encoding):
+    aceptadas = {parte.split(";")[0].strip() for parte in (accept_encoding or "").split(",")}
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+
+class CacheTeselas:
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._teselas = OrderedDict()   # (modo, z, x, y, versión) -> {codificación: bytes, "etag": ...}
+        self._lock = threading.Lock()
+
+    def obtener(self, grafo, modo, z, x, y, codificacion):
+        # Devuelve (cuerpo, etag) en la codificación pedida (None = sin comprimir)
+        clave = (modo, z, x, y, grafo.version_pesos)
+        with self._lock:
+            tesela = self._teselas.get(clave)
+            if tesela is not None:
+                self._teselas.move_to_end(clave)
+        if tesela is None:
+            datos = tesela_geojson(grafo, modo, z, x, y)
+            tesela = {None: datos, "etag": hashlib.sha1(datos).hexdigest()[:20]}
+            with self._lock:
+                self._teselas[clave] = tesela
+                while len(self._teselas) > self.capacidad:
+                    self._teselas.popitem(last=False)
+        if codificacion not in tesela:
+            if codificacion == "br":
+                tesela["br"] = brotli.compress(tesela[None], quality=9)
+            else:
+                tesela["gzip"] = gzip.compress(tesela[None], compresslevel=6)
+        return tesela[codificacion], tesela["etag"]
+
+    def vaciar(self):
+        with self._lock:
+            self._teselas.clear()
@@ -0,0 +1,131 @@
+# Los cuatro algoritmos de motor_csr deben dar el mismo costo y el mismo
+# camino que Dijkstra, con entradas CSR en el sentido de avance.
+import itertools
+import os
+import random
+import shutil
+
+import numpy as np
+import pytest
+
+from contraccion import construir_ch
+from motor_csr import ALGORITMOS, ATRIBUTOS_PESO, desde_aristas, haversine_arr
+from snapshot import cargar_snapshot, guardar_snapshot
+
+MODOS = ("peso_horapico", "peso_normal", "peso_libre")
+
+# Instantánea chica con POIs, versionada en el repo (el grafo real,
+# grafo_v3.snap, no se versiona). Se regenera con
+# "PYTHONPATH=. python tests/test_algoritmos.py"
+SNAPSHOT_POIS = os.path.join(os.path.dirname(__file__), "datos", "grafo_pois.snap")
+
+
+def grafo_aleatorio(semilla, n=150, vecinos=4):
+    # Nodos al azar en ~2 km² unidos a sus vecinos más cercanos; pesos
+    # continuos para que el camino más corto sea único
+    rng = np.random.default_rng(semilla)
+    lat = -34.60 + rng.random(n) * 0.02
+    lon = -58.40 + rng.random(n) * 0.02
+    pares = set()
+    for a in range(n):
+        for b in np.argsort(haversine_arr(lat[a], lon[a], lat, lon))[1:vecinos + 1]:
+            pares.add((min(a, int(b)), max(a, int(b))))
+    u, v = (np.array(extremo, dtype=np.int32) for extremo in zip(*sorted(pares)))
+    largo = haversine_arr(lat[u], lon[u], lat[v], lon[v]) * (1 + rng.random(len(u)) * 0.3)
+    pesos = {attr: largo * (1 + rng.random(len(u)) * 2) for attr in ATRIBUTOS_PESO}
+    pesos["length"] = largo
+    nodos = np.arange(1000, 1000 + n, dtype=np.int64)
+    grafo = desde_aristas(nodos, lat, lon, u, v, pesos, np.ones(len(u)))
+    for modo in MODOS:
+        grafo.jerarquias[modo] = construir_ch(grafo, modo)
+    return grafo
+
+
+def guardar_snapshot_pois(ruta=SNAPSHOT_POIS):
+    # Un directorio común, sin generaciones: se copia la que escribe
+    # guardar_snapshot y se descarta el enlace
+    grafo = grafo_aleatorio(13, n=80)
+    pois = {f"POI_{i + 1}": int(grafo.nodos[k]) for i, k in enumerate(range(0, 80, 10))}
+    temporal = ruta + ".tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    guardar_snapshot(os.path.join(temporal, "grafo.snap"), grafo, pois)
+    shutil.rmtree(ruta, ignore_errors=True)
+    shutil.copytree(os.path.join(temporal, "grafo.snap"), ruta)
+    shutil.rmtree(temporal)
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    return grafo_aleatorio(7)
+
+
+@pytest.fixture(scope="module")
+def grafo_pois():
+    cargado = cargar_snapshot(SNAPSHOT_POIS, verificar=True)
+    assert cargado is not None, "Falta tests/datos/grafo_pois.snap"
+    return cargado
+
+
+@pytest.mark.parametrize("algoritmo", [a for a in ALGORITMOS if a != "dijkstra"])
+@pytest.mark.parametrize("modo", MODOS)
+def test_mismo_costo_y_camino_que_dijkstra(grafo, algoritmo, modo):
+    azar = random.Random(11)
+    for _ in range(60):
+        origen, destino = azar.randrange(grafo.num_nodos), azar.randrange(grafo.num_nodos)
+        esperado = grafo.dijkstra(origen, destino, modo)
+        obtenido = grafo.buscar(origen, destino, modo, algoritmo)
+        assert (esperado is None) == (obtenido is None)
+        if esperado is None:
+            continue
+        assert obtenido[0] == pytest.approx(esperado[0], rel=1e-9)
+        assert obtenido[1] == esperado[1]
+        assert obtenido[2] == esperado[2]
+
+
+@pytest.mark.parametrize("algoritmo", [a for a in ALGORITMOS if a != "dijkstra"])
+@pytest.mark.parametrize("modo", MODOS)
+def test_todos_los_pares_de_pois_como_dijkstra(grafo_pois, algoritmo, modo):
+    grafo, poi_mapping = grafo_pois
+    assert set(grafo.jerarquias) == set(MODOS)
+    nodos = [grafo.indice_nodo(nodo) for nodo in poi_mapping.values()]
+    for origen, destino in itertools.permutations(nodos, 2):
+        esperado = grafo.dijkstra(origen, destino, modo)
+        obtenido = grafo.buscar(origen, destino, modo, algoritmo)
+        assert (esperado is None) == (obtenido is None)
+        if esperado is None:
+            continue
+        assert obtenido[0] == pytest.approx(esperado[0], rel=1e-9)
+        assert obtenido[1:] == esperado[1:]
+
+
+@pytest.mark.parametrize("algoritmo", ALGORITMOS)
+def test_entradas_en_sentido_de_avance(grafo, algoritmo):
+    azar = random.Random(3)
+    for _ in range(30):
+        origen, destino = azar.randrange(grafo.num_nodos), azar.randrange(grafo.num_nodos)
+        encontrada = grafo.buscar(origen, destino, "peso_normal", algoritmo)
+        if encontrada is None:
+            continue
+        costo, camino, entradas = encontrada
+        assert len(entradas) == len(camino) - 1
+        for desde, hasta, k in zip(camino, camino[1:], entradas):
+            assert grafo.indptr[desde] <= k < grafo.indptr[desde + 1]
+            assert grafo.indices[k] == hasta
+        assert grafo.distancia(entradas, "peso_normal") == pytest.approx(costo, rel=1e-9)
+
+
+def test_dijkstra_en_python_igual_que_csgraph(grafo):
+    # Con un conjunto de bloqueados no vacío (aunque no bloquee nada) Dijkstra
+    # usa el bucle de Python en lugar de scipy
+    azar = random.Random(5)
+    for _ in range(30):
+        origen, destino = azar.randrange(grafo.num_nodos), azar.randrange(grafo.num_nodos)
+        esperado = grafo.dijkstra(origen, destino, "peso_normal")
+        obtenido = grafo.dijkstra(origen, destino, "peso_normal", bloqueados={-1})
+        assert obtenido[0] == pytest.approx(esperado[0], rel=1e-9)
+        assert obtenido[1:] == esperado[1:]
+
+
+if __name__ == "__main__":
+    guardar_snapshot_pois()
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from alternativas import COMPARTIDO_MAX, ESTIRAMIENTO, compartido, rutas_alternativas
+from test_algoritmos import MODOS, grafo_aleatorio
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    return grafo_aleatorio(7)
+
+
+@pytest.mark.parametrize("modo", MODOS)
+def test_alternativas_distintas_y_dentro_del_estiramiento(grafo, modo):
+    azar = random.Random(17)
+    encontradas = 0
+    for _ in range(40):
+        origen, destino = azar.randrange(grafo.num_nodos), azar.randrange(grafo.num_nodos)
+        if origen == destino:
+            continue
+        rutas = rutas_alternativas(grafo, origen, destino, modo, 3)
+        esperado = grafo.dijkstra(origen, destino, modo)
+        optima = rutas[0]
+        assert optima[0] == pytest.approx(esperado[0], rel=1e-9)
+        assert optima[1] == esperado[1]
+        assert len(rutas) <= 4
+        for i, (costo, camino, entradas) in enumerate(rutas[1:], 1):
+            encontradas += 1
+            assert camino[0] == origen and camino[-1] == destino
+            assert len(set(camino)) == len(camino)
+            for desde, hasta, k in zip(camino, camino[1:], entradas):
+                assert grafo.indptr[desde] <= k < grafo.indptr[desde + 1]
+                assert grafo.indices[k] == hasta
+            assert grafo.distancia(entradas, modo) == pytest.approx(costo, rel=1e-9)
+            assert costo <= (1 + ESTIRAMIENTO) * optima[0] * (1 + 1e-9)
+            assert costo >= optima[0] * (1 - 1e-9)
+            for otra in rutas[:i]:
+                assert camino != otra[1]
+                assert compartido(grafo, entradas, otra[2], modo) <= COMPARTIDO_MAX * optima[0] * (1 + 1e-9)
+    assert encontradas > 0
+
+
+def test_sin_alternativas_pedidas_solo_la_optima(grafo):
+    rutas = rutas_alternativas(grafo, 0, 90, "peso_normal", 0)
+    assert len(rutas) == 1
+    assert rutas[0][1] == grafo.dijkstra(0, 90, "peso_normal")[1]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from formatos import (codificar_polyline, decodificar_polyline, desempaquetar_binario, empaquetar_binario,
+                      metros_por_pixel, simplificar)
+
+
+def recorrido(semilla, n=500):
+    rng = np.random.default_rng(semilla)
+    pasos = rng.normal(0, 2e-4, (n, 2))
+    return np.array([-34.60, -58.40]) + np.cumsum(pasos, axis=0)
+
+
+def test_polyline_ejemplo_de_referencia():
+    coords = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    assert codificar_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert np.array(decodificar_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@")) == pytest.approx(np.array(coords))
+
+
+@pytest.mark.parametrize("semilla", range(3))
+def test_polyline_ida_y_vuelta(semilla):
+    coords = recorrido(semilla)
+    decodificadas = np.array(decodificar_polyline(codificar_polyline(coords)))
+    assert decodificadas.shape == coords.shape
+    assert np.abs(decodificadas - coords).max() <= 0.5e-5 + 1e-12
+
+
+@pytest.mark.parametrize("semilla", range(3))
+def test_binario_ida_y_vuelta(semilla):
+    coords = recorrido(semilla)
+    datos = empaquetar_binario(coords)
+    assert len(datos) == coords.size * 4
+    assert np.abs(np.array(desempaquetar_binario(datos)) - coords).max() <= 0.5e-6 + 1e-12
+
+
+def test_simplificar_conserva_extremos_y_tolerancia():
+    coords = recorrido(0)
+    simplificadas = simplificar(coords, 14)
+    assert 2 <= len(simplificadas) < len(coords)
+    assert (simplificadas[0] == coords[0]).all() and (simplificadas[-1] == coords[-1]).all()
+    # Con más zoom la tolerancia (un píxel) es menor y quedan más puntos
+    assert len(simplificar(coords, 18)) >= len(simplificadas)
+    assert metros_por_pixel(-34.6, 15) == pytest.approx(metros_por_pixel(-34.6, 14) / 2)
@@ -0,0 +1,30 @@
+import math
+
+import numpy as np
+
+from indice_espacial import IndiceEspacial
+
+
+def indice_aleatorio(semilla=0, n=500):
+    rng = np.random.default_rng(semilla)
+    return IndiceEspacial(14.6 + rng.random(n) * 0.05, -90.5 + rng.random(n) * 0.05)
+
+
+def test_mas_cercano_igual_que_fuerza_bruta_cerca_y_lejos():
+    indice = indice_aleatorio()
+    rng = np.random.default_rng(1)
+    puntos = [(14.6 + a * 0.05, -90.5 + b * 0.05) for a, b in rng.random((50, 2))]
+    puntos += [(0.0, 0.0), (16.6, -90.5), (14.6, -60.0), (-89.0, 179.0)]
+    for lat, lon in puntos:
+        nodo, distancia = indice.mas_cercano(lat, lon)
+        x, y = indice.proyectar(lat, lon)
+        d2 = (indice.x - x) ** 2 + (indice.y - y) ** 2
+        assert nodo == int(np.argmin(d2))
+        assert math.isclose(distancia, math.sqrt(d2.min()))
+
+
+def test_puntos_no_finitos_no_se_ajustan():
+    indice = indice_aleatorio()
+    for lat, lon in [(math.nan, math.nan), (math.inf, 0.0), (0.0, -math.inf)]:
+        assert indice.mas_cercano(lat, lon) == (-1, math.inf)
+        assert len(indice.en_radio(lat, lon, 200)) == 0
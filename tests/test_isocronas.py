@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from isocronas import arbol_acotado, contorno_convexo
+from test_algoritmos import MODOS, grafo_aleatorio
+
+VELOCIDAD = 20  # km/h, para pasar minutos a metros como calcular_isocrona
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    return grafo_aleatorio(7)
+
+
+def minutos_hasta(grafo, origen, nodo, modo):
+    # Tiempo de la ruta que daría calcular_ruta: metros del camino mínimo por
+    # el peso del modo, a la velocidad del modo
+    _, _, entradas = grafo.dijkstra(origen, nodo, modo)
+    return grafo.distancia(entradas) / 1000 / VELOCIDAD * 60
+
+
+@pytest.mark.parametrize("modo", MODOS)
+def test_nodos_dentro_del_presupuesto(grafo, modo):
+    origen = 5
+    tiempos = np.array([minutos_hasta(grafo, origen, nodo, modo) for nodo in range(grafo.num_nodos)])
+    presupuestos = [1.0, 2.5, 4.0]
+    # Un solo árbol, con el mayor presupuesto, para todos
+    arbol = arbol_acotado(grafo, origen, modo, max(presupuestos) / 60 * VELOCIDAD * 1000)
+    for minutos in presupuestos:
+        nodos, aristas = arbol.dentro(minutos / 60 * VELOCIDAD * 1000)
+        assert 0 < len(nodos) < grafo.num_nodos
+        assert (tiempos[nodos] <= minutos + 1e-9).all()
+        # Y no falta ninguno
+        assert set(nodos.tolist()) == set(np.flatnonzero(tiempos <= minutos).tolist())
+        alcanzados = np.zeros(grafo.num_nodos, dtype=bool)
+        alcanzados[nodos] = True
+        assert (alcanzados[grafo.u[aristas]] & alcanzados[grafo.v[aristas]]).all()
+
+
+def test_contorno_convexo_contiene_los_puntos():
+    rng = np.random.default_rng(2)
+    x, y = rng.random(200), rng.random(200)
+    contorno = contorno_convexo(x, y)
+    siguiente = np.roll(contorno, -1, axis=0)
+    # Antihorario: cada punto queda a la izquierda (o sobre) cada lado
+    cruz = ((siguiente[:, 0] - contorno[:, 0])[:, None] * (y - contorno[:, 1, None])
+            - (siguiente[:, 1] - contorno[:, 1])[:, None] * (x - contorno[:, 0, None]))
+    assert (cruz >= -1e-12).all()
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import app
+from test_algoritmos import grafo_aleatorio
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    grafo = grafo_aleatorio(7)
+    return grafo, {"POI_1": int(grafo.nodos[0]), "POI_2": int(grafo.nodos[90])}
+
+
+def test_un_pedido_que_falla_no_corta_el_bloque(grafo, monkeypatch):
+    grafo, poi_mapping = grafo
+    resolver_ruta = app.resolver_ruta
+
+    def falla_con_x(grafo, poi_mapping, **parametros):
+        if parametros["origen"] == "X":
+            raise ZeroDivisionError("division by zero")
+        return resolver_ruta(grafo, poi_mapping, **parametros)
+
+    monkeypatch.setattr(app, "resolver_ruta", falla_con_x)
+    bloque = [(1, {"origen": "POI_1", "destino": "POI_2"}),
+              (2, {"origen": "X", "destino": "POI_2", "id": "a"}),
+              (3, None),
+              (4, {"origen": "POI_2", "destino": "POI_1"})]
+    resultados = app.evaluar_bloque(grafo, poi_mapping, bloque, modos=("peso_normal", "peso_libre"))
+    assert [r["fila"] for r in resultados] == [1, 1, 2, 2, 3, 3, 4, 4]
+    assert [r["ok"] for r in resultados] == [True, True, False, False, False, False, True, True]
+    fallidos = [r for r in resultados if r["fila"] == 2]
+    assert all(r["error"] == "Error interno: ZeroDivisionError: division by zero" for r in fallidos)
+    assert all(r["id"] == "a" and "distancia_metros" not in r for r in fallidos)
+    json.dumps(resultados)
+
+
+def test_correr_lote_sin_entrada_sale_con_mensaje(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "obtener_grafo", lambda: (None, {}))
+    with pytest.raises(SystemExit, match="No such file"):
+        app.correr_lote(str(tmp_path / "no_existe.ndjson"), "-", 0, 10, None, False)
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+from test_algoritmos import grafo_aleatorio
+
+
+def test_vista_construida_con_pesos_viejos_no_se_publica():
+    grafo = grafo_aleatorio(2, n=40)
+
+    def construir():
+        # Llega un lote de tráfico mientras se construye la vista
+        grafo.actualizar_congestion([0], [3.0])
+        return "vieja"
+
+    assert grafo._vista(("prueba",), construir) == "vieja"
+    assert ("prueba",) not in grafo._vistas
+
+
+def test_lectores_y_escritor_concurrentes():
+    grafo = grafo_aleatorio(3, n=80)
+    errores = []
+    listo = threading.Event()
+
+    def escribir():
+        rng = np.random.default_rng(0)
+        try:
+            for _ in range(200):
+                aristas = np.unique(rng.integers(grafo.num_aristas, size=10))
+                grafo.actualizar_congestion(aristas, rng.uniform(1, 3, len(aristas)))
+        except Exception as e:
+            errores.append(e)
+        finally:
+            listo.set()
+
+    def leer():
+        try:
+            while not listo.is_set():
+                grafo.factor_heuristica("peso_horapico")
+                grafo.factor_maximo("peso_horapico")
+                grafo.adyacencia("peso_horapico")
+                grafo.huella_pesos("peso_horapico")
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=escribir)] + [threading.Thread(target=leer) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores
+    esperado = np.asarray(grafo.pesos_csr["peso_horapico"])
+    assert np.array_equal(np.asarray(grafo.adyacencia("peso_horapico")[2]), esperado)
@@ -0,0 +1,51 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from paradas import costo_orden, optimizar_orden, orden_exacto, orden_heuristico
+
+
+def costos_aleatorios(semilla, k):
+    # Distancias euclídeas entre origen, k paradas y destino (simétricas,
+    # como las del grafo no dirigido)
+    puntos = np.random.default_rng(semilla).random((k + 2, 2))
+    return np.linalg.norm(puntos[:, None] - puntos[None], axis=2)
+
+
+def vecino_mas_cercano(costos):
+    k = len(costos) - 2
+    pendientes, secuencia = set(range(1, k + 1)), [0]
+    while pendientes:
+        siguiente = min(pendientes, key=lambda p: costos[secuencia[-1], p])
+        secuencia.append(siguiente)
+        pendientes.remove(siguiente)
+    return secuencia + [k + 1]
+
+
+@pytest.mark.parametrize("k", range(1, 8))
+def test_held_karp_igual_que_fuerza_bruta(k):
+    for semilla in range(5):
+        costos = costos_aleatorios(semilla, k)
+        mejor = min(costo_orden(costos, [0, *orden, k + 1])
+                    for orden in itertools.permutations(range(1, k + 1)))
+        orden = orden_exacto(costos)
+        assert sorted(orden) == list(range(1, k + 1))
+        assert costo_orden(costos, [0, *orden, k + 1]) == pytest.approx(mejor)
+
+
+@pytest.mark.parametrize("k", [8, 20, 60])
+def test_heuristico_no_peor_que_vecino_mas_cercano(k):
+    for semilla in range(5):
+        costos = costos_aleatorios(semilla, k)
+        orden = orden_heuristico(costos)
+        assert sorted(orden) == list(range(1, k + 1))
+        assert costo_orden(costos, [0, *orden, k + 1]) <= costo_orden(costos, vecino_mas_cercano(costos)) + 1e-9
+
+
+def test_heuristico_cerca_del_exacto():
+    costos = costos_aleatorios(3, 9)
+    exacto = costo_orden(costos, [0, *orden_exacto(costos), 10])
+    assert costo_orden(costos, [0, *orden_heuristico(costos), 10]) <= exacto * 1.1
+    assert optimizar_orden(costos)[1] == "exacto"
+    assert optimizar_orden(costos, max_exacto=5)[1] == "heuristico"
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from simulacion import MAX_PASOS, SimuladorTrafico
+from test_algoritmos import grafo_aleatorio
+
+
+@pytest.fixture(scope="module")
+def grafo():
+    return grafo_aleatorio(7)
+
+
+def simulador(grafo, semilla):
+    return SimuladorTrafico(grafo.u, grafo.v, grafo.num_nodos, semilla, hora=6.0)
+
+
+def test_misma_semilla_misma_simulacion(grafo):
+    a, b = simulador(grafo, 42), simulador(grafo, 42)
+    assert np.array_equal(a.congestion(), b.congestion())
+    assert a.avanzar_minutos(90, 5) == b.avanzar_minutos(90, 5) == 18
+    assert np.array_equal(a.congestion(), b.congestion())
+    assert a.estado() == b.estado()
+    assert a.estado()["hora"] == "07:30"
+    assert not np.array_equal(a.congestion(), simulador(grafo, 43).avanzar(90))
+
+
+def test_congestion_dentro_del_rango_de_construccion(grafo):
+    s = simulador(grafo, 1)
+    assert ((s.base >= 14.5) & (s.base <= 15.9)).all()
+    for _ in range(50):
+        assert (s.avanzar(30) >= 1.0).all()
+
+
+def test_respeta_el_maximo_de_pasos(grafo):
+    s = simulador(grafo, 3)
+    # El último paso es lo que sobra
+    assert s.avanzar_minutos(12, 5) == 3
+    assert s.pasos == 3
+    # El pedido más fino que acepta /simulacion: un día en pasos de 0,1
+    assert s.avanzar_minutos(1440, 0.1) <= MAX_PASOS
+    antes = s.pasos
+    with pytest.raises(ValueError):
+        s.avanzar_minutos(1440, 0.09)
+    with pytest.raises(ValueError):
+        s.avanzar_minutos(10, 0)
+    assert s.pasos == antes
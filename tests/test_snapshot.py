@@ -0,0 +1,37 @@
+import numpy as np
+
+from snapshot import cargar_snapshot, guardar_snapshot
+from test_algoritmos import MODOS, grafo_aleatorio
+
+
+def test_conserva_jerarquias_de_los_mismos_pesos(tmp_path):
+    grafo = grafo_aleatorio(5, n=60)
+    guardar_snapshot(str(tmp_path / "grafo.snap"), grafo, {})
+    cargado, _ = cargar_snapshot(str(tmp_path / "grafo.snap"))
+    assert set(cargado.jerarquias) == set(MODOS)
+    assert cargado.ch(0, 30, "peso_normal")[1] == grafo.dijkstra(0, 30, "peso_normal")[1]
+
+
+def test_descarta_jerarquia_de_otros_pesos(tmp_path):
+    grafo = grafo_aleatorio(5, n=60)
+    # Pesos reconstruidos sin volver a preparar la jerarquía
+    grafo.pesos["peso_normal"] = np.array(grafo.pesos["peso_normal"]) * 1.5
+    guardar_snapshot(str(tmp_path / "grafo.snap"), grafo, {})
+    cargado, _ = cargar_snapshot(str(tmp_path / "grafo.snap"))
+    assert "peso_normal" not in cargado.jerarquias
+    assert {"peso_horapico", "peso_libre"} <= set(cargado.jerarquias)
+
+
+def test_verificar_detecta_arreglo_alterado(tmp_path):
+    grafo = grafo_aleatorio(5, n=60)
+    guardar_snapshot(str(tmp_path / "grafo.snap"), grafo, {})
+    cargado, _ = cargar_snapshot(str(tmp_path / "grafo.snap"))
+    ruta = cargado.pesos["peso_normal"].filename
+    del cargado
+    # Mismo tipo y forma: solo el sha1 lo distingue
+    alterado = np.load(ruta, mmap_mode="r+")
+    alterado[0] += 1.0
+    alterado.flush()
+    del alterado
+    assert cargar_snapshot(str(tmp_path / "grafo.snap")) is not None
+    assert cargar_snapshot(str(tmp_path / "grafo.snap"), verificar=True) is None
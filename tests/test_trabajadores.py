@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+import trabajadores
+from matriz import MIN_ORIGENES_PARALELO, matriz_costos
+from snapshot import cargar_snapshot
+from test_algoritmos import SNAPSHOT_POIS, grafo_aleatorio
+from trabajadores import PESOS_GUARDADOS, Despachador, ServicioSaturado, aplicar_pesos, publicar_pesos
+
+
+@pytest.fixture
+def pesos_en(tmp_path, monkeypatch):
+    monkeypatch.setattr(trabajadores.tempfile, "gettempdir", lambda: str(tmp_path))
+    monkeypatch.setattr(trabajadores, "_pesos_publicados", {})
+    monkeypatch.setattr(trabajadores, "_pesos_anteriores", {})
+    return tmp_path
+
+
+def publicar_versiones(grafo, cantidad):
+    rutas = []
+    for _ in range(cantidad):
+        grafo.reemplazar_pesos("peso_normal", np.array(grafo.pesos["peso_normal"]) * 1.01)
+        rutas.append(publicar_pesos(grafo, "peso_normal"))
+    return rutas
+
+
+def test_conserva_las_ultimas_publicaciones(pesos_en):
+    grafo = grafo_aleatorio(5, n=60)
+    rutas = publicar_versiones(grafo, PESOS_GUARDADOS + 3)
+    assert len(set(rutas)) == len(rutas)
+    assert [os.path.exists(ruta) for ruta in rutas] == [False] * 3 + [True] * PESOS_GUARDADOS
+
+
+def test_trabajador_usa_la_mas_nueva_si_la_suya_se_borro(pesos_en, monkeypatch):
+    servidor = grafo_aleatorio(5, n=60)
+    rutas = publicar_versiones(servidor, PESOS_GUARDADOS + 1)
+    assert not os.path.exists(rutas[0])
+    monkeypatch.setattr(trabajadores, "_trabajador", {"grafo": grafo_aleatorio(5, n=60), "pesos": {}})
+    grafo = aplicar_pesos({"peso_normal": rutas[0]})
+    assert np.array_equal(grafo.pesos["peso_normal"], servidor.pesos["peso_normal"])
+    assert trabajadores._trabajador["pesos"]["peso_normal"] == rutas[-1]
+    os.remove(rutas[-1])
+    for ruta in rutas[1:-1]:
+        os.remove(ruta)
+    with pytest.raises(OSError):
+        aplicar_pesos({"peso_normal": rutas[1]})
+
+
+@pytest.fixture(scope="module")
+def despachador():
+    despachador = Despachador(SNAPSHOT_POIS, procesos=2, timeout=30)
+    yield despachador
+    trabajadores._pool.pop("pool").shutdown()
+    trabajadores._pool.clear()
+
+
+def test_matriz_por_el_despachador(despachador):
+    grafo, _ = cargar_snapshot(SNAPSHOT_POIS)
+    origenes = list(range(MIN_ORIGENES_PARALELO + 8))
+    destinos = list(range(0, grafo.num_nodos, 7))
+    esperado = matriz_costos(grafo, origenes, destinos, "peso_normal")
+    obtenido = matriz_costos(grafo, origenes, destinos, "peso_normal", despachador=despachador)
+    assert np.array_equal(obtenido[0], esperado[0])
+    assert np.array_equal(obtenido[1], esperado[1])
+    assert despachador.contadores["aceptadas"] == 2
+
+    # Sin cupo para todos sus bloques, la matriz entera se rechaza (comparte
+    # el pool del otro despachador)
+    chico = Despachador(SNAPSHOT_POIS, max_pendientes=1)
+    with pytest.raises(ServicioSaturado):
+        matriz_costos(grafo, origenes, destinos, "peso_normal", despachador=chico)
+    assert chico.contadores["rechazadas"] == 1
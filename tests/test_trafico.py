@@ -0,0 +1,51 @@
+import random
+
+import numpy as np
+import pytest
+
+from cache_rutas import CacheRutas
+from test_algoritmos import grafo_aleatorio
+from trafico import aplicar_lote
+
+MODO = "peso_horapico"
+
+
+def guardar_rutas(grafo, cache, pares):
+    generacion = grafo.huella_pesos(MODO)
+    for origen, destino in pares:
+        costo, _, entradas = grafo.dijkstra(origen, destino, MODO)
+        detalle = {"origen": origen, "destino": destino, "costo": costo,
+                   "aristas": np.unique(grafo.aristas[entradas])}
+        cache.guardar((origen, destino), generacion, costo, detalle)
+
+
+def test_lote_conserva_solo_las_respuestas_que_no_afecta():
+    grafo = grafo_aleatorio(9)
+    azar = random.Random(1)
+    pares = [(azar.randrange(grafo.num_nodos), azar.randrange(grafo.num_nodos)) for _ in range(40)]
+    cache = CacheRutas()
+    guardar_rutas(grafo, cache, pares)
+
+    _, _, entradas = grafo.dijkstra(*pares[0], MODO)
+    arista = int(grafo.aristas[entradas[0]])
+    anterior = grafo.huella_pesos(MODO)
+    _, _, descartadas = aplicar_lote(grafo, [arista], [grafo.congestion[arista] * 5], cache)
+    nueva = grafo.huella_pesos(MODO)
+
+    assert nueva != anterior
+    assert cache.obtener(pares[0], nueva) is None
+    conservadas = [par for par in pares if cache.obtener(par, nueva) is not None]
+    assert 0 < descartadas < len(pares)
+    assert len(conservadas) == len(pares) - descartadas
+    for par in conservadas:
+        assert cache.obtener(par, nueva) == pytest.approx(grafo.dijkstra(*par, MODO)[0])
+
+
+def test_huella_encadenada_no_depende_de_quien_la_calcula():
+    a, b = grafo_aleatorio(4, n=50), grafo_aleatorio(4, n=50)
+    a.huella_pesos(MODO)
+    for grafo in (a, b):
+        aplicar_lote(grafo, [1, 2], [2.0, 3.0])
+    assert a.huella_pesos(MODO) == b.huella_pesos(MODO)
+    aplicar_lote(b, [3], [2.0])
+    assert a.huella_pesos(MODO) != b.huella_pesos(MODO)
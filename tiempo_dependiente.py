@@ -0,0 +1,95 @@
+import heapq
+import math
+
+import numpy as np
+
+from motor_csr import _anotar
+
+# Ruteo dependiente del tiempo. Cada arista tiene un perfil de velocidades
+# para el día dividido en intervalos iguales (24 = por hora, 96 = cada 15
+# minutos), cuantizado a uint8 en pasos de ESCALA_KMH: una fila de
+# GrafoCSR.perfiles por arista. El costo de una arista depende de la hora a la
+# que se entra en ella; si el recorrido cruza el fin de un intervalo, el resto
+# se recorre a la velocidad del siguiente. Así nunca conviene salir más tarde
+# para llegar antes (propiedad FIFO) y Dijkstra sobre tiempos de llegada da la
+# llegada más temprana.
+
+ESCALA_KMH = 0.5
+SEGUNDOS_DIA = 86400
+
+
+def construir_perfiles(grafo, velocidades, sensibilidad):
+    # `velocidades`: velocidad base (km/h) de cada intervalo del día.
+    # `sensibilidad`: cuánto pesa la congestión de la arista en cada intervalo
+    # (0 = nada, 1 = velocidad inversamente proporcional a la congestión)
+    velocidades = np.asarray(velocidades, dtype=np.float64)
+    sensibilidad = np.asarray(sensibilidad, dtype=np.float64)
+    congestion = np.asarray(grafo.congestion, dtype=np.float64)
+    relativa = congestion.mean() / congestion if len(congestion) else congestion
+    kmh = velocidades[None, :] * relativa[:, None] ** sensibilidad[None, :]
+    return np.clip(np.rint(kmh / ESCALA_KMH), 1, 255).astype(np.uint8)
+
+
+def tiempo_recorrido(longitud, perfil, inicio, t, intervalos, duracion):
+    # Segundos para recorrer `longitud` metros entrando en el instante `t`
+    # (segundos desde la medianoche del día de salida). `perfil` es el arreglo
+    # plano de perfiles e `inicio` la posición de la fila de la arista
+    total = 0.0
+    while True:
+        ranura = int(t // duracion)
+        velocidad = perfil[inicio + ranura % intervalos] * (ESCALA_KMH / 3.6)
+        hasta_fin = (ranura + 1) * duracion - t
+        if longitud <= velocidad * hasta_fin:
+            return total + longitud / velocidad
+        longitud -= velocidad * hasta_fin
+        total += hasta_fin
+        t += hasta_fin
+
+
+def dijkstra_dependiente(grafo, origen, destino, salida, bloqueados=None, estadisticas=None):
+    # Devuelve (llegada, camino, entradas), con la llegada en segundos desde
+    # la medianoche del día de salida, o None si no hay camino
+    perfiles = grafo.perfiles
+    intervalos = perfiles.shape[1]
+    duracion = SEGUNDOS_DIA / intervalos
+    perfil = memoryview(np.ascontiguousarray(perfiles).reshape(-1))
+    indptr, indices, longitudes = grafo.adyacencia("length")
+    aristas = memoryview(grafo.aristas)
+    escala = ESCALA_KMH / 3.6
+
+    llegada = {origen: float(salida)}
+    pred = {}
+    visitados = set()
+    heap = [(float(salida), origen)]
+    inserciones = 1
+    encontrada = None
+    while heap:
+        t, nodo = heapq.heappop(heap)
+        if nodo in visitados:
+            continue
+        if nodo == destino:
+            encontrada = (t, *grafo._reconstruir(pred, origen, destino))
+            break
+        visitados.add(nodo)
+        ranura = int(t // duracion)
+        hasta_fin = (ranura + 1) * duracion - t
+        ranura %= intervalos
+        for k in range(indptr[nodo], indptr[nodo + 1]):
+            vecino = indices[k]
+            if bloqueados and vecino in bloqueados:
+                continue
+            # Caso común en línea: la arista se recorre dentro del intervalo actual
+            inicio = aristas[k] * intervalos
+            velocidad = perfil[inicio + ranura] * escala
+            longitud = longitudes[k]
+            if longitud <= velocidad * hasta_fin:
+                nt = t + longitud / velocidad
+            else:
+                nt = t + tiempo_recorrido(longitud, perfil, inicio, t, intervalos, duracion)
+            if nt < llegada.get(vecino, math.inf):
+                llegada[vecino] = nt
+                pred[vecino] = (nodo, k)
+                heapq.heappush(heap, (nt, vecino))
+                inserciones += 1
+    _anotar(estadisticas, len(visitados), inserciones)
+    return encontrada
@@ -0,0 +1,276 @@
+import atexit
+import glob
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TiempoAgotado
+
+import numpy as np
+
+from snapshot import cargar_snapshot
+
+# Procesos de trabajo para búsquedas pesadas. Cada proceso abre la
+# instantánea con mmap, así que el grafo no se copia ni se serializa: todos
+# comparten las mismas páginas. Si el tráfico en vivo cambió los pesos de un
+# modo, el servidor los deja en un .npy por versión y cada proceso lo abre
+# antes de calcular. Cuando se reconstruye el grafo, la instantánea cambia de
+# generación (snapshot.py); cada tarea trae la generación del que la envía y
+# el proceso la abre si no es la suya.
+
+# Archivos de pesos que se conservan por modo: una tarea en cola puede
+# traer uno que ya no es el último (ver aplicar_pesos)
+PESOS_GUARDADOS = 8
+
+_pool = {}
+_pool_lock = threading.Lock()
+_pesos_publicados = {}
+_pesos_anteriores = {}
+_trabajador = {}
+
+
+class ServicioSaturado(RuntimeError):
+    pass
+
+
+def _iniciar_trabajador(ruta_snapshot, generacion=None):
+    # Sin generación, la vigente; con ella, esa (snapshot.py guarda las
+    # últimas para los procesos que todavía trabajan con una anterior)
+    ruta = ruta_snapshot
+    if generacion is not None:
+        ruta = os.path.join(os.path.dirname(ruta_snapshot.rstrip(os.sep)), generacion)
+    cargado = cargar_snapshot(ruta, verificar=False)
+    if cargado is None:
+        raise RuntimeError(f"No se pudo abrir la instantánea {ruta}")
+    _trabajador.clear()
+    _trabajador["grafo"], _trabajador["poi_mapping"] = cargado
+    if generacion is not None:
+        _trabajador["grafo"].generacion = generacion
+    _trabajador["pesos"] = {}
+    _trabajador["snapshot"] = ruta_snapshot
+
+
+def _arrancar_trabajador(ruta_snapshot, pids):
+    # Inicializador del pool: avisa su pid, para medir su memoria desde el
+    # servidor, y abre la instantánea
+    pids.put(os.getpid())
+    _iniciar_trabajador(ruta_snapshot)
+
+
+def _seguir_generacion(generacion):
+    # Las tareas traen la generación del grafo con que trabaja quien las
+    # envía (los nodos que reciben son de ese grafo). Si es otra, se abre esa
+    # y se descarta todo lo que las tareas guardaron de la anterior
+    if generacion is not None and generacion != _trabajador["grafo"].generacion:
+        _iniciar_trabajador(_trabajador["snapshot"], generacion)
+
+
+def en_trabajador():
+    return "grafo" in _trabajador
+
+
+def datos_trabajador(generacion=None):
+    # Estado del proceso de trabajo: grafo, poi_mapping y lo que cada tarea
+    # quiera conservar entre llamadas (mientras no cambie la generación)
+    _seguir_generacion(generacion)
+    return _trabajador
+
+
+def aplicar_pesos(pesos_publicados, generacion=None):
+    _seguir_generacion(generacion)
+    grafo = _trabajador["grafo"]
+    for peso, ruta in (pesos_publicados or {}).items():
+        if _trabajador["pesos"].get(peso) == ruta:
+            continue
+        try:
+            valores = np.load(ruta, mmap_mode="r")
+        except (OSError, ValueError):
+            # El servidor ya lo borró (la tarea esperó en cola más que
+            # PESOS_GUARDADOS publicaciones): sirve el más nuevo de ese modo
+            ruta = _pesos_mas_nuevos(ruta)
+            if ruta is None:
+                raise
+            if _trabajador["pesos"].get(peso) == ruta:
+                continue
+            valores = np.load(ruta, mmap_mode="r")
+        grafo.reemplazar_pesos(peso, valores)
+        # Las rutas guardadas de ese modo se calcularon con los pesos anteriores
+        grafo.tabla_rutas = {clave: r for clave, r in grafo.tabla_rutas.items() if clave[2] != peso}
+        grafo.tabla_detalle = {clave: d for clave, d in grafo.tabla_detalle.items() if clave[2] != peso}
+        _trabajador["pesos"][peso] = ruta
+    return grafo
+
+
+def _pesos_mas_nuevos(ruta):
+    # Último archivo publicado del mismo servidor, modo y generación que
+    # `ruta` (los nombres terminan en la versión de los pesos)
+    prefijo = ruta[:ruta.rindex("_") + 1]
+    versiones = []
+    for candidato in glob.glob(glob.escape(prefijo) + "*.npy"):
+        version = candidato[len(prefijo):-len(".npy")]
+        if version.isdigit():
+            versiones.append((int(version), candidato))
+    return max(versiones)[1] if versiones else None
+
+
+def publicar_pesos(grafo, peso):
+    # Sin cambios de tráfico los procesos usan los pesos de la instantánea
+    if grafo.version_pesos == 0:
+        return None
+    clave = (peso, grafo.generacion, grafo.version_pesos)
+    with _pool_lock:
+        ruta = _pesos_publicados.get(peso)
+        if ruta is None or ruta[0] != clave:
+            nueva = os.path.join(tempfile.gettempdir(),
+                                 f"pesos_{os.getpid()}_{peso}_{clave[1] or 0}_{clave[2]}.npy")
+            temporal = nueva + ".tmp.npy"
+            np.save(temporal, np.ascontiguousarray(grafo.pesos[peso]))
+            os.replace(temporal, nueva)
+            # El anterior queda para las tareas que ya lo llevan; se borran
+            # los que pasan de PESOS_GUARDADOS
+            anteriores = _pesos_anteriores.setdefault(peso, [])
+            if ruta is not None:
+                anteriores.append(ruta[1])
+            while len(anteriores) >= PESOS_GUARDADOS:
+                try:
+                    os.remove(anteriores.pop(0))
+                except OSError:
+                    pass
+            ruta = _pesos_publicados[peso] = (clave, nueva)
+    return ruta[1]
+
+
+@atexit.register
+def _borrar_pesos():
+    rutas = [ruta for _, ruta in _pesos_publicados.values()]
+    rutas += [ruta for anteriores in _pesos_anteriores.values() for ruta in anteriores]
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def obtener_pool(ruta_snapshot, procesos=None):
+    if "pool" not in _pool:
+        with _pool_lock:
+            if "pool" not in _pool:
+                _pool["procesos"] = procesos or os.cpu_count() or 1
+                # spawn: el servidor tiene hilos y un fork podría heredar locks tomados
+                contexto = multiprocessing.get_context("spawn")
+                _pool["pids"] = contexto.SimpleQueue()
+                _pool["vistos"] = set()
+                _pool["pool"] = ProcessPoolExecutor(
+                    max_workers=_pool["procesos"],
+                    mp_context=contexto,
+                    initializer=_arrancar_trabajador,
+                    initargs=(ruta_snapshot, _pool["pids"]),
+                )
+    return _pool["pool"], _pool["procesos"]
+
+
+def memoria_proceso(pid="self"):
+    # Memoria de un proceso en kB, de /proc/<pid>/smaps_rollup (Linux). Las
+    # páginas de la instantánea mapeada cuentan como compartidas; pss reparte
+    # cada página compartida entre los procesos que la usan. None si no se
+    # puede leer
+    campos = {"Rss": "rss_kb", "Pss": "pss_kb", "Shared_Clean": "compartida_kb", "Shared_Dirty": "compartida_kb",
+              "Private_Clean": "privada_kb", "Private_Dirty": "privada_kb"}
+    memoria = dict.fromkeys(campos.values(), 0)
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linea in f:
+                partes = linea.split()
+                clave = campos.get(partes[0].rstrip(":"))
+                if clave is not None:
+                    memoria[clave] += int(partes[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return memoria
+
+
+def leer_pids(cola, vistos=None):
+    # Pids que los procesos de un pool dejaron en `cola` al arrancar, sumados
+    # a los ya leídos (`vistos`)
+    vistos = set() if vistos is None else vistos
+    while not cola.empty():
+        vistos.add(cola.get())
+    return vistos
+
+
+def pids_trabajadores():
+    if "pids" not in _pool:
+        return []
+    with _pool_lock:
+        return sorted(leer_pids(_pool["pids"], _pool["vistos"]))
+
+
+def memoria_trabajadores(pids):
+    # Memoria de cada proceso de trabajo, leída desde este proceso; los que
+    # ya terminaron no aparecen
+    memorias = [(pid, memoria_proceso(pid)) for pid in sorted(pids)]
+    return [{"pid": pid, **memoria} for pid, memoria in memorias if memoria is not None]
+
+
+class Despachador:
+    # Envía tareas al pool con un máximo de tareas pendientes (en cola más en
+    # curso) y un tiempo límite por pedido. Al vencer el plazo el pedido
+    # responde, pero su cupo se libera recién cuando el proceso termina: así
+    # la cola nunca crece por encima de lo que los procesos pueden atender
+
+    def __init__(self, ruta_snapshot, procesos=None, max_pendientes=None, timeout=10.0):
+        self.pool, self.procesos = obtener_pool(ruta_snapshot, procesos)
+        self.max_pendientes = max_pendientes or self.procesos * 4
+        self.timeout = timeout
+        self._cupos = threading.BoundedSemaphore(self.max_pendientes)
+        self._lock = threading.Lock()
+        self.contadores = dict.fromkeys(("aceptadas", "rechazadas", "vencidas", "pendientes"), 0)
+
+    def _contar(self, clave, delta=1):
+        with self._lock:
+            self.contadores[clave] += delta
+
+    def _liberar(self, _):
+        self._contar("pendientes", -1)
+        self._cupos.release()
+
+    def ejecutar(self, funcion, *args):
+        return self.esperar(self.enviar(funcion, *args))
+
+    def enviar(self, funcion, *args):
+        # Toma un cupo y envía la tarea sin esperarla (para pedidos que
+        # reparten su trabajo en varias tareas, como la matriz)
+        if not self._cupos.acquire(blocking=False):
+            self._contar("rechazadas")
+            raise ServicioSaturado("Demasiados pedidos en curso; reintente en un momento")
+        try:
+            futuro = self.pool.submit(funcion, *args)
+        except Exception:
+            self._cupos.release()
+            raise
+        self._contar("aceptadas")
+        self._contar("pendientes")
+        futuro.add_done_callback(self._liberar)
+        return futuro
+
+    def esperar(self, futuro, timeout=None):
+        # Resultado de una tarea de enviar; sin `timeout`, el del despachador
+        try:
+            return futuro.result(timeout=self.timeout if timeout is None else timeout)
+        except TiempoAgotado:
+            # concurrent.futures.TimeoutError: el TimeoutError de Python recién
+            # desde 3.11, antes otra clase que `except TimeoutError` no atrapa
+            futuro.cancel()
+            self._contar("vencidas")
+            raise
+
+    def calentar(self):
+        # Arranca todos los procesos (y su instantánea) antes del primer pedido
+        for futuro in [self.pool.submit(en_trabajador) for _ in range(self.procesos)]:
+            futuro.result()
+
+    def estadisticas(self):
+        with self._lock:
+            contadores = {**self.contadores, "procesos": self.procesos, "max_pendientes": self.max_pendientes,
+                          "timeout_segundos": self.timeout}
+        return {**contadores, "memoria": memoria_trabajadores(pids_trabajadores())}
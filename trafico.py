@@ -0,0 +1,185 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from motor_csr import haversine_arr
+
+# Ingesta de congestión en vivo. Las actualizaciones llegan en lotes
+# (arista, congestión); cada lote reemplaza los pesos de hora pico de una sola
+# vez (GrafoCSR.actualizar_congestion) e invalida solo las rutas de la tabla
+# (y, si se indica, de la caché de respuestas) que pueden haber cambiado.
+
+TAM_LOTE = 5000
+MODO_CONGESTION = "peso_horapico"
+
+
+def validar_lote(grafo, aristas, congestion):
+    aristas = np.asarray(aristas)
+    congestion = np.asarray(congestion, dtype=np.float64)
+    if aristas.ndim != 1 or aristas.shape != congestion.shape:
+        raise ValueError("'aristas' y 'congestion' deben ser listas del mismo largo")
+    if aristas.size and not np.issubdtype(aristas.dtype, np.integer):
+        raise ValueError("Los índices de arista deben ser enteros")
+    aristas = aristas.astype(np.int64)
+    if aristas.size and (aristas.min() < 0 or aristas.max() >= grafo.num_aristas):
+        raise ValueError(f"Índice de arista fuera de rango (0..{grafo.num_aristas - 1})")
+    if not np.all(np.isfinite(congestion)) or np.any(congestion <= 0):
+        raise ValueError("La congestión debe ser un número positivo")
+    # Si una arista se repite en el lote, gana la última actualización
+    _, ultimas = np.unique(aristas[::-1], return_index=True)
+    ultimas = len(aristas) - 1 - ultimas
+    return aristas[ultimas], congestion[ultimas]
+
+
+def leer_lotes_ndjson(lineas, tam_lote=TAM_LOTE):
+    # Cada línea: {"arista": 12, "congestion": 15.2}
+    aristas, congestion = [], []
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            registro = json.loads(linea)
+            aristas.append(int(registro["arista"]))
+            congestion.append(float(registro["congestion"]))
+        except (ValueError, KeyError, TypeError):
+            raise ValueError(f"Línea inválida: {linea[:80]!r}")
+        if len(aristas) >= tam_lote:
+            yield aristas, congestion
+            aristas, congestion = [], []
+    if aristas:
+        yield aristas, congestion
+
+
+def aplicar_lote(grafo, aristas, congestion, cache=None):
+    # Devuelve (aristas actualizadas, rutas de la tabla invalidadas,
+    # respuestas de la caché invalidadas)
+    aristas, congestion = validar_lote(grafo, aristas, congestion)
+    if not aristas.size:
+        return 0, 0, 0
+    return (len(aristas), *_invalidar(grafo, aristas, *grafo.actualizar_congestion(aristas, congestion), cache))
+
+
+def _invalidar(grafo, aristas, anteriores, nuevos, huellas, cache):
+    afectada = ruta_afectada(grafo, MODO_CONGESTION, aristas, anteriores, nuevos)
+    invalidadas = invalidar_rutas(grafo, MODO_CONGESTION, afectada)
+    # Las respuestas guardadas con la huella anterior que siguen valiendo
+    # pasan a la nueva; las demás se descartan
+    respuestas = cache.revalidar(*huellas, afectada) if cache is not None else 0
+    return invalidadas, respuestas
+
+
+def aplicar_congestion(grafo, congestion, cache=None):
+    # Reemplazo de la congestión de todas las aristas (simulacion.py)
+    congestion = np.asarray(congestion, dtype=np.float64)
+    if congestion.shape != (grafo.num_aristas,):
+        raise ValueError(f"Se esperaba la congestión de las {grafo.num_aristas} aristas")
+    if not np.all(np.isfinite(congestion)) or np.any(congestion <= 0):
+        raise ValueError("La congestión debe ser un número positivo")
+    inicio = time.perf_counter()
+    aristas = np.arange(grafo.num_aristas)
+    invalidadas, respuestas = _invalidar(grafo, aristas, *grafo.actualizar_congestion(aristas, congestion), cache)
+    return {"aristas_actualizadas": len(aristas), "rutas_invalidadas": invalidadas,
+            "respuestas_invalidadas": respuestas, "segundos": time.perf_counter() - inicio}
+
+
+def aplicar_lotes(grafo, lotes, cache=None):
+    inicio = time.perf_counter()
+    aristas_actualizadas = rutas_invalidadas = respuestas_invalidadas = num_lotes = 0
+    for aristas, congestion in lotes:
+        actualizadas, invalidadas, respuestas = aplicar_lote(grafo, aristas, congestion, cache)
+        aristas_actualizadas += actualizadas
+        rutas_invalidadas += invalidadas
+        respuestas_invalidadas += respuestas
+        num_lotes += 1
+    segundos = time.perf_counter() - inicio
+    return {
+        "lotes": num_lotes,
+        "aristas_actualizadas": aristas_actualizadas,
+        "rutas_invalidadas": rutas_invalidadas,
+        "respuestas_invalidadas": respuestas_invalidadas,
+        "segundos": segundos,
+        "aristas_por_segundo": aristas_actualizadas / segundos if segundos > 0 else None,
+    }
+
+
+def ruta_afectada(grafo, modo, aristas, anteriores, nuevos):
+    # Devuelve una función que dice si una ruta guardada (su detalle: origen,
+    # destino, costo y aristas) puede haber cambiado con el lote. Deja de ser
+    # válida si usa una arista que cambió, o si una arista que bajó de peso
+    # podría ofrecer un atajo. Lo segundo se descarta con una cota inferior
+    # geométrica: peso nuevo de la arista más la distancia en línea recta
+    # (por el factor admisible) desde el origen y hasta el destino; si ni así
+    # mejora el costo guardado, la ruta sigue.
+    cambiadas = aristas[nuevos != anteriores]
+    bajaron = nuevos < anteriores
+    if not cambiadas.size:
+        return lambda detalle: False
+    cambio = np.zeros(grafo.num_aristas, dtype=bool)
+    cambio[cambiadas] = True
+
+    factor = grafo.factor_heuristica(modo)
+    a, b = grafo.u[aristas[bajaron]], grafo.v[aristas[bajaron]]
+    peso_bajo = nuevos[bajaron]
+    lat_a, lon_a, lat_b, lon_b = grafo.lat[a], grafo.lon[a], grafo.lat[b], grafo.lon[b]
+
+    def afectada(detalle):
+        if cambio[detalle["aristas"]].any():
+            return True
+        if not len(peso_bajo):
+            return False
+        s, t = detalle["origen"], detalle["destino"]
+        lat_s, lon_s, lat_t, lon_t = grafo.lat[s], grafo.lon[s], grafo.lat[t], grafo.lon[t]
+        via_ab = haversine_arr(lat_s, lon_s, lat_a, lon_a) + haversine_arr(lat_b, lon_b, lat_t, lon_t)
+        via_ba = haversine_arr(lat_s, lon_s, lat_b, lon_b) + haversine_arr(lat_a, lon_a, lat_t, lon_t)
+        cota = peso_bajo + factor * np.minimum(via_ab, via_ba)
+        return bool(np.any(cota < detalle["costo"]))
+
+    return afectada
+
+
+def invalidar_rutas(grafo, modo, afectada):
+    invalidas = [clave for clave, detalle in list(grafo.tabla_detalle.items())
+                 if clave[2] == modo and afectada(detalle)]
+    for clave in invalidas:
+        grafo.tabla_rutas.pop(clave, None)
+        grafo.tabla_detalle.pop(clave, None)
+    return len(invalidas)
+
+
+def simular_feed(num_aristas, total, tasa=None, semilla=0, minimo=14.5, maximo=15.9):
+    # Simulador local: `total` actualizaciones a `tasa` por segundo (sin
+    # pausa si no se indica tasa)
+    rng = np.random.default_rng(semilla)
+    inicio = time.perf_counter()
+    for i in range(total):
+        if tasa:
+            espera = inicio + i / tasa - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+        yield {"arista": int(rng.integers(num_aristas)), "congestion": float(rng.uniform(minimo, maximo))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de actualizaciones de congestión en NDJSON")
+    parser.add_argument("--aristas", type=int, help="número de aristas del grafo")
+    parser.add_argument("--snapshot", default="grafo_v3.snap", help="se usa si no se indica --aristas")
+    parser.add_argument("--total", type=int, default=10000, help="cantidad de actualizaciones")
+    parser.add_argument("--tasa", type=float, help="actualizaciones por segundo (sin pausa si se omite)")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    num_aristas = args.aristas
+    if num_aristas is None:
+        with open(f"{args.snapshot}/manifest.json") as f:
+            num_aristas = json.load(f)["arreglos"]["u"]["shape"][0]
+    for registro in simular_feed(num_aristas, args.total, args.tasa, args.semilla):
+        sys.stdout.write(json.dumps(registro) + "\n")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()